@@ -1,114 +1,124 @@
-import json
-import xml.etree.ElementTree as ET
-import boto3
-import logging
-import base64
-import os
-
-# Set up AWS clients and logging
-lambda_client = boto3.client('lambda')
-s3_client = boto3.client('s3')
-
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Configuration constants
-BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'storyfyscripts')
-S3_KEY = 'uploaded_script.fdx'
-OUTPUT_KEY = 'converted_file.json'
-LAMBDA_FUNCTION_ARN = os.getenv('LAMBDA_FUNCTION_ARN', 'arn:aws:lambda:eu-west-2:039612872581:function:script_evaluator')
-
-def upload_to_s3(bucket, key, body, content_type):
-    """Upload a file to S3."""
-    try:
-        s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type)
-        logger.info(f"File uploaded to S3: {bucket}/{key}")
-    except Exception as e:
-        logger.error(f"Failed to upload file to S3: {e}")
-        raise
-
-def remove_script_notes(element):
-    """Recursively remove all <ScriptNote> elements from the XML tree."""
-    for script_note in element.findall(".//ScriptNote"):
-        parent = script_note.getparent()
-        if parent is not None:
-            parent.remove(script_note)
-
-def parse_xml_content(xml_content):
-    """Parse and process XML content, removing <ScriptNote> elements."""
-    try:
-        root = ET.fromstring(xml_content)
-        remove_script_notes(root)
-        return root
-    except ET.ParseError as e:
-        logger.error("Failed to parse XML content", exc_info=True)
-        raise ValueError("Invalid XML content")
-
-def collect_script_content(element, level=0):
-    """Recursively collect content from an XML element, post-processing."""
-    content = []
-    text = (element.text or '').strip()
-    
-    if text:
-        content.append(f"{'  ' * level}{text}")
-
-    for child in element:
-        content.extend(collect_script_content(child, level + 1))
-
-    return content
-
-def invoke_lambda_function(payload):
-    """Invoke a Lambda function and return the response."""
-    try:
-        response = lambda_client.invoke(
-            FunctionName=LAMBDA_FUNCTION_ARN,
-            InvocationType='RequestResponse',
-            Payload=json.dumps(payload)
-        )
-        return json.load(response['Payload'])
-    except Exception as e:
-        logger.error("Failed to invoke Lambda function", exc_info=True)
-        raise
-
-def lambda_handler(event, context):
-    try:
-        # Validate and decode the incoming base64 file content
-        if 'body' not in event:
-            raise ValueError("Missing 'body' in event")
-
-        file_content = base64.b64decode(event['body'])
-        
-        # Upload the original file to S3
-        upload_to_s3(BUCKET_NAME, S3_KEY, file_content, 'application/xml')
-
-        # Parse and process the XML content
-        root = parse_xml_content(file_content.decode('utf-8'))
-        script_content = collect_script_content(root)
-
-        # Convert to JSON format
-        script_data = {"content": script_content}
-        json_content = json.dumps(script_data, indent=4)
-
-        # Upload the JSON result to S3
-        upload_to_s3(BUCKET_NAME, OUTPUT_KEY, json_content, 'application/json')
-
-        # Invoke another Lambda with the JSON content
-        response_from_master = invoke_lambda_function(script_data)
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps(response_from_master)
-        }
-
-    except ValueError as e:
-        logger.error("Input validation or processing error", exc_info=True)
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': str(e)})
-        }
-    except Exception as e:
-        logger.error("An unexpected error occurred", exc_info=True)
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': "Internal server error"})
-        }
+import json
+import logging
+import base64
+import os
+import re
+
+from aws_clients import lazy_client
+from jobs import build_job_queue, build_job_store, new_job
+from storage import ArtifactStore, content_hash, script_key, upload_key
+import tracing
+
+# AWS clients are created on first use, so rejected uploads never load boto3
+s3_client = lazy_client('s3')
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Configuration constants
+BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'storyfyscripts')
+JOBS_BASE_PATH = os.getenv('JOBS_BASE_PATH', '/jobs')
+# POST <path ending in /uploads> returns a presigned URL instead of taking the script in the body
+UPLOAD_URL_EXPIRY_SECONDS = int(os.getenv('UPLOAD_URL_EXPIRY_SECONDS', '900'))
+# Project ids become part of S3 keys
+PROJECT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+
+# Job state and stage queue (S3 + SQS by default, see jobs.py)
+job_store = build_job_store(s3_client=s3_client)
+job_queue = build_job_queue(sqs_client=lazy_client('sqs'))
+artifact_store = ArtifactStore(s3_client, BUCKET_NAME)
+
+def submit_job(file_content, correlation_id=None, project_id=None):
+    """Store the upload, create its job and queue the first stage.
+
+    Drafts submitted with the same project_id are evaluated incrementally
+    against the project's previous draft.
+    """
+    script_hash = content_hash(file_content)
+    job = new_job(script_hash=script_hash, script_key=script_key(script_hash),
+                  correlation_id=correlation_id or tracing.new_correlation_id(), project_id=project_id)
+
+    # Identical uploads share one object
+    try:
+        artifact_store.put_if_absent(job['script_key'], file_content, 'application/xml')
+    except Exception as e:
+        logger.error(f"Failed to upload file to S3: {e}")
+        raise
+
+    job_store.create(job)
+    job_queue.send({'job_id': job['job_id'], 'stage': next(iter(job['stages']))})
+    return job
+
+def create_upload(correlation_id=None, project_id=None):
+    """Create a job that waits for the script to be PUT straight to S3.
+
+    Returns the job and a presigned URL for uploads/<job_id>.fdx. The
+    upload_ingest handler picks the object up from its S3 event.
+    """
+    job = new_job(status='awaiting_upload', correlation_id=correlation_id or tracing.new_correlation_id(),
+                  project_id=project_id)
+    job['upload_key'] = upload_key(job['job_id'])
+    upload_url = s3_client.generate_presigned_url(
+        'put_object',
+        Params={'Bucket': BUCKET_NAME, 'Key': job['upload_key'], 'ContentType': 'application/xml'},
+        ExpiresIn=UPLOAD_URL_EXPIRY_SECONDS
+    )
+    job_store.create(job)
+    return job, upload_url
+
+def lambda_handler(event, context):
+    try:
+        # Parsing and evaluation run asynchronously in job_worker; the correlation id follows them
+        headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+        correlation_id = headers.get('x-correlation-id') or tracing.new_correlation_id()
+        project_id = (event.get('queryStringParameters') or {}).get('project_id') or headers.get('x-project-id')
+        if project_id and not PROJECT_ID_PATTERN.match(project_id):
+            raise ValueError("Invalid project_id")
+
+        path = event.get('rawPath') or event.get('path') or ''
+        if path.rstrip('/').endswith('/uploads'):
+            # The client PUTs the script to upload_url; no script bytes pass through this function
+            with tracing.bind(correlation_id):
+                job, upload_url = create_upload(correlation_id, project_id)
+            fields = {'upload_url': upload_url, 'upload_method': 'PUT',
+                      'upload_headers': {'Content-Type': 'application/xml'},
+                      'expires_in': UPLOAD_URL_EXPIRY_SECONDS}
+            status_code = 201
+        else:
+            # Validate and decode the incoming base64 file content
+            if 'body' not in event:
+                raise ValueError("Missing 'body' in event")
+
+            file_content = base64.b64decode(event['body'])
+            if not file_content:
+                raise ValueError("Empty file content")
+
+            with tracing.bind(correlation_id):
+                job = submit_job(file_content, correlation_id, project_id)
+            fields, status_code = {}, 202
+        status_url = f"{JOBS_BASE_PATH}/{job['job_id']}"
+
+        return {
+            'statusCode': status_code,
+            'headers': {'Location': status_url, 'X-Correlation-Id': correlation_id},
+            'body': json.dumps(dict({
+                'job_id': job['job_id'],
+                'correlation_id': correlation_id,
+                'status': job['status'],
+                'status_url': status_url,
+                'results_url': f"{status_url}/results"
+            }, **fields))
+        }
+
+    except ValueError as e:
+        logger.error("Input validation or processing error", exc_info=True)
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)})
+        }
+    except Exception as e:
+        logger.error("An unexpected error occurred", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': "Internal server error"})
+        }
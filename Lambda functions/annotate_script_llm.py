@@ -1,128 +1,226 @@
-import boto3
-import botocore.config
-import json
-import logging
-from botocore.exceptions import ClientError
-
-# Configure global logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger()
-
-# Initialize AWS SDK clients outside the handler to reuse connections
-s3_client = boto3.client('s3')
-
-def lambda_handler(event, context):
-    print("ENtered the function")
-    logger.info("Lambda function invoked.")
-
-    # Check if 'Records' exist in the event
-    if 'Records' not in event:
-        logger.error("No records found in the event.")
-        return {
-            'statusCode': 400,
-            'body': json.dumps('Invalid event format: No records found.')
-        }
-
-    try:
-        # Get the bucket and file name from the event
-        bucket_name = event['Records'][0]['s3']['bucket']['name']
-        input_file_key = event['Records'][0]['s3']['object']['key']
-        logger.debug(f"Bucket name: {bucket_name}")
-        logger.debug(f"File key: {input_file_key}")
-        print("Bucket success")
-        print("File present in the event:", event['Records'][0]['s3']['object']['key'])
-
-
-        logger.info("Successfully retrieved bucket and key information from the event.")
-    except KeyError as e:
-        logger.error(f'Error reading event details: {str(e)}')
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f'Error reading event details: {str(e)}')
-        }
-    
-    try:
-        # Step 1: Read the file from S3
-        print("ENtered the reading of S3")
-        response = s3_client.get_object(Bucket=bucket_name, Key=input_file_key)
-        if 'Body' not in response:
-            raise Exception("Missing 'Body' in S3 response.")
-        file_content = response['Body'].read().decode('utf-8')  # Assuming the content is text
-        print("ENtered the file_content")
-        logger.info("File content read successfully from S3.")
-    except ClientError as e:
-        logger.error(f'Error reading from S3: {str(e)}')
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f'Error reading from S3: {str(e)}')
-        }
-    except Exception as e:
-        logger.error(f'Unexpected error while reading S3: {str(e)}')
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f'Unexpected error while reading S3: {str(e)}')
-        }
-    
-    # Step 2: Construct the prompt for the Bedrock model
-    prompt = f"""You are an expert script annotator. Your task is to label the provided movie script according to specific categories to enhance clarity and organization. Label the script using the following guidelines:
-
-**[DESCRIPTION: ...]** - Use this label for general descriptions of the narrative, character states, and emotional context.
-
-**[SCENE HEADING: ...]** - Use this label for the headings that indicate the setting and time of the scene. These usually start with EXT. (exterior) or INT. (interior), followed by the location and time of day.
-
-**[CHARACTER INTRODUCTION: ...]** - Use this label to mark the introduction of important characters in the scene.
-
-**[CHARACTER: ...]** - Use this label to identify the character speaking in the dialogue that follows.
-
-**[LINE: ...]** - Use this label for the actual dialogue spoken by the character.
-
-**[TRANSITION: ...]** - Use this label for any scene transitions, such as "FADE OUT," "FADE IN," or "CUT TO."
-
-Please label the provided script in this manner, ensuring that you maintain the structure and clarity. If there are any sections where you are uncertain about how to label, do not provide any label for those sections. Instead, indicate your uncertainty by stating, "Uncertain about labeling."
-
-"""
-    print("ENtered the prompt")
-
-    # Step 3: Call the Bedrock model with the prompt
-    try:
-        body = {
-            "prompt":prompt,
-            "max_tokens":800,
-            "temperature":0.5,
-            "top_p":0.9,
-            "top_k":50
-        }
-        print("ENtered the invoke model")
-        bedrock_client = boto3.client("bedrock-runtime", region_name="eu-west-2", config=botocore.config.Config(read_timeout=300, retries={'max_attempts': 2}))
-
-        response = bedrock_client.invoke_model(body=json.dumps(body), modelId="mistral.mistral-7b-instruct-v0:2", contentType= "application/json",accept= "application/json", # Ensure this model ID is correct
-        )
-        print(response)
-        
-        #if 'Body' not in response:
-            #raise Exception("Missing 'Body' in Bedrock response.")
-        
-        response_content = response.get('body').read()
-        response_data = json.loads(response_content)
-        print(response_data)
-        logger.info(f"Response from model: {response_data}")
-
-        output = response_data.get('generation', 'No generation found in response.')
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps(output)
-        }
-
-    except ClientError as e:
-        logger.error(f"Client error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f"Client error: {str(e)}")
-        }
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f"Unexpected error: {str(e)}")
-        }
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import lazy_client
+from call_bedrock import call_model
+from fdx_labeler import LABELS, TYPE_LABELS, label_scenes, render_annotations
+from fdx_parser import parse_fdx
+from model_output import extract_text
+from model_router import PromptTooLargeError, route
+from scene_diff import scene_fingerprint
+from storage import ArtifactStore, s3_event_objects
+
+# Configure global logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger()
+
+# Initialize AWS SDK clients outside the handler to reuse connections
+s3_client = lazy_client('s3')
+
+# Annotated scripts are saved next to the input under this prefix
+OUTPUT_PREFIX = 'annotated/'
+# Ambiguous paragraphs are sent to the model in batches of this size
+BATCH_SIZE = int(os.getenv('ANNOTATE_BATCH_SIZE', '40'))
+MAX_CONCURRENCY = int(os.getenv('ANNOTATE_MAX_CONCURRENCY', '4'))
+# Routing policy entry for labelling (cheapest model by default, see model_router)
+ROUTE_NAME = 'annotate_labels'
+
+LABEL_LINE_PATTERN = re.compile(r'^\s*(\d+)\s*[:.)-]\s*\**\[?\s*([A-Z ]+?)\s*\]?\**\s*$')
+
+def load_scenes(file_key, body):
+    """Read the scene model from an uploaded .fdx or a converted JSON file."""
+    if file_key.lower().endswith('.fdx'):
+        # Stream the S3 body straight into the parser
+        return parse_fdx(body)
+    data = json.loads(body.read())
+    if 'scenes' in data:
+        return data['scenes']
+    # Older converted files only carry a flat list of lines
+    return [{'heading': None, 'elements': [{'type': '', 'text': line.strip()}
+                                           for line in data.get('content', []) if line.strip()]}]
+
+def prompt_label_batch(entries):
+    """Prompt asking the model to label only the given paragraphs."""
+    numbered = '\n'.join(f"{number}. {entry['text']}" for number, entry in enumerate(entries, start=1))
+    return f"""You are an expert script annotator. Assign exactly one label to each numbered paragraph of a movie script. Choose from these labels:
+
+DESCRIPTION - general descriptions of the narrative, character states, sounds and emotional context.
+SCENE HEADING - headings that indicate the setting and time of the scene (INT./EXT., location, time of day).
+CHARACTER INTRODUCTION - the first introduction of an important character in the scene.
+CHARACTER - the name of the character speaking the dialogue that follows.
+LINE - dialogue spoken by a character.
+TRANSITION - scene transitions such as "FADE OUT," "FADE IN," or "CUT TO."
+
+If you are uncertain about a paragraph, answer UNCERTAIN for it. Reply with one line per paragraph in the form "<number>: <LABEL>" and nothing else.
+
+{numbered}
+"""
+
+def label_batch(entries):
+    """Ask the routed model for labels of one batch of ambiguous paragraphs, in place.
+
+    The call goes through call_bedrock.call_model, so it is rate limited,
+    retried and failed over like the evaluator's calls, and served from the
+    response cache when possible. Returns False if the batch got no answer;
+    its paragraphs are then left unlabelled.
+    """
+    prompt = prompt_label_batch(entries)
+    try:
+        # Room for "<number>: CHARACTER INTRODUCTION" per paragraph
+        planned = route(ROUTE_NAME, prompt, max_tokens=12 * len(entries) + 20)[0]
+    except PromptTooLargeError as e:
+        logger.error(f"Labelling batch rejected: {e}")
+        return False
+    result = call_model(planned['region'], planned['model_id'], prompt, ROUTE_NAME, planned['model'],
+                        max_tokens=planned['max_tokens'])
+    if not result or 'error' in result:
+        logger.error(f"Labelling batch of {len(entries)} paragraphs failed: {(result or {}).get('error')}")
+        return False
+    generation = extract_text(result)
+
+    for line in generation.splitlines():
+        match = LABEL_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        number, label = int(match.group(1)), match.group(2).strip()
+        if 1 <= number <= len(entries) and label in LABELS:
+            entries[number - 1]['label'] = label
+    return True
+
+def scene_entries(scenes, entries):
+    """Pair each scene's fingerprint with its slice of the labelled entries."""
+    grouped, position = [], 0
+    for scene in scenes:
+        count = len(scene['elements']) + (1 if scene['heading'] else 0)
+        grouped.append((scene_fingerprint(scene), entries[position:position + count]))
+        position += count
+    return grouped
+
+def apply_cached_labels(store, fingerprint, scene):
+    """Fill undecided labels from an earlier draft of the scene; True if any remain undecided."""
+    undecided = [index for index, entry in enumerate(scene) if entry['label'] is None]
+    if not undecided:
+        return False
+    cached = store.get_json(scene_labels_key(fingerprint)) or {}
+    for index in undecided:
+        if cached.get(str(index)) in LABELS:
+            scene[index]['label'] = cached[str(index)]
+    return any(entry['label'] is None for entry in scene)
+
+def save_scene_labels(store, fingerprint, scene):
+    """Store the model-decided labels of one scene for later drafts."""
+    labels = {str(index): entry['label'] for index, entry in enumerate(scene)
+              if entry['label'] and entry['type'] not in TYPE_LABELS}
+    try:
+        store.put_json(scene_labels_key(fingerprint), labels)
+    except Exception as e:
+        logger.error(f"Error saving scene labels: {e}")
+
+def scene_labels_key(fingerprint):
+    return f"{OUTPUT_PREFIX}scenes/{fingerprint}.json"
+
+def lambda_handler(event, context):
+    logger.info("Lambda function invoked.")
+
+    # Check if 'Records' exist in the event
+    if 'Records' not in event:
+        logger.error("No records found in the event.")
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Invalid event format: No records found.')
+        }
+
+    try:
+        # Get the bucket and file name from the event
+        bucket_name, input_file_key, _ = s3_event_objects(event)[0]
+        logger.debug(f"Bucket name: {bucket_name}")
+        logger.debug(f"File key: {input_file_key}")
+
+
+        logger.info("Successfully retrieved bucket and key information from the event.")
+    except KeyError as e:
+        logger.error(f'Error reading event details: {str(e)}')
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error reading event details: {str(e)}')
+        }
+    
+    # Our own output lands in the same bucket; never annotate it again
+    if input_file_key.startswith(OUTPUT_PREFIX):
+        logger.info(f"Skipping annotation output {input_file_key}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps('Skipped annotation output.')
+        }
+
+    # botocore is only loaded once there is an object to read (see aws_clients)
+    from botocore.exceptions import ClientError
+
+    try:
+        # Step 1: Read the file from S3 and build the scene model
+        response = s3_client.get_object(Bucket=bucket_name, Key=input_file_key)
+        if 'Body' not in response:
+            raise Exception("Missing 'Body' in S3 response.")
+        scenes = load_scenes(input_file_key, response['Body'])
+        logger.info("File content read successfully from S3.")
+    except ClientError as e:
+        logger.error(f'Error reading from S3: {str(e)}')
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error reading from S3: {str(e)}')
+        }
+    except Exception as e:
+        logger.error(f'Unexpected error while reading S3: {str(e)}')
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Unexpected error while reading S3: {str(e)}')
+        }
+
+    # Step 2: Label everything the FDX structure already determines
+    entries = label_scenes(scenes)
+    ambiguous = [entry for entry in entries if entry['label'] is None]
+    logger.info(f"Labelled {len(entries) - len(ambiguous)} of {len(entries)} paragraphs from FDX structure")
+
+    # Step 3: Reuse model labels of scenes unchanged since an earlier draft
+    store = ArtifactStore(s3_client, bucket_name)
+    grouped = scene_entries(scenes, entries)
+    pending = [(fingerprint, scene) for fingerprint, scene in grouped if apply_cached_labels(store, fingerprint, scene)]
+    ambiguous = [entry for _, scene in pending for entry in scene if entry['label'] is None]
+    logger.info(f"{len(ambiguous)} paragraphs in {len(pending)} changed scenes left for the model")
+
+    # Step 4: Send only the remaining ambiguous paragraphs to the Bedrock model, in batches
+    try:
+        if ambiguous:
+            batches = [ambiguous[i:i + BATCH_SIZE] for i in range(0, len(ambiguous), BATCH_SIZE)]
+            with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(batches)))) as executor:
+                failed = list(executor.map(label_batch, batches)).count(False)
+            if failed:
+                logger.warning(f"{failed} of {len(batches)} labelling batches failed; their paragraphs stay uncertain")
+        for fingerprint, scene in pending:
+            save_scene_labels(store, fingerprint, scene)
+
+        output = render_annotations(entries)
+        output_key = f"{OUTPUT_PREFIX}{input_file_key}.txt"
+        s3_client.put_object(Bucket=bucket_name, Key=output_key, Body=output.encode('utf-8'), ContentType='text/plain; charset=utf-8')
+        logger.info(f"Annotated script saved to S3: {bucket_name}/{output_key}")
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(output)
+        }
+
+    except ClientError as e:
+        logger.error(f"Client error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Client error: {str(e)}")
+        }
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Unexpected error: {str(e)}")
+        }
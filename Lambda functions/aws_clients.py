@@ -0,0 +1,100 @@
+"""Shared, lazily created AWS clients.
+
+boto3 and botocore are imported when the first real client is created, so
+a handler that never reaches AWS (a rejected upload, an in-process run
+against local stand-ins) does not pay their import cost. Handlers hold
+module-level lazy_client() proxies instead of clients.
+"""
+import os
+import threading
+
+# Connection pool size per client; covers the concurrent fan-out in the evaluator and call_bedrock
+MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50'))
+
+# Create lazy_client() clients at import anyway, e.g. with provisioned concurrency where init is pre-paid
+EAGER_CLIENTS = os.getenv('AWS_EAGER_CLIENTS', 'false').lower() == 'true'
+
+# Directory for the offline stand-ins in local_backends (empty: use AWS)
+AWS_LOCAL_ROOT = os.getenv('AWS_LOCAL_ROOT', '')
+
+_clients = {}
+_backends = {}
+_lock = threading.Lock()
+
+
+def register_backend(service, factory):
+    """Serve get_client(service, ...) from factory(region_name, **config) instead of boto3."""
+    with _lock:
+        _backends[service] = factory
+        for key in [key for key in _clients if key[0] == service]:
+            del _clients[key]
+
+
+def get_client(service, region_name=None, **config):
+    """Return a shared boto3 client for (service, region, config).
+
+    Clients live at module scope, so warm Lambda invocations reuse their
+    resolved credentials, endpoints and open HTTPS connections. `config`
+    takes botocore.config.Config keyword arguments (read_timeout, retries,
+    ...); max_pool_connections defaults to AWS_MAX_POOL_CONNECTIONS.
+    """
+    config.setdefault('max_pool_connections', MAX_POOL_CONNECTIONS)
+    key = (service, region_name, repr(sorted(config.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    if AWS_LOCAL_ROOT and not _backends:
+        import local_backends
+        local_backends.install(AWS_LOCAL_ROOT)
+    # Client creation on the shared default session is not thread-safe
+    with _lock:
+        client = _clients.get(key)
+        if client is None and service in _backends:
+            client = _backends[service](region_name, **config)
+            _clients[key] = client
+        elif client is None:
+            import boto3
+            import botocore.config
+            client = boto3.client(service, region_name=region_name, config=botocore.config.Config(**config))
+            _clients[key] = client
+        return client
+
+
+class LazyClient:
+    """Stands in for get_client(service, region_name, **config) until first used.
+
+    Attribute access resolves the pooled client, so backends registered
+    after import and clear_clients() are honoured as with get_client.
+    """
+
+    def __init__(self, service, region_name=None, **config):
+        self.service = service
+        self.region_name = region_name
+        self.config = config
+
+    def resolve(self):
+        return get_client(self.service, self.region_name, **self.config)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+def lazy_client(service, region_name=None, **config):
+    """A module-level client that is created on first use rather than at import."""
+    client = LazyClient(service, region_name, **config)
+    if EAGER_CLIENTS:
+        client.resolve()
+    return client
+
+
+def clear_clients():
+    """Drop every pooled client (e.g. after credentials rotate)."""
+    with _lock:
+        _clients.clear()
+
+
+def clear_backends():
+    """Go back to real AWS clients for every service."""
+    with _lock:
+        _backends.clear()
+        _clients.clear()
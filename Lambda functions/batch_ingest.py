@@ -0,0 +1,357 @@
+"""Batch ingestion: evaluate many scripts from one archive or manifest.
+
+POST a base64 .zip of .fdx files, or a base64 JSON manifest
+{"bucket": ..., "keys": [...]} of scripts already in S3, and get 202 with a
+job id. job_worker runs the job's single "batch" stage. It streams the
+scripts through a process pool, each worker reading its script straight
+from the archive or S3 into the parser, then queues every parsed script as a
+job of its own, whose evaluate and extract stages job_worker runs like a
+single upload's. Each script's evaluation is written to
+batches/<job_id>/results/<script_hash>.json as soon as it completes.
+
+The CLI evaluates a batch in one process instead, sending every
+(script, dimension, model) task through one BedrockScheduler.
+
+Usage (local): python batch_ingest.py ARCHIVE.zip|SCRIPTS_DIR [--out DIR] [--processes N] [--index DB]
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from aws_clients import lazy_client
+from chunking import estimate_tokens, render_scenes
+from fdx_parser import parse_fdx
+from jobs import build_job_queue, build_job_store, new_job, now
+from results_index import ResultsIndex, evaluation_records
+from storage import BATCH_PREFIX, ArtifactStore, HashingReader, batch_result_key, content_hash, parsed_key
+import tracing
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Configuration constants
+BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'storyfyscripts')
+JOBS_BASE_PATH = os.getenv('JOBS_BASE_PATH', '/jobs')
+MAX_BATCH_SCRIPTS = int(os.getenv('MAX_BATCH_SCRIPTS', '1000'))
+MAX_SCRIPT_BYTES = int(os.getenv('MAX_SCRIPT_BYTES', str(20 * 1024 * 1024)))
+# Parser processes, and scripts whose evaluations are in flight at once
+BATCH_PARSE_PROCESSES = int(os.getenv('BATCH_PARSE_PROCESSES', str(os.cpu_count() or 1)))
+BATCH_MAX_SCRIPTS = int(os.getenv('BATCH_MAX_SCRIPTS', '8'))
+# CLI runs: tasks wait in the shared scheduler, so per-dimension deadlines are much longer than for a single upload
+BATCH_DIMENSION_TIMEOUT = float(os.getenv('BATCH_DIMENSION_TIMEOUT_SECONDS', '840'))
+
+s3_client = lazy_client('s3')
+job_store = build_job_store(s3_client=s3_client)
+job_queue = build_job_queue(sqs_client=lazy_client('sqs'))
+artifact_store = ArtifactStore(s3_client, BUCKET_NAME)
+
+def is_script_member(info):
+    """True for .fdx files in an archive, skipping folders and macOS metadata."""
+    name = info.filename
+    if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+        return False
+    return name.lower().endswith('.fdx')
+
+# Script sources are small dicts naming where a script is, never its bytes:
+# {"name", "archive"} (a member of a zip on disk), {"name", "bucket", "key"}
+# or {"name", "path"}. Each parser process opens and streams its own script.
+
+def iter_archive(path):
+    """Yield a source for every .fdx member of a zip archive on disk."""
+    with zipfile.ZipFile(path) as archive:
+        members = [info for info in archive.infolist() if is_script_member(info)]
+    for info in members:
+        # Checked before decompressing, so an archive cannot expand without bound
+        if info.file_size > MAX_SCRIPT_BYTES:
+            logger.warning(f"Skipping {info.filename}: {info.file_size} bytes exceeds MAX_SCRIPT_BYTES")
+            continue
+        yield {'name': info.filename, 'archive': path}
+
+def iter_manifest(manifest):
+    """Yield a source for every script listed in a manifest."""
+    bucket = manifest.get('bucket') or BUCKET_NAME
+    for key in manifest['keys']:
+        yield {'name': key, 'bucket': bucket, 'key': key}
+
+def iter_directory(directory):
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith('.fdx'):
+            yield {'name': name, 'path': os.path.join(directory, name)}
+
+@contextlib.contextmanager
+def open_source(source):
+    """Open a script source as a binary stream."""
+    if 'archive' in source:
+        with zipfile.ZipFile(source['archive']) as archive, archive.open(source['name']) as stream:
+            yield stream
+    elif 'key' in source:
+        response = s3_client.get_object(Bucket=source['bucket'], Key=source['key'])
+        if response.get('ContentLength', 0) > MAX_SCRIPT_BYTES:
+            response['Body'].close()
+            raise ValueError(f"{response['ContentLength']} bytes exceeds MAX_SCRIPT_BYTES")
+        yield response['Body']
+    else:
+        with open(source['path'], 'rb') as stream:
+            yield stream
+
+def parse_script(source):
+    """Stream one script into the parser, hashing it on the way; runs in a worker process."""
+    parsed = {'name': source['name']}
+    try:
+        with open_source(source) as stream:
+            body = HashingReader(stream)
+            try:
+                parsed['scenes'] = parse_fdx(body)
+            finally:
+                parsed['script_hash'] = body.hexdigest()
+    except Exception as e:
+        # A missing object, a corrupt archive member or malformed XML fails this script only
+        logger.warning(f"Could not parse {source['name']}: {e}")
+        parsed['error'] = str(e)
+        # A script rejected before it was read is keyed by its name
+        parsed.setdefault('script_hash', content_hash(source['name']))
+    return parsed
+
+def parse_all(items, processes=BATCH_PARSE_PROCESSES):
+    """Parse scripts in parallel processes, falling back to this process where pools are unavailable.
+
+    Only sources cross the process boundary; scripts are read inside the workers.
+    """
+    items = list(items)
+    if processes > 1 and len(items) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(processes, len(items))) as pool:
+                return list(pool.map(parse_script, items))
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            # AWS Lambda has no /dev/shm, so multiprocessing cannot create its semaphores there
+            logger.warning(f"Process pool unavailable ({e}); parsing in-process")
+    return [parse_script(item) for item in items]
+
+def script_tokens(parsed):
+    return estimate_tokens(render_scenes(parsed['scenes']))
+
+def evaluate_batch(parsed_scripts, on_result, max_scripts=BATCH_MAX_SCRIPTS, bypass_cache=False, scheduler=None):
+    """Evaluate parsed scripts through one shared scheduler, smallest first.
+
+    `on_result(parsed, result)` is called in this thread as each script
+    finishes (or immediately, for scripts that failed to parse).
+    """
+    import pipeline
+    import script_evaluator
+    from scheduler import BedrockScheduler
+
+    timeouts = {dimension: BATCH_DIMENSION_TIMEOUT for dimension, _ in script_evaluator.DIMENSIONS}
+    owns_scheduler = scheduler is None
+    scheduler = scheduler or BedrockScheduler(pipeline.invoke_in_process)
+
+    def evaluate(parsed, size):
+        # Every task of a script shares its size as priority: shortest job first
+        invoke = lambda task: scheduler.submit(task, priority=size).result()
+        with tracing.bind(tracing.new_correlation_id()) as correlation_id:
+            evaluations = script_evaluator.evaluate_script(
+                {'scenes': parsed['scenes'], 'script_hash': parsed['script_hash'], 'bypass_cache': bypass_cache},
+                invoke=invoke, timeouts=timeouts)
+        status_code, message = script_evaluator.evaluation_status(evaluations)
+        return {'statusCode': status_code, 'message': message, 'correlation_id': correlation_id,
+                'evaluations': evaluations}
+
+    valid = []
+    for parsed in parsed_scripts:
+        if 'error' in parsed:
+            on_result(parsed, {'statusCode': 400, 'message': parsed['error']})
+        else:
+            valid.append((script_tokens(parsed), parsed))
+    valid.sort(key=lambda item: item[0])
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_scripts, len(valid) or 1))) as executor:
+            futures = {executor.submit(evaluate, parsed, size): parsed for size, parsed in valid}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Evaluation of {futures[future]['name']} failed", exc_info=True)
+                    result = {'statusCode': 500, 'message': str(e)}
+                on_result(futures[future], result)
+    finally:
+        if owns_scheduler:
+            scheduler.shutdown()
+
+def script_job_id(batch_id, name):
+    """Job id of a batch script; stable, so a redelivered batch stage finds the jobs it already created."""
+    return content_hash(f"{batch_id}:{name}")[:32]
+
+def queue_script(job, parsed):
+    """Store a parsed batch script and queue it as a job of its own, starting at the evaluate stage."""
+    script_id = script_job_id(job['job_id'], parsed['name'])
+    script_job = job_store.get(script_id)
+    if script_job is None:
+        key = parsed_key(parsed['script_hash'])
+        if not artifact_store.exists(key):
+            artifact_store.put_json(key, {"scenes": parsed['scenes']})
+        script_job = new_job(job_id=script_id, batch_id=job['job_id'], script_name=parsed['name'],
+                             script_hash=parsed['script_hash'], bypass_cache=job['batch_source'].get('bypass_cache', False),
+                             correlation_id=job.get(tracing.CORRELATION_FIELD))
+        script_job['stages']['parse'] = {'status': 'succeeded', 'succeeded_at': now(), 'parsed_key': key,
+                                         'reused': True}
+        job_store.create(script_job)
+    # Also re-sent when an earlier attempt created the job but failed before queueing it
+    if script_job['stages']['evaluate']['status'] == 'pending':
+        job_queue.send({'job_id': script_id, 'stage': 'evaluate'})
+    return script_id
+
+def run_batch_job(job, on_progress=None):
+    """The batch stage: parse every script of a batch job and queue each one's evaluation.
+
+    Each script is evaluated by its own queued stage, so a batch is not
+    bound by one invocation's time limit and a failing script is retried
+    alone. `on_progress(results)` receives the per-script entries: the
+    script's job id and status URL, or its parse error.
+    """
+    source = job['batch_source']
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'archive_key' in source:
+            # Spooled to /tmp, so workers can open members without the archive in memory
+            path = os.path.join(workdir, 'batch.zip')
+            body = s3_client.get_object(Bucket=BUCKET_NAME, Key=source['archive_key'])['Body']
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(body, f)
+            items = iter_archive(path)
+        else:
+            items = iter_manifest(source)
+        parsed_scripts = parse_all(items)
+
+    entries = []
+    for parsed in parsed_scripts:
+        entry = {'script': parsed['name'], 'script_hash': parsed['script_hash']}
+        if 'error' in parsed:
+            result_key = batch_result_key(job['job_id'], parsed['script_hash'])
+            artifact_store.put_json(result_key, dict(entry, statusCode=400, message=parsed['error']))
+            entry.update(statusCode=400, message=parsed['error'], result_key=result_key)
+        else:
+            script_id = queue_script(job, parsed)
+            entry.update(job_id=script_id, status_url=f"{JOBS_BASE_PATH}/{script_id}")
+        entries.append(entry)
+    if on_progress:
+        on_progress(entries)
+
+    queued = sum(1 for entry in entries if 'job_id' in entry)
+    if parsed_scripts and not queued:
+        raise ValueError("No script in the batch could be parsed")
+    return {'scripts': len(parsed_scripts), 'queued': queued, 'failed': len(parsed_scripts) - queued,
+            'results_prefix': f"{BATCH_PREFIX}{job['job_id']}/results/"}
+
+def batch_source(raw):
+    """Validate the request body and describe where the batch's scripts come from."""
+    if raw.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+                count = sum(1 for info in archive.infolist() if is_script_member(info))
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid zip archive")
+        if not count:
+            raise ValueError("Archive contains no .fdx files")
+        if count > MAX_BATCH_SCRIPTS:
+            raise ValueError(f"Archive holds {count} scripts; the limit is {MAX_BATCH_SCRIPTS}")
+        archive_key = f"{BATCH_PREFIX}{content_hash(raw)}.zip"
+        artifact_store.put_if_absent(archive_key, raw, 'application/zip')
+        return {'archive_key': archive_key, 'scripts': count}
+
+    try:
+        manifest = json.loads(raw)
+    except ValueError:
+        raise ValueError("Body must be a zip archive or a JSON manifest")
+    keys = manifest.get('keys') if isinstance(manifest, dict) else None
+    if not keys or not all(isinstance(key, str) for key in keys):
+        raise ValueError("Manifest needs a non-empty 'keys' list")
+    if len(keys) > MAX_BATCH_SCRIPTS:
+        raise ValueError(f"Manifest lists {len(keys)} scripts; the limit is {MAX_BATCH_SCRIPTS}")
+    return {'bucket': manifest.get('bucket') or BUCKET_NAME, 'keys': keys, 'scripts': len(keys),
+            'bypass_cache': bool(manifest.get('bypass_cache', False))}
+
+def lambda_handler(event, context):
+    try:
+        if 'body' not in event:
+            raise ValueError("Missing 'body' in event")
+        raw = base64.b64decode(event['body'])
+        if not raw:
+            raise ValueError("Empty body")
+
+        correlation_id = tracing.new_correlation_id()
+        with tracing.bind(correlation_id):
+            source = batch_source(raw)
+            job = new_job(stages=['batch'], kind='batch', batch_source=source, correlation_id=correlation_id)
+            job_store.create(job)
+            job_queue.send({'job_id': job['job_id'], 'stage': 'batch'})
+        status_url = f"{JOBS_BASE_PATH}/{job['job_id']}"
+
+        return {
+            'statusCode': 202,
+            'headers': {'Location': status_url, 'X-Correlation-Id': correlation_id},
+            'body': json.dumps({
+                'job_id': job['job_id'],
+                'status': job['status'],
+                'scripts': source['scripts'],
+                'status_url': status_url,
+                'results_url': f"{status_url}/results"
+            })
+        }
+
+    except ValueError as e:
+        logger.error("Input validation or processing error", exc_info=True)
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)})
+        }
+    except Exception as e:
+        logger.error("An unexpected error occurred", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': "Internal server error"})
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate a batch of .fdx scripts through one Bedrock scheduler.')
+    parser.add_argument('source', help='a .zip of .fdx files or a directory of them')
+    parser.add_argument('--out', help='directory for <script>.evaluation.json files')
+    parser.add_argument('--processes', type=int, default=BATCH_PARSE_PROCESSES, help='parser processes')
+    parser.add_argument('--scripts', type=int, default=BATCH_MAX_SCRIPTS, help='scripts evaluated at once')
+    parser.add_argument('--bypass-cache', action='store_true', help='force fresh generations')
+    parser.add_argument('--index', metavar='DB', help='add structured results to this SQLite results index')
+    args = parser.parse_args()
+
+    # stdout carries one JSON line per script; span export is for Lambda
+    tracing.set_exporters()
+    if os.path.isdir(args.source):
+        items = iter_directory(args.source)
+    else:
+        items = iter_archive(args.source)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    index = ResultsIndex(args.index) if args.index else None
+
+    def emit(parsed, result):
+        # One JSON line per script, as soon as it is done
+        print(json.dumps({'script': parsed['name'], 'statusCode': result['statusCode'],
+                          'message': result['message']}), flush=True)
+        if args.out:
+            name = os.path.splitext(os.path.basename(parsed['name']))[0]
+            with open(os.path.join(args.out, f"{name}.evaluation.json"), 'w', encoding='utf-8') as f:
+                json.dump(dict(result, script=parsed['name'], script_hash=parsed['script_hash']), f,
+                          indent=4, ensure_ascii=False)
+        if index is not None and result.get('evaluations'):
+            index.add(evaluation_records(parsed['script_hash'], result['evaluations'], script_name=parsed['name']))
+
+    evaluate_batch(parse_all(items, args.processes), emit, max_scripts=args.scripts, bypass_cache=args.bypass_cache)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger()
+
+# Comma-separated tiers, fastest first: memory, disk, s3
+CACHE_BACKENDS = os.getenv('BEDROCK_CACHE_BACKENDS', 'memory,s3')
+CACHE_TTL_SECONDS = int(os.getenv('BEDROCK_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv('BEDROCK_CACHE_MAX_ENTRIES', '256'))
+CACHE_DIR = os.getenv('BEDROCK_CACHE_DIR', '/tmp/bedrock-cache')
+CACHE_MAX_BYTES = int(os.getenv('BEDROCK_CACHE_MAX_BYTES', str(256 * 2 ** 20)))
+CACHE_BUCKET = os.getenv('BEDROCK_CACHE_BUCKET', 'storifyresponse')
+CACHE_PREFIX = os.getenv('BEDROCK_CACHE_PREFIX', 'cache/')
+
+
+def cache_key(model_id, prompt, params):
+    """Content address for one model invocation.
+
+    The region is left out: every region serves the same model, so a prompt
+    routed to another region (failover, latency routing) still hits.
+    """
+    material = json.dumps({
+        'model_id': model_id,
+        'prompt': prompt,
+        'params': {name: params.get(name) for name in ('max_tokens', 'temperature', 'top_p', 'top_k')},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """LRU cache that lives for the lifetime of a warm Lambda container."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DiskBackend:
+    """JSON files on local disk (e.g. /tmp), evicted oldest-first past max_bytes."""
+
+    name = 'disk'
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+
+class S3Backend:
+    """Objects under a bucket prefix; size-based expiry is left to a bucket lifecycle rule."""
+
+    name = 's3'
+
+    def __init__(self, s3_client, bucket=CACHE_BUCKET, prefix=CACHE_PREFIX, ttl=CACHE_TTL_SECONDS):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                logger.warning(f"Cache read from S3 failed: {e}")
+            return None
+        if time.time() - response['LastModified'].timestamp() > self.ttl:
+            return None
+        return json.loads(response['Body'].read())
+
+    def set(self, key, value):
+        self.s3_client.put_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json",
+                                  Body=json.dumps(value), ContentType='application/json')
+
+
+class ResponseCache:
+    """Tiered response cache with hit/miss counters.
+
+    Backends are checked in order; a hit in a slower tier is copied into
+    the faster ones. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.stats = {'hits': 0, 'misses': 0, 'hits_by_tier': {b.name: 0 for b in backends}}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        for position, backend in enumerate(self.backends):
+            try:
+                value = backend.get(key)
+            except Exception as e:
+                logger.warning(f"Cache backend {backend.name} get failed: {e}")
+                continue
+            if value is not None:
+                self._count('hits', backend.name)
+                for faster in self.backends[:position]:
+                    self._safe_set(faster, key, value)
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        for backend in self.backends:
+            self._safe_set(backend, key, value)
+
+    def _safe_set(self, backend, key, value):
+        try:
+            backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"Cache backend {backend.name} set failed: {e}")
+
+    def _count(self, outcome, tier=None):
+        with self._lock:
+            self.stats[outcome] += 1
+            if tier:
+                self.stats['hits_by_tier'][tier] += 1
+
+
+def build_cache(backend_names=CACHE_BACKENDS, s3_client=None):
+    """Create a ResponseCache from a comma-separated list of backend names."""
+    backends = []
+    for name in [n.strip() for n in backend_names.split(',') if n.strip()]:
+        if name == 'memory':
+            backends.append(MemoryBackend())
+        elif name == 'disk':
+            backends.append(DiskBackend())
+        elif name == 's3':
+            if s3_client is None:
+                raise ValueError("The s3 cache backend needs an S3 client")
+            backends.append(S3Backend(s3_client))
+        else:
+            raise ValueError(f"Unknown cache backend: {name}")
+    return ResponseCache(backends)
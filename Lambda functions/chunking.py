@@ -0,0 +1,162 @@
+import os
+
+# Default room kept for the instruction template, chunk preamble and the response;
+# the evaluator passes the measured size of its own prompts instead
+PROMPT_OVERHEAD_TOKENS = int(os.getenv('PROMPT_OVERHEAD_TOKENS', '2000'))
+RESPONSE_TOKENS = 1024
+# Share of each context window held back, since estimate_tokens only approximates the tokenizer
+TOKEN_ESTIMATE_MARGIN = float(os.getenv('TOKEN_ESTIMATE_MARGIN', '0.1'))
+# Caps on the previous-part context and the scene outline repeated in every chunk prompt
+CHUNK_CONTEXT_MAX_TOKENS = int(os.getenv('CHUNK_CONTEXT_MAX_TOKENS', '1000'))
+OUTLINE_MAX_TOKENS = int(os.getenv('OUTLINE_MAX_TOKENS', '2000'))
+
+# Evaluator prompts open with the script between these markers (the shared, cacheable prefix)
+SCRIPT_START = '<script>'
+SCRIPT_END = '</script>'
+
+# Number of trailing scenes from the previous chunk repeated as context
+CHUNK_OVERLAP_SCENES = int(os.getenv('CHUNK_OVERLAP_SCENES', '1'))
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def render_scenes(scenes):
+    """Serialise scenes the same way the evaluator embeds them in prompts.
+
+    Compact screenplay text: one line per paragraph, no indentation or
+    markup. Scene headings and character cues are upper-cased as in a
+    printed script, a speech is folded onto its cue ("HENRY (quietly): Was
+    it like this with me?") and scenes are separated by a blank line.
+    """
+    return '\n\n'.join(render_scene(scene) for scene in scenes)
+
+
+def render_scene(scene):
+    lines = [scene['heading'].upper()] if scene.get('heading') else []
+    speech = None
+    for element in scene['elements']:
+        kind, text = element['type'], element['text']
+        if kind == 'Character':
+            if speech:
+                lines.append(_speech_line(speech))
+            speech = [text.upper()]
+        elif speech and kind in ('Dialogue', 'Parenthetical'):
+            speech.append(text if kind == 'Dialogue' or text.startswith('(') else f"({text})")
+        else:
+            if speech:
+                lines.append(_speech_line(speech))
+                speech = None
+            lines.append(text)
+    if speech:
+        lines.append(_speech_line(speech))
+    return '\n'.join(lines)
+
+
+def _speech_line(speech):
+    cue, parts = speech[0], speech[1:]
+    # A leading parenthetical belongs to the cue: "HENRY (quietly): ..."
+    while parts and parts[0].startswith('('):
+        cue = f"{cue} {parts.pop(0)}"
+    return f"{cue}: {' '.join(parts)}" if parts else f"{cue}:"
+
+
+def chunk_budget(model_prefix, overhead_tokens=PROMPT_OVERHEAD_TOKENS, response_tokens=RESPONSE_TOKENS):
+    """Tokens of script text that fit in one prompt for the given model.
+
+    What is left of the model's context window (less TOKEN_ESTIMATE_MARGIN)
+    after `overhead_tokens` of instructions and preamble, the previous-part
+    context and `response_tokens` for the answer.
+    """
+    # model_router imports this module, so the catalog is looked up at call time
+    from model_router import MODEL_CATALOG
+    usable = int(MODEL_CATALOG[model_prefix]['context_tokens'] * (1 - TOKEN_ESTIMATE_MARGIN))
+    context = CHUNK_CONTEXT_MAX_TOKENS if CHUNK_OVERLAP_SCENES else 0
+    return usable - overhead_tokens - context - response_tokens
+
+
+def split_scenes(scenes, budget):
+    """Split scenes into chunks of at most `budget` tokens on Scene Heading boundaries.
+
+    A single scene larger than the budget is split between elements into
+    continuation scenes that keep the original heading.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for scene in fit_scenes(scenes, budget):
+        cost = estimate_tokens(render_scenes([scene]))
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(scene)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def fit_scenes(scenes, budget):
+    """Yield scenes, breaking up any that exceed the budget on their own."""
+    for scene in scenes:
+        if estimate_tokens(render_scenes([scene])) <= budget:
+            yield scene
+            continue
+        part = {'heading': scene['heading'], 'elements': []}
+        for element in scene['elements']:
+            candidate = {'heading': scene['heading'], 'elements': part['elements'] + [element]}
+            if part['elements'] and estimate_tokens(render_scenes([candidate])) > budget:
+                yield part
+                part = {'heading': scene['heading'], 'elements': [element]}
+            else:
+                part = candidate
+        if part['elements']:
+            yield part
+
+
+def scene_outline(scenes, max_tokens=OUTLINE_MAX_TOKENS):
+    """Numbered list of scene headings, used to give each chunk act-level context.
+
+    Long scripts list every n-th scene so the outline stays within max_tokens.
+    """
+    lines = [f"{number}. {(scene['heading'] or '(opening)').upper()}" for number, scene in enumerate(scenes, start=1)]
+    outline, step = '\n'.join(lines), 1
+    while estimate_tokens(outline) > max_tokens and step < len(lines):
+        step += 1
+        outline = '\n'.join(lines[::step] + [f"(one in {step} of {len(lines)} scenes listed)"])
+    return outline
+
+
+def context_scenes(chunk, max_tokens=CHUNK_CONTEXT_MAX_TOKENS):
+    """The last CHUNK_OVERLAP_SCENES scenes of a chunk, cut from the front to fit max_tokens."""
+    kept, used = [], 0
+    for scene in reversed(chunk[-CHUNK_OVERLAP_SCENES:] if CHUNK_OVERLAP_SCENES else []):
+        cost = estimate_tokens(render_scenes([scene]))
+        if used + cost <= max_tokens:
+            kept.insert(0, scene)
+            used += cost
+            continue
+        # Keep the end of the scene that does not fit whole: it leads into the next part
+        elements = []
+        used += estimate_tokens(scene.get('heading') or '')
+        for element in reversed(scene['elements']):
+            used += estimate_tokens(element['text']) + 1
+            if used > max_tokens:
+                break
+            elements.insert(0, element)
+        if elements:
+            kept.insert(0, {'heading': scene['heading'], 'elements': elements})
+        break
+    return kept
+
+
+def plan_chunks(scenes, model_prefix, overhead_tokens=PROMPT_OVERHEAD_TOKENS, response_tokens=RESPONSE_TOKENS):
+    """Return the chunks for a model, each with the (trimmed) overlap scenes preceding it."""
+    chunks = split_scenes(scenes, chunk_budget(model_prefix, overhead_tokens, response_tokens))
+    planned = []
+    for index, chunk in enumerate(chunks):
+        previous = context_scenes(chunks[index - 1]) if index else []
+        planned.append({'index': index, 'count': len(chunks), 'scenes': chunk, 'context_scenes': previous})
+    return planned
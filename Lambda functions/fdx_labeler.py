@@ -0,0 +1,83 @@
+import re
+
+# Annotation labels produced directly from FDX paragraph types
+TYPE_LABELS = {
+    'Scene Heading': 'SCENE HEADING',
+    'Character': 'CHARACTER',
+    'Dialogue': 'LINE',
+    'Parenthetical': 'LINE',
+    'Transition': 'TRANSITION',
+}
+LABELS = ['DESCRIPTION', 'SCENE HEADING', 'CHARACTER INTRODUCTION', 'CHARACTER', 'LINE', 'TRANSITION']
+
+TRANSITION_PATTERN = re.compile(r'^(FADE (IN|OUT|TO)|CUT TO|DISSOLVE TO|SMASH CUT|MATCH CUT)\b.*[:.]?$', re.IGNORECASE)
+HEADING_PATTERN = re.compile(r'^(INT|EXT|INT\./EXT|I/E)[. ]', re.IGNORECASE)
+# Runs of upper-case words, e.g. "WALTER MAST" or "A WOMAN CRIES OUT"
+CAPS_PATTERN = re.compile(r"\b[A-Z][A-Z'\-]+(?:\s+[A-Z][A-Z'\-]+)*\b")
+# Character cue extensions such as (V.O.) or (CONT'D)
+CUE_EXTENSION_PATTERN = re.compile(r'\s*\(.*?\)\s*')
+POSSESSIVE_PATTERN = re.compile(r"'S\b")
+
+
+def cue_name(text):
+    """Normalise a Character cue to the bare name."""
+    return CUE_EXTENSION_PATTERN.sub(' ', text).strip().upper()
+
+
+def mentions(name, run):
+    """True if a capitals run names the character as whole words ("AL" is not in "WALTER")."""
+    words = ' '.join(POSSESSIVE_PATTERN.sub('', run).split())
+    return f" {' '.join(name.split())} " in f" {words} "
+
+
+def label_scenes(scenes):
+    """Label every paragraph of the scene model.
+
+    Returns a list of {"text", "type", "label"} entries in script order.
+    `label` is None for paragraphs whose label cannot be decided from the
+    FDX structure; those are left for the model.
+    """
+    cues = {cue_name(e['text']) for scene in scenes for e in scene['elements'] if e['type'] == 'Character'}
+    introduced = set()
+
+    entries = []
+    for scene in scenes:
+        if scene['heading']:
+            entries.append({'text': scene['heading'], 'type': 'Scene Heading', 'label': 'SCENE HEADING'})
+        for element in scene['elements']:
+            entries.append({'text': element['text'], 'type': element['type'],
+                            'label': _label(element, cues, introduced)})
+    return entries
+
+
+def _label(element, cues, introduced):
+    paragraph_type, text = element['type'], element['text']
+    if paragraph_type == 'Character':
+        introduced.add(cue_name(text))
+    if paragraph_type in TYPE_LABELS:
+        return TYPE_LABELS[paragraph_type]
+    if TRANSITION_PATTERN.match(text):
+        return 'TRANSITION'
+    if paragraph_type != 'Action':
+        return 'SCENE HEADING' if HEADING_PATTERN.match(text) else None
+
+    # Screenplay convention: a character's name is in capitals on first appearance
+    caps = [run for run in CAPS_PATTERN.findall(text) if len(run) > 1]
+    if not caps:
+        return 'DESCRIPTION'
+    new_names = {name for name in cues - introduced if any(mentions(name, run) for run in caps)}
+    if new_names:
+        introduced.update(new_names)
+        return 'CHARACTER INTRODUCTION'
+    return None
+
+
+def render_annotations(entries):
+    """Render labelled entries in the annotator's output format."""
+    lines = []
+    for entry in entries:
+        if entry['label']:
+            lines.append(f"**[{entry['label']}: {entry['text']}]**")
+        else:
+            lines.append(f"Uncertain about labeling: {entry['text']}")
+    return '\n'.join(lines)
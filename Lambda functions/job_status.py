@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+
+from aws_clients import lazy_client
+from jobs import build_job_store
+from storage import OUTPUT_PREFIX
+from streaming import stream_progress
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Bucket call_bedrock streams partial outputs to, and how much of each generation's latest part is shown
+RESPONSE_BUCKET = os.getenv('RESPONSE_BUCKET', 'storifyresponse')
+PROGRESS_TEXT_CHARS = int(os.getenv('PROGRESS_TEXT_CHARS', '2000'))
+
+s3_client = lazy_client('s3')
+job_store = build_job_store(s3_client=s3_client)
+
+def response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(body)
+    }
+
+def evaluation_progress(script_hash):
+    """Latest streamed text of each generation in flight for a script (see streaming.IncrementalS3Writer)."""
+    prefix = f"{OUTPUT_PREFIX}{script_hash}/"
+    try:
+        streams = stream_progress(s3_client, RESPONSE_BUCKET, prefix, PROGRESS_TEXT_CHARS)
+    except Exception:
+        # Progress is best effort; the stage status is still reported
+        logger.error("Failed to list streamed progress", exc_info=True)
+        return []
+    progress = []
+    for stream in streams:
+        # outputs/<script_hash>/<dimension>/<model>/<params>.json
+        dimension, model = stream['key'][len(prefix):].split('/')[:2]
+        progress.append({'dimension': dimension, 'model': model, 'parts': stream['parts'], 'text': stream['text']})
+    return progress
+
+def lambda_handler(event, context):
+    """GET /jobs/{job_id} for stage status, GET /jobs/{job_id}/results for evaluations."""
+    job_id = (event.get('pathParameters') or {}).get('job_id') \
+        or (event.get('queryStringParameters') or {}).get('job_id')
+    if not job_id:
+        return response(400, {'error': "Missing 'job_id'"})
+
+    try:
+        job = job_store.get(job_id)
+    except Exception:
+        logger.error("Failed to load job", exc_info=True)
+        return response(500, {'error': "Internal server error"})
+    if job is None:
+        return response(404, {'error': f"Unknown job {job_id}"})
+
+    path = event.get('rawPath') or event.get('path') or ''
+    if path.rstrip('/').endswith('/results'):
+        if job['status'] == 'succeeded':
+            return response(200, {'job_id': job_id, 'result': job['result']})
+        if job['status'] == 'failed':
+            return response(409, {'job_id': job_id, 'status': job['status'], 'error': job['error'],
+                                  'result': job['result']})
+        return response(202, {'job_id': job_id, 'status': job['status']})
+
+    summary = {key: value for key, value in job.items() if key != 'result'}
+    if (job['stages'].get('evaluate') or {}).get('status') == 'running' and job.get('script_hash'):
+        summary['progress'] = evaluation_progress(job['script_hash'])
+    return response(200, summary)
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+
+from aws_clients import lazy_client
+from fdx_parser import parse_fdx
+from jobs import build_job_queue, build_job_store
+from resilience import classify
+from scene_diff import build_manifest, revision_summary
+from storage import ArtifactStore, HashingReader, batch_result_key, manifest_key, parsed_key, records_key, script_key
+import tracing
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Configuration constants
+BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'storyfyscripts')
+LAMBDA_FUNCTION_ARN = os.getenv('LAMBDA_FUNCTION_ARN', 'arn:aws:lambda:eu-west-2:039612872581:function:script_evaluator')
+# Run the evaluator and Bedrock calls inside this worker instead of invoking script_evaluator
+EVALUATE_IN_PROCESS = os.getenv('EVALUATE_IN_PROCESS', 'false').lower() == 'true'
+# Direct uploads larger than this fail their parse stage instead of being parsed
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(50 * 1024 * 1024)))
+# Attempts per stage message before the stage is marked failed; match the queue's maxReceiveCount
+MAX_STAGE_ATTEMPTS = int(os.getenv('MAX_STAGE_ATTEMPTS', '3'))
+# Stream generations, so GET /jobs/{job_id} can show their partial text while the evaluate stage runs
+STREAM_EVALUATIONS = os.getenv('STREAM_EVALUATIONS', 'false').lower() == 'true'
+# Also add extracted records to the local SQLite index at RESULTS_DB_PATH (for single-host runs)
+INDEX_RESULTS = os.getenv('INDEX_RESULTS', 'false').lower() == 'true'
+
+s3_client = lazy_client('s3')
+lambda_client = lazy_client('lambda', read_timeout=900)
+job_store = build_job_store(s3_client=s3_client)
+job_queue = build_job_queue(sqs_client=lazy_client('sqs'))
+artifact_store = ArtifactStore(s3_client, BUCKET_NAME)
+_results_index = None
+
+def run_parse(job):
+    """Stream the uploaded script from S3 into the scene model and store it."""
+    if job.get('upload_key') and not job.get('script_hash'):
+        return run_parse_upload(job)
+    key = parsed_key(job['script_hash'])
+    # A script with this content has been parsed before
+    if artifact_store.exists(key):
+        return {'parsed_key': key, 'reused': True}
+
+    response = s3_client.get_object(Bucket=BUCKET_NAME, Key=job['script_key'])
+    scenes = parse_fdx(response['Body'])
+    artifact_store.put_json(key, {"scenes": scenes})
+    return {'parsed_key': key, 'scenes': len(scenes)}
+
+def run_parse_upload(job):
+    """Parse a direct upload (see upload_ingest), hashing it in the same pass; store both under its hash.
+
+    The job gets its script_hash only once the script and scene model are
+    stored, so a retry after that point takes run_parse's usual path.
+    """
+    key, size = job['upload_key'], job.get('upload_bytes')
+    if size == 0:
+        raise ValueError("Empty file content")
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Upload of {size} bytes exceeds the {MAX_UPLOAD_BYTES} byte limit")
+    body = HashingReader(s3_client.get_object(Bucket=BUCKET_NAME, Key=key)['Body'])
+    scenes = parse_fdx(body)
+    script_hash = body.hexdigest()
+
+    # Identical scripts share one object and one parsed copy
+    artifact_store.copy_if_absent(key, script_key(script_hash))
+    artifact_store.put_if_absent(parsed_key(script_hash), json.dumps({"scenes": scenes}), 'application/json')
+    job_store.update(job['job_id'], script_hash=script_hash, script_key=script_key(script_hash),
+                     upload_bytes=body.size)
+    try:
+        artifact_store.delete(key)
+    except Exception:
+        # The bucket's lifecycle rule expires leftover uploads
+        logger.warning(f"Could not delete upload {key}", exc_info=True)
+    return {'parsed_key': parsed_key(script_hash), 'scenes': len(scenes)}
+
+def run_evaluate(job):
+    """Run script_evaluator on the parsed script and store its evaluations on the job."""
+    script_data = artifact_store.get_json(job['stages']['parse']['parsed_key'])
+    script_data['script_hash'] = job['script_hash']
+    script_data[tracing.CORRELATION_FIELD] = job.get(tracing.CORRELATION_FIELD)
+    if job.get('bypass_cache'):
+        script_data['bypass_cache'] = True
+    if STREAM_EVALUATIONS:
+        script_data['stream'] = True
+    project_id = job.get('project_id')
+    if project_id:
+        # The evaluator cuts revision-stable chunks; unchanged ones are served from stored outputs
+        script_data['project_id'] = project_id
+        previous = artifact_store.get_json(manifest_key(project_id))
+        manifest = build_manifest(project_id, job['script_hash'], script_data['scenes'])
+    if EVALUATE_IN_PROCESS:
+        import pipeline
+        result = pipeline.evaluate_scenes(script_data)
+        status_code = result.pop('statusCode')
+        body = result
+    else:
+        response = lambda_client.invoke(
+            FunctionName=LAMBDA_FUNCTION_ARN,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(script_data)
+        )
+        payload = json.load(response['Payload'])
+        if response.get('FunctionError'):
+            # The evaluator raised or timed out: its payload is the error, not a response. Retried like any
+            # transient failure, so a KeyError on the missing statusCode cannot pass for bad input
+            raise RuntimeError(f"script_evaluator failed: {payload.get('errorType')}: {payload.get('errorMessage')}")
+        status_code, body = payload['statusCode'], json.loads(payload['body'])
+    if project_id:
+        body['revision'] = revision_summary(previous, manifest, body.get('evaluations'))
+        if status_code < 500:
+            artifact_store.put_json(manifest_key(project_id), manifest)
+    job_store.set_result(job['job_id'], body)
+    if job.get('batch_id'):
+        # A batch script's result is also listed under its batch
+        artifact_store.put_json(batch_result_key(job['batch_id'], job['script_hash']),
+                                dict(body, statusCode=status_code, script=job.get('script_name'),
+                                     script_hash=job['script_hash']))
+    if status_code >= 500:
+        raise RuntimeError(body.get('message', 'Evaluation failed'))
+    return {'message': body.get('message')}
+
+def run_extract(job):
+    """Parse the evaluations into structured records (rating, strengths, improvements) and store them."""
+    from results_index import store_records
+    result = job.get('result') or {}
+    records = store_records(artifact_store, job['script_hash'], result.get('evaluations'), index=results_index(),
+                            script_name=job.get('script_name'), project_id=job.get('project_id'))
+    return {'records_key': records_key(job['script_hash']), 'records': len(records),
+            'rated': sum(1 for record in records if record['rating'] is not None)}
+
+def results_index():
+    """The local SQLite results index when INDEX_RESULTS is set (local and single-host runs), else None."""
+    global _results_index
+    if not INDEX_RESULTS:
+        return None
+    if _results_index is None:
+        from results_index import ResultsIndex
+        _results_index = ResultsIndex()
+    return _results_index
+
+def run_batch(job):
+    """Parse every script of a batch job and queue each one as a job of its own, listed in the batch's result."""
+    import batch_ingest
+    return batch_ingest.run_batch_job(job, lambda results: job_store.set_result(job['job_id'], {'scripts': results}))
+
+STAGE_HANDLERS = {
+    'parse': run_parse,
+    'evaluate': run_evaluate,
+    'extract': run_extract,
+    'batch': run_batch,
+}
+
+def is_permanent(error):
+    """Failures a retry cannot fix: bad input, or a request the model service rejects outright."""
+    return isinstance(error, (ValueError, KeyError)) or classify(error) == 'fatal'
+
+def process_message(message, attempt=1):
+    """Run one queued stage of a job and enqueue the next one.
+
+    A transient failure is re-raised so the queue redelivers the message,
+    until the stage has had MAX_STAGE_ATTEMPTS attempts; the stage is then
+    marked failed. Permanent failures fail the stage at once.
+    """
+    job_id, stage = message['job_id'], message['stage']
+    job = job_store.get(job_id)
+    if job is None:
+        logger.error(f"Unknown job {job_id}")
+        return
+    # Queues deliver at least once; a finished stage is not run again
+    if job['stages'][stage]['status'] == 'succeeded':
+        logger.info(f"Stage {stage} of job {job_id} already succeeded")
+        return
+
+    if attempt > MAX_STAGE_ATTEMPTS:
+        # Earlier deliveries ended without a result (the worker timed out or crashed)
+        logger.error(f"Stage {stage} of job {job_id} delivered {attempt} times; marking it failed")
+        job_store.update_stage(job_id, stage, 'failed', attempts=attempt,
+                               error=f"Stage did not finish in {MAX_STAGE_ATTEMPTS} attempts")
+        return
+
+    job = job_store.update_stage(job_id, stage, 'running', attempts=attempt)
+    try:
+        with tracing.bind(job.get(tracing.CORRELATION_FIELD)), tracing.span(f"stage_{stage}", job_id=job_id):
+            fields = STAGE_HANDLERS[stage](job)
+    except Exception as e:
+        if not is_permanent(e) and attempt < MAX_STAGE_ATTEMPTS:
+            logger.warning(f"Stage {stage} of job {job_id} failed on attempt {attempt}; will retry", exc_info=True)
+            job_store.update_stage(job_id, stage, 'retrying', error=str(e), attempts=attempt)
+            raise
+        logger.error(f"Stage {stage} of job {job_id} failed", exc_info=True)
+        job_store.update_stage(job_id, stage, 'failed', error=str(e), attempts=attempt)
+        return
+    if attempt > 1:
+        # Replace the error and attempt count left by the earlier, failed attempts
+        fields.update(error=None, attempts=attempt)
+    job_store.update_stage(job_id, stage, 'succeeded', **fields)
+
+    stages = list(job['stages'])
+    if stages.index(stage) + 1 < len(stages):
+        job_queue.send({'job_id': job_id, 'stage': stages[stages.index(stage) + 1]})
+
+def fail_dead_letter(message):
+    """Mark the stage of a dead-lettered message failed.
+
+    A message reaches the dead-letter queue when every delivery ended
+    without reporting back, e.g. because the worker timed out, so
+    process_message never got to record the failure.
+    """
+    job_id, stage = message['job_id'], message['stage']
+    job = job_store.get(job_id)
+    if job is None:
+        logger.error(f"Unknown job {job_id}")
+        return
+    entry = job['stages'][stage]
+    if entry['status'] in ('succeeded', 'failed'):
+        return
+    logger.error(f"Stage {stage} of job {job_id} was dead-lettered in state {entry['status']}")
+    job_store.update_stage(job_id, stage, 'failed', attempts=entry.get('attempts'),
+                           error=f"Stage did not finish in {MAX_STAGE_ATTEMPTS} attempts "
+                                 f"(last state: {entry['status']}; the worker timed out or crashed)")
+
+def drain_queue(queue=None):
+    """Process messages until the queue is empty (local runs without an SQS trigger)."""
+    queue = queue or job_queue
+    processed = 0
+    attempts = {}
+    while True:
+        messages = queue.receive(10)
+        if not messages:
+            return processed
+        for receipt, message in messages:
+            key = (message['job_id'], message['stage'])
+            attempts[key] = attempts.get(key, 0) + 1
+            try:
+                process_message(message, attempts[key])
+            except Exception:
+                # What SQS redelivery does in AWS
+                queue.send(message)
+            queue.delete(receipt)
+            processed += 1
+
+def lambda_handler(event, context):
+    # SQS trigger: one stage message per record
+    # Transient failures are reported per message (ReportBatchItemFailures), so only those are redelivered
+    records = event.get('Records', [])
+    failures = []
+    for record in records:
+        attempt = int(record.get('attributes', {}).get('ApproximateReceiveCount', 1))
+        try:
+            process_message(json.loads(record['body']), attempt)
+        except Exception:
+            failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': failures}
+
+def dead_letter_handler(event, context):
+    # SQS trigger on the dead-letter queue: stage messages that exhausted their deliveries
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            fail_dead_letter(json.loads(record['body']))
+        except Exception:
+            logger.error("Could not record a dead-lettered stage", exc_info=True)
+            failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': failures}
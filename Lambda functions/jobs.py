@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+logger = logging.getLogger()
+
+# Stages every evaluation job goes through, in order
+STAGES = ['parse', 'evaluate', 'extract']
+
+# Backend selection: s3 | sqlite for state, sqs | memory for the queue
+JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 's3')
+JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqs')
+JOB_BUCKET = os.getenv('JOB_BUCKET', os.getenv('S3_BUCKET_NAME', 'storyfyscripts'))
+JOB_PREFIX = os.getenv('JOB_PREFIX', 'jobs/')
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', '/tmp/jobs.sqlite3')
+JOB_QUEUE_URL = os.getenv('JOB_QUEUE_URL', '')
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def new_job(stages=STAGES, **fields):
+    """Return a fresh job record with every stage pending."""
+    created = now()
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'status': 'queued',
+        'created_at': created,
+        'updated_at': created,
+        'stages': {stage: {'status': 'pending'} for stage in stages},
+        'result': None,
+        'error': None,
+    }
+    job.update(fields)
+    return job
+
+
+class JobStore:
+    """Persists job records. Subclasses implement load/save."""
+
+    def load(self, job_id):
+        raise NotImplementedError
+
+    def save(self, job):
+        raise NotImplementedError
+
+    def create(self, job):
+        self.save(job)
+        return job
+
+    def get(self, job_id):
+        return self.load(job_id)
+
+    def update_stage(self, job_id, stage, status, **fields):
+        """Record a stage transition and derive the overall job status."""
+        job = self.load(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        entry = job['stages'][stage]
+        entry['status'] = status
+        entry[f"{status}_at"] = now()
+        entry.update(fields)
+
+        statuses = [s['status'] for s in job['stages'].values()]
+        if 'failed' in statuses:
+            job['status'] = 'failed'
+            job['error'] = job['error'] or fields.get('error')
+        elif all(s == 'succeeded' for s in statuses):
+            job['status'] = 'succeeded'
+        elif 'running' in statuses or 'succeeded' in statuses:
+            job['status'] = 'running'
+        job['updated_at'] = now()
+        self.save(job)
+        return job
+
+    def set_result(self, job_id, result):
+        job = self.load(job_id)
+        job['result'] = result
+        job['updated_at'] = now()
+        self.save(job)
+        return job
+
+    def claim(self, job_id, expected_status, status, **fields):
+        """Move the job from expected_status to status, atomically, setting `fields` with it.
+
+        Returns the updated job, or None if the job is missing or another
+        caller moved it first.
+        """
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        """Set top-level fields of a job (e.g. the script hash, once a direct upload arrives)."""
+        job = self.load(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        job.update(fields)
+        job['updated_at'] = now()
+        self.save(job)
+        return job
+
+
+class SQLiteJobStore(JobStore):
+    """Local stand-in; use path=':memory:' for a throwaway store."""
+
+    def __init__(self, path=JOB_DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, body TEXT NOT NULL)')
+
+    def load(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, job):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO jobs (job_id, body) VALUES (?, ?)',
+                               (job['job_id'], json.dumps(job)))
+
+    def claim(self, job_id, expected_status, status, **fields):
+        job = self.load(job_id)
+        if job is None or job['status'] != expected_status:
+            return None
+        job.update(fields, status=status)
+        job['updated_at'] = now()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET body = ? WHERE job_id = ? AND json_extract(body, '$.status') = ?",
+                (json.dumps(job), job_id, expected_status))
+        return job if cursor.rowcount == 1 else None
+
+
+def supports_conditional_put(s3_client):
+    """True if the S3 client's PutObject takes IfMatch (botocore releases since late 2024)."""
+    meta = getattr(s3_client, 'meta', None)
+    if meta is None:
+        # local_backends.LocalS3Client
+        return True
+    return 'IfMatch' in meta.service_model.operation_model('PutObject').input_shape.members
+
+
+class S3JobStore(JobStore):
+    """One JSON object per job under a bucket prefix."""
+
+    def __init__(self, s3_client, bucket=JOB_BUCKET, prefix=JOB_PREFIX):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def load(self, job_id):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{job_id}.json")
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(response['Body'].read())
+
+    def save(self, job):
+        self.s3_client.put_object(Bucket=self.bucket, Key=f"{self.prefix}{job['job_id']}.json",
+                                  Body=json.dumps(job), ContentType='application/json')
+
+    def claim(self, job_id, expected_status, status, **fields):
+        if not supports_conditional_put(self.s3_client):
+            # Without If-Match the write below would be unconditional, and every caller would win the claim
+            raise RuntimeError("This botocore's PutObject has no IfMatch; bundle boto3>=1.36 with the function")
+        key = f"{self.prefix}{job_id}.json"
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        job = json.loads(response['Body'].read())
+        if job['status'] != expected_status:
+            return None
+        job.update(fields, status=status)
+        job['updated_at'] = now()
+        try:
+            # Conditional write: fails if the record changed since it was read
+            self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=json.dumps(job),
+                                      ContentType='application/json', IfMatch=response['ETag'])
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('PreconditionFailed',
+                                                                           'ConditionalRequestConflict'):
+                return None
+            raise
+        return job
+
+
+class JobQueue:
+    """Delivers stage messages to workers. Subclasses implement send/receive/delete."""
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def receive(self, max_messages=1):
+        """Return a list of (receipt, message) pairs; empty when nothing is waiting."""
+        raise NotImplementedError
+
+    def delete(self, receipt):
+        raise NotImplementedError
+
+
+class InMemoryJobQueue(JobQueue):
+    """Local stand-in for SQS within a single process."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def send(self, message):
+        self._queue.put(json.dumps(message))
+
+    def receive(self, max_messages=1):
+        messages = []
+        while len(messages) < max_messages:
+            try:
+                messages.append((None, json.loads(self._queue.get_nowait())))
+            except queue.Empty:
+                break
+        return messages
+
+    def delete(self, receipt):
+        pass
+
+
+class SQSJobQueue(JobQueue):
+    def __init__(self, sqs_client, queue_url=JOB_QUEUE_URL):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+
+    def send(self, message):
+        self.sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(message))
+
+    def receive(self, max_messages=1):
+        response = self.sqs_client.receive_message(QueueUrl=self.queue_url,
+                                                   MaxNumberOfMessages=min(max_messages, 10), WaitTimeSeconds=1)
+        return [(m['ReceiptHandle'], json.loads(m['Body'])) for m in response.get('Messages', [])]
+
+    def delete(self, receipt):
+        self.sqs_client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+
+def build_job_store(backend=JOB_STORE_BACKEND, s3_client=None):
+    if backend == 's3':
+        return S3JobStore(s3_client)
+    if backend == 'sqlite':
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+
+def build_job_queue(backend=JOB_QUEUE_BACKEND, sqs_client=None):
+    if backend == 'sqs':
+        return SQSJobQueue(sqs_client)
+    if backend == 'memory':
+        return InMemoryJobQueue()
+    raise ValueError(f"Unknown job queue backend: {backend}")
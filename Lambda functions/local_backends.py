@@ -0,0 +1,304 @@
+"""Offline stand-ins for Bedrock, S3, Lambda and SQS.
+
+install() registers them with aws_clients, so every handler that obtains
+its clients through get_client() runs locally: Bedrock answers after a
+configurable, token-proportional delay (and can throttle), S3 objects
+live in a directory on disk, Lambda invokes call the target module's
+lambda_handler in-process and SQS is an in-memory queue. Setting
+AWS_LOCAL_ROOT installs the defaults automatically.
+"""
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import aws_clients
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:  # botocore is optional for local runs
+    class ClientError(Exception):
+        def __init__(self, error_response, operation_name):
+            super().__init__(f"An error occurred ({error_response['Error']['Code']}) when calling the "
+                             f"{operation_name} operation: {error_response['Error'].get('Message', '')}")
+            self.response = error_response
+            self.operation_name = operation_name
+
+
+def client_error(code, message, operation_name, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': message},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, operation_name)
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class FakeBedrockClient:
+    """bedrock-runtime stand-in with latency, token-proportional delay and throttling.
+
+    Each call takes `latency + input_tokens * input_token_delay +
+    output_tokens * output_token_delay` seconds. A request is rejected with
+    ThrottlingException with probability `throttle_rate`, or whenever more
+    than `max_concurrent` requests are already in flight.
+    """
+
+    def __init__(self, latency=0.05, input_token_delay=0.000002, output_token_delay=0.0005,
+                 output_tokens=300, throttle_rate=0.0, max_concurrent=None, seed=None):
+        self.latency = latency
+        self.input_token_delay = input_token_delay
+        self.output_token_delay = output_token_delay
+        self.output_tokens = output_tokens
+        self.throttle_rate = throttle_rate
+        self.max_concurrent = max_concurrent
+        self.calls = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _admit(self, operation_name):
+        with self._lock:
+            self.calls += 1
+            over_limit = self.max_concurrent is not None and self._in_flight >= self.max_concurrent
+            if over_limit or self._random.random() < self.throttle_rate:
+                self.throttled += 1
+                raise client_error('ThrottlingException', 'Too many requests, please wait before trying again.',
+                                   operation_name, 429)
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _generation(self, request):
+        max_tokens = request.get('max_tokens', self.output_tokens)
+        output_tokens = min(self.output_tokens, max_tokens)
+        words = ['Solid', 'structure', 'with', 'room', 'to', 'tighten', 'act', 'two.']
+        text = ' '.join(words[i % len(words)] for i in range(max(0, output_tokens - 12)))
+        # An answer longer than max_tokens is cut off, as Bedrock reports it
+        truncated = self.output_tokens > max_tokens
+        return f"- **Strengths**: {text}\n\n**Rating**: I would rate this script **7/10**.", output_tokens, truncated
+
+    def invoke_model(self, body, modelId, contentType=None, accept=None):
+        request = json.loads(body)
+        self._admit('InvokeModel')
+        try:
+            input_tokens = estimate_tokens(request.get('prompt') or json.dumps(request.get('messages', '')))
+            text, output_tokens, truncated = self._generation(request)
+            time.sleep(self.latency + input_tokens * self.input_token_delay + output_tokens * self.output_token_delay)
+        finally:
+            self._release()
+        if modelId.startswith('anthropic.'):
+            data = {'type': 'message', 'role': 'assistant', 'model': modelId,
+                    'content': [{'type': 'text', 'text': text}], 'stop_reason': 'max_tokens' if truncated else 'end_turn',
+                    'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}}
+        else:
+            data = {'outputs': [{'text': text, 'stop_reason': 'length' if truncated else 'stop'}]}
+        return {'body': io.BytesIO(json.dumps(data).encode('utf-8')), 'contentType': 'application/json'}
+
+    def invoke_model_with_response_stream(self, body, modelId, contentType=None, accept=None):
+        request = json.loads(body)
+        self._admit('InvokeModelWithResponseStream')
+        input_tokens = estimate_tokens(request.get('prompt') or json.dumps(request.get('messages', '')))
+        text, output_tokens, truncated = self._generation(request)
+
+        def events():
+            try:
+                time.sleep(self.latency + input_tokens * self.input_token_delay)
+                pieces = text.split(' ')
+                for index, piece in enumerate(pieces):
+                    time.sleep(output_tokens * self.output_token_delay / len(pieces))
+                    piece = piece if index == 0 else f" {piece}"
+                    if modelId.startswith('anthropic.'):
+                        chunk = {'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': piece}}
+                    else:
+                        last = index == len(pieces) - 1
+                        chunk = {'outputs': [{'text': piece, 'stop_reason': ('length' if truncated else 'stop') if last
+                                              else None}]}
+                    yield {'chunk': {'bytes': json.dumps(chunk).encode('utf-8')}}
+                if modelId.startswith('anthropic.'):
+                    delta = {'type': 'message_delta', 'delta': {'stop_reason': 'max_tokens' if truncated else 'end_turn'}}
+                    yield {'chunk': {'bytes': json.dumps(delta).encode('utf-8')}}
+                final = {'type': 'message_stop', 'amazon-bedrock-invocationMetrics': {
+                    'inputTokenCount': input_tokens, 'outputTokenCount': output_tokens}}
+                yield {'chunk': {'bytes': json.dumps(final).encode('utf-8')}}
+            finally:
+                self._release()
+
+        return {'body': events(), 'contentType': 'application/json'}
+
+
+class LocalS3Client:
+    """S3 stand-in storing objects as files under root/<bucket>/<key>."""
+
+    def __init__(self, root):
+        self.root = root
+        # Serialises conditional writes (IfMatch / IfNoneMatch)
+        self._lock = threading.Lock()
+        # Content MD5 per file, as S3 reports for single-part uploads, keyed on its size and mtime
+        self._etags = {}
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def put_object(self, Bucket, Key, Body=b'', ContentType=None, IfMatch=None, IfNoneMatch=None, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        if IfMatch is None and IfNoneMatch is None:
+            return self._write(path, Body)
+        with self._lock:
+            exists = os.path.isfile(path)
+            if IfMatch is not None and not exists:
+                raise client_error('NoSuchKey', 'The specified key does not exist.', 'PutObject', 404)
+            if (IfMatch is not None and self._etag(path) != IfMatch) or (IfNoneMatch == '*' and exists):
+                raise client_error('PreconditionFailed', 'At least one of the pre-conditions you specified '
+                                   'did not hold', 'PutObject', 412)
+            return self._write(path, Body)
+
+    def _write(self, path, body):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        stat = os.stat(path)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self._etags[path] = (stat.st_size, stat.st_mtime_ns, etag)
+        return {'ETag': etag}
+
+    def _etag(self, path):
+        # Recomputed when the file changed behind this client (e.g. another process wrote it)
+        stat = os.stat(path)
+        cached = self._etags.get(path)
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            digest = hashlib.md5()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            cached = self._etags[path] = (stat.st_size, stat.st_mtime_ns, f'"{digest.hexdigest()}"')
+        return cached[2]
+
+    def _stat(self, Bucket, Key, operation_name):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            if operation_name == 'HeadObject':
+                raise client_error('404', 'Not Found', operation_name, 404)
+            raise client_error('NoSuchKey', 'The specified key does not exist.', operation_name, 404)
+        stat = os.stat(path)
+        return path, {'ContentLength': stat.st_size, 'ETag': self._etag(path),
+                      'LastModified': datetime.fromtimestamp(stat.st_mtime, timezone.utc)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return self._stat(Bucket, Key, 'HeadObject')[1]
+
+    def get_object(self, Bucket, Key, **kwargs):
+        path, meta = self._stat(Bucket, Key, 'GetObject')
+        # A real file handle, so readers can stream it like a StreamingBody
+        return dict(meta, Body=open(path, 'rb'))
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._etags.pop(self._path(Bucket, Key), None)
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        for obj in Delete['Objects']:
+            self.delete_object(Bucket, obj['Key'])
+        return {'Deleted': Delete['Objects']}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        source = self._stat(CopySource['Bucket'], CopySource['Key'], 'CopyObject')[0]
+        with open(source, 'rb') as f:
+            return self.put_object(Bucket=Bucket, Key=Key, Body=f.read())
+
+    def list_objects_v2(self, Bucket, Prefix='', **kwargs):
+        base = os.path.join(self.root, Bucket)
+        contents = []
+        for directory, _, files in os.walk(base):
+            for name in files:
+                key = os.path.relpath(os.path.join(directory, name), base).replace(os.sep, '/')
+                if key.startswith(Prefix) and not key.endswith('.tmp'):
+                    contents.append({'Key': key, 'Size': os.path.getsize(os.path.join(directory, name))})
+        contents.sort(key=lambda item: item['Key'])
+        return {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': False}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        return 'file://' + self._path(Params['Bucket'], Params['Key'])
+
+
+class LocalLambdaClient:
+    """Lambda stand-in: invokes `<module>.lambda_handler` in-process.
+
+    The module is the last segment of the function ARN or name, e.g.
+    arn:aws:lambda:...:function:script_evaluator -> script_evaluator.
+    """
+
+    def __init__(self, functions=None):
+        self.functions = dict(functions or {})
+
+    def _handler(self, function_name):
+        name = function_name.split(':function:')[-1].split(':')[0]
+        if name not in self.functions:
+            self.functions[name] = importlib.import_module(name).lambda_handler
+        return self.functions[name]
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload=b'{}', **kwargs):
+        handler = self._handler(FunctionName)
+        event = json.loads(Payload)
+        if InvocationType == 'Event':
+            threading.Thread(target=handler, args=(event, None), daemon=True).start()
+            return {'StatusCode': 202, 'Payload': io.BytesIO(b'')}
+        result = handler(event, None)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result).encode('utf-8'))}
+
+
+class LocalSQSClient:
+    """In-memory SQS stand-in shared by every handler in the process."""
+
+    def __init__(self):
+        self._messages = queue.Queue()
+        self._counter = itertools.count(1)
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        message_id = str(next(self._counter))
+        self._messages.put({'MessageId': message_id, 'ReceiptHandle': message_id, 'Body': MessageBody})
+        return {'MessageId': message_id}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, **kwargs):
+        messages = []
+        while len(messages) < MaxNumberOfMessages:
+            try:
+                messages.append(self._messages.get_nowait())
+            except queue.Empty:
+                break
+        return {'Messages': messages} if messages else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        return {}
+
+
+def install(root, bedrock=None, lambda_functions=None):
+    """Route get_client() for bedrock-runtime, s3, lambda and sqs to local stand-ins."""
+    clients = {
+        'bedrock-runtime': bedrock or FakeBedrockClient(),
+        's3': LocalS3Client(root),
+        'lambda': LocalLambdaClient(lambda_functions),
+        'sqs': LocalSQSClient(),
+    }
+    for service, client in clients.items():
+        aws_clients.register_backend(service, lambda region_name=None, client=client, **config: client)
+    return clients
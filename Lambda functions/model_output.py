@@ -0,0 +1,111 @@
+import re
+
+RATING_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*/\s*10')
+# Stop reasons that mean the response was cut off by max_tokens
+TRUNCATED_STOP_REASONS = {'max_tokens', 'length'}
+
+
+def extract_text(response_data):
+    """Return the generated text from a Bedrock invoke_model response body."""
+    if not isinstance(response_data, dict):
+        return ''
+    # Anthropic messages API
+    if isinstance(response_data.get('content'), list):
+        return ''.join(block.get('text', '') for block in response_data['content'])
+    # Mistral
+    if isinstance(response_data.get('outputs'), list):
+        return ''.join(output.get('text', '') for output in response_data['outputs'])
+    # Llama / Anthropic text completions
+    return response_data.get('generation') or response_data.get('completion') or ''
+
+
+def stop_reason(response_data):
+    """Why the model stopped generating, as the provider reports it (None when unknown)."""
+    if not isinstance(response_data, dict):
+        return None
+    if response_data.get('stop_reason'):
+        return response_data['stop_reason']
+    for output in reversed(response_data.get('outputs') or []):
+        if output.get('stop_reason'):
+            return output['stop_reason']
+    return None
+
+
+def is_truncated(response_data):
+    """True when generation stopped at max_tokens (Anthropic 'max_tokens', Mistral 'length')."""
+    return stop_reason(response_data) in TRUNCATED_STOP_REASONS
+
+
+def extract_rating(text):
+    """Return the last "N/10" rating in a model response, or None."""
+    matches = RATING_PATTERN.findall(text or '')
+    if not matches:
+        return None
+    rating = float(matches[-1])
+    return rating if 0 <= rating <= 10 else None
+
+
+# A section starts with a bold heading at the start of a line, optionally as a list item:
+# "- **Strengths**: ...", "**Rating**: ...", "2. **Plot Twists**: ..."
+SECTION_PATTERN = re.compile(r'^\s*(?:[-*•]|\d+[.)])?\s*\*\*(?P<name>[^*\n]+?)\*\*\s*:?\s*(?P<rest>.*)$')
+ITEM_PATTERN = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+')
+# Standard sections of the response templates; every other heading is kept under `sections`
+SECTION_FIELDS = {
+    'strengths': 'strengths',
+    'areas for improvement': 'improvements',
+    'weaknesses': 'improvements',
+    'suggestions for improvement': 'suggestions',
+    'actionable suggestions': 'suggestions',
+}
+
+
+def section_slug(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def extract_sections(text):
+    """Split a response into its bold-headed sections, in order: [(heading, body)]."""
+    sections, current = [], None
+    for line in (text or '').splitlines():
+        match = SECTION_PATTERN.match(line)
+        if match:
+            current = [match.group('name').strip().rstrip(':'), [match.group('rest')]]
+            sections.append(current)
+        elif current is not None:
+            current[1].append(line)
+    return [(name, '\n'.join(lines).strip()) for name, lines in sections]
+
+
+def section_items(body):
+    """A section body as a list of points: its list items, or the whole body as one point."""
+    items = []
+    for line in body.splitlines():
+        if ITEM_PATTERN.match(line):
+            items.append(ITEM_PATTERN.sub('', line).strip())
+        elif line.strip() and items:
+            items[-1] = f"{items[-1]} {line.strip()}"
+        elif line.strip():
+            items.append(line.strip())
+    # Template placeholders the model echoed back ("[List key strengths here]") are not findings
+    return [item for item in items if not (item.startswith('[') and item.endswith(']'))]
+
+
+def evaluation_record(text):
+    """Parse a dimension evaluation into a structured record.
+
+    Returns {"rating": float | None, "strengths": [str], "improvements":
+    [str], "suggestions": [str], "rationale": str | None, "sections":
+    {slug: str}}. `rationale` is the Rating section's text. `sections`
+    holds the dimension-specific headings (e.g. "unique_premise").
+    """
+    record = {'rating': extract_rating(text), 'strengths': [], 'improvements': [], 'suggestions': [],
+              'rationale': None, 'sections': {}}
+    for name, body in extract_sections(text):
+        field = SECTION_FIELDS.get(name.lower())
+        if field:
+            record[field].extend(section_items(body))
+        elif name.lower() == 'rating':
+            record['rationale'] = body or None
+        elif body:
+            record['sections'].setdefault(section_slug(name), body)
+    return record
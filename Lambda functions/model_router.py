@@ -0,0 +1,212 @@
+"""Local token estimates and policy-based model/region routing for Bedrock calls.
+
+Everything here is computed without a network call. MODEL_CATALOG describes
+each model (context window, output cap, price, quality tier, regions) and
+ROUTING_POLICY says, per function or dimension, how many models to use and
+what to optimise for. route() turns a prompt into concrete calls: model,
+fastest observed region, a max_tokens sized to the expected response, and
+an estimate of cost and latency. Prompts that cannot fit any allowed model
+raise PromptTooLargeError before anything is paid for.
+"""
+import json
+import os
+import threading
+
+from chunking import SCRIPT_END, estimate_tokens
+
+# Model prefix -> capabilities and prices (USD per 1,000 tokens). Routing prefers the
+# fastest region; the others are failover and hedge targets (see resilience.py).
+MODEL_CATALOG = {
+    'claude': {
+        'model_id': 'anthropic.claude-3-sonnet-20240229-v1:0',
+        'provider': 'anthropic',
+        'regions': ['ap-south-1', 'us-east-1'],
+        'context_tokens': 200000,
+        'max_output_tokens': 4096,
+        'input_price': 0.003,
+        'output_price': 0.015,
+        'quality': 3,
+        # Expected seconds per request and per output token before any call is observed
+        'latency_s': 2.0,
+        'output_token_s': 0.02,
+        # Mark the shared script prefix for prompt caching (models that support it only)
+        'prompt_cache': False,
+    },
+    'mistral': {
+        'model_id': 'mistral.mistral-7b-instruct-v0:2',
+        'provider': 'mistral',
+        'regions': ['eu-west-2', 'us-west-2'],
+        'context_tokens': 32000,
+        'max_output_tokens': 8192,
+        'input_price': 0.00015,
+        'output_price': 0.0002,
+        'quality': 1,
+        'latency_s': 0.5,
+        'output_token_s': 0.01,
+    },
+}
+# Per-model overrides, e.g. '{"claude": {"regions": ["ap-south-1", "us-east-1"]}}'
+for _prefix, _overrides in json.loads(os.getenv('MODEL_CATALOG', '{}')).items():
+    MODEL_CATALOG[_prefix] = dict(MODEL_CATALOG.get(_prefix, {}), **_overrides)
+
+# Function name (or evaluation dimension) -> policy. `models` is how many
+# models answer each prompt, `min_quality` the lowest tier allowed, and
+# `prefer` orders candidates by quality, cost or latency.
+DEFAULT_POLICY = {'models': 2, 'min_quality': 1, 'prefer': 'quality'}
+ROUTING_POLICY = {
+    'annotate_labels': {'models': 1, 'min_quality': 1, 'prefer': 'cost'},
+}
+ROUTING_POLICY.update(json.loads(os.getenv('ROUTING_POLICY', '{}')))
+
+# Sampling parameters shared by every provider
+SAMPLING_PARAMS = {
+    'temperature': 0.5,
+    'top_p': 0.9,
+    'top_k': 50,
+}
+ANTHROPIC_VERSION = 'bedrock-2023-05-31'
+
+# Response sizing: generated text runs to a few times its template's length (sample answers reach
+# ~4x), so this leaves headroom; a response cut off at max_tokens is retried with a larger budget
+RESPONSE_EXPANSION = float(os.getenv('RESPONSE_EXPANSION', '6'))
+MIN_RESPONSE_TOKENS = int(os.getenv('MIN_RESPONSE_TOKENS', '600'))
+DEFAULT_RESPONSE_TOKENS = 600
+
+# Weight of the newest sample in the per-region latency average
+LATENCY_SMOOTHING = 0.3
+
+_latency = {}
+_latency_lock = threading.Lock()
+
+
+class PromptTooLargeError(ValueError):
+    """No allowed model can take the prompt plus its response."""
+
+    def __init__(self, function_name, input_tokens, limit):
+        super().__init__(f"Prompt for {function_name} needs ~{input_tokens} tokens; "
+                         f"the largest allowed context is {limit}")
+        self.input_tokens = input_tokens
+        self.limit = limit
+
+
+def policy_for(function_name):
+    """Policy for a function name; chunk and merge tasks use their dimension's policy."""
+    for name in (function_name, (function_name or '').split('_chunk')[0], (function_name or '').split('_merged')[0]):
+        if name in ROUTING_POLICY:
+            return dict(DEFAULT_POLICY, **ROUTING_POLICY[name])
+    return dict(DEFAULT_POLICY)
+
+
+def response_tokens(template=None):
+    """max_tokens for a response following `template` (DEFAULT_RESPONSE_TOKENS without one)."""
+    if not template:
+        return DEFAULT_RESPONSE_TOKENS
+    return max(MIN_RESPONSE_TOKENS, int(estimate_tokens(template) * RESPONSE_EXPANSION))
+
+
+def observe_latency(model_prefix, region, seconds):
+    """Fold one measured call duration into the region's moving average."""
+    with _latency_lock:
+        previous = _latency.get((model_prefix, region))
+        _latency[(model_prefix, region)] = seconds if previous is None else \
+            previous + LATENCY_SMOOTHING * (seconds - previous)
+
+
+def expected_latency(model_prefix, region, output_tokens):
+    spec = MODEL_CATALOG[model_prefix]
+    observed = _latency.get((model_prefix, region))
+    if observed is not None:
+        return observed
+    return spec['latency_s'] + output_tokens * spec['output_token_s']
+
+
+def fastest_region(model_prefix, output_tokens):
+    return min(MODEL_CATALOG[model_prefix]['regions'],
+               key=lambda region: expected_latency(model_prefix, region, output_tokens))
+
+
+def estimate_cost(model_prefix, input_tokens, output_tokens):
+    spec = MODEL_CATALOG[model_prefix]
+    return (input_tokens * spec['input_price'] + output_tokens * spec['output_price']) / 1000
+
+
+PREFERENCES = {
+    'quality': lambda route: (-MODEL_CATALOG[route['model']]['quality'], route['cost']),
+    'cost': lambda route: (route['cost'], route['latency']),
+    'latency': lambda route: (route['latency'], route['cost']),
+}
+
+
+def candidates(function_name, models=None):
+    """Model prefixes allowed for a function: the explicit list, or the catalog filtered by policy."""
+    if models:
+        return [prefix for prefix in models if prefix in MODEL_CATALOG]
+    policy = policy_for(function_name)
+    return [prefix for prefix, spec in MODEL_CATALOG.items() if spec['quality'] >= policy['min_quality']]
+
+
+def select_models(function_name):
+    """Models a function's prompts go to, ignoring prompt size (for planning chunked work)."""
+    policy = policy_for(function_name)
+    routes = [{'model': prefix, 'cost': estimate_cost(prefix, 0, DEFAULT_RESPONSE_TOKENS),
+               'latency': expected_latency(prefix, fastest_region(prefix, DEFAULT_RESPONSE_TOKENS),
+                                           DEFAULT_RESPONSE_TOKENS)}
+              for prefix in candidates(function_name)]
+    routes.sort(key=PREFERENCES[policy['prefer']])
+    return [route['model'] for route in routes[:policy['models']]]
+
+
+def route(function_name, prompt, models=None, max_tokens=None):
+    """Plan the calls for one prompt.
+
+    With `models` the given prefixes are used as-is (the caller already
+    chose them); otherwise the function's policy picks them. Each route is
+    {"model", "model_id", "region", "max_tokens", "input_tokens", "cost",
+    "latency"}. Models whose context cannot hold the prompt are skipped;
+    PromptTooLargeError is raised if that leaves none.
+    """
+    policy = policy_for(function_name)
+    input_tokens = estimate_tokens(prompt or '')
+    routes, limit = [], 0
+    for prefix in candidates(function_name, models):
+        spec = MODEL_CATALOG[prefix]
+        output_tokens = min(max_tokens or DEFAULT_RESPONSE_TOKENS, spec['max_output_tokens'])
+        limit = max(limit, spec['context_tokens'] - output_tokens)
+        if input_tokens + output_tokens > spec['context_tokens']:
+            continue
+        region = fastest_region(prefix, output_tokens)
+        routes.append({'model': prefix, 'model_id': spec['model_id'], 'region': region,
+                       'max_tokens': output_tokens, 'input_tokens': input_tokens,
+                       'cost': estimate_cost(prefix, input_tokens, output_tokens),
+                       'latency': expected_latency(prefix, region, output_tokens)})
+    if not routes:
+        raise PromptTooLargeError(function_name, input_tokens, limit)
+    if models:
+        return routes
+    routes.sort(key=PREFERENCES[policy['prefer']])
+    return routes[:policy['models']]
+
+
+def inference_params(max_tokens):
+    """Parameters that shape a generation (part of cache and output keys)."""
+    return dict(SAMPLING_PARAMS, max_tokens=max_tokens)
+
+
+def request_body(model_prefix, prompt, max_tokens):
+    """invoke_model body in the model provider's request format.
+
+    For models with `prompt_cache`, an evaluator prompt's script section
+    (everything up to SCRIPT_END) is sent as its own content block with a
+    cache point, so the other dimensions' prompts read it from the cache.
+    """
+    params = inference_params(max_tokens)
+    spec = MODEL_CATALOG[model_prefix]
+    if spec['provider'] == 'anthropic':
+        content = prompt
+        if spec.get('prompt_cache') and SCRIPT_END in prompt:
+            prefix, rest = prompt.split(SCRIPT_END, 1)
+            content = [{'type': 'text', 'text': prefix + SCRIPT_END, 'cache_control': {'type': 'ephemeral'}},
+                       {'type': 'text', 'text': rest}]
+        return json.dumps(dict(params, anthropic_version=ANTHROPIC_VERSION,
+                               messages=[{'role': 'user', 'content': content}]))
+    return json.dumps(dict(params, prompt=prompt))
@@ -0,0 +1,103 @@
+"""In-process evaluation pipeline: parse -> evaluate -> Bedrock, without Lambda hops.
+
+The Lambda handlers (Master_function/job_worker, script_evaluator,
+call_bedrock) are adapters over the same functions; this module wires
+them together directly so a single worker or the CLI can run a whole
+evaluation with no inter-function serialisation.
+
+Usage: python pipeline.py SCRIPTS_DIR [--out RESULTS_DIR] [--jobs N] [--bypass-cache] [--index DB]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import call_bedrock
+import script_evaluator
+from fdx_parser import parse_fdx
+from results_index import ResultsIndex, evaluation_records
+import tracing
+
+logger = logging.getLogger()
+
+def invoke_in_process(task, on_text=None):
+    """Run one evaluator task through call_bedrock directly (no Lambda invoke)."""
+    return call_bedrock.process_events([script_evaluator.task_payload(task)], on_text=on_text)
+
+def evaluate_scenes(script_data, on_text=None):
+    """Evaluate an already-parsed script ({"scenes": [...], "script_hash": ...}).
+
+    With `on_text(function_name, model_prefix, text)` every generation is
+    streamed and its text deltas are passed on as they arrive.
+    """
+    invoke = invoke_in_process
+    if on_text is not None:
+        script_data = dict(script_data, stream=True)
+        invoke = lambda task: invoke_in_process(task, on_text)
+    evaluations = script_evaluator.evaluate_script(script_data, invoke=invoke)
+    status_code, message = script_evaluator.evaluation_status(evaluations)
+    return {'statusCode': status_code, 'message': message, 'evaluations': evaluations}
+
+def run_pipeline(path, bypass_cache=False, on_text=None):
+    """Parse an .fdx file and evaluate it end to end in this process."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+    script_hash = hasher.hexdigest()
+    with tracing.bind(tracing.new_correlation_id()) as correlation_id:
+        with open(path, 'rb') as f:
+            scenes = parse_fdx(f)
+        result = evaluate_scenes({'scenes': scenes, 'script_hash': script_hash, 'bypass_cache': bypass_cache},
+                                 on_text=on_text)
+    result.update(script=os.path.basename(path), script_hash=script_hash, scenes=len(scenes),
+                  correlation_id=correlation_id)
+    return result
+
+def run_directory(directory, out_dir=None, jobs=1, bypass_cache=False, index=None):
+    """Evaluate every .fdx file in a directory; results go to out_dir as JSON.
+
+    With `index` (a results_index.ResultsIndex) each script's structured
+    records are added to it as well.
+    """
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.lower().endswith('.fdx'))
+    out_dir = out_dir or directory
+    os.makedirs(out_dir, exist_ok=True)
+
+    def run_one(path):
+        try:
+            result = run_pipeline(path, bypass_cache=bypass_cache)
+        except Exception as e:
+            logger.error(f"Evaluation of {path} failed", exc_info=True)
+            result = {'script': os.path.basename(path), 'statusCode': 500, 'message': str(e)}
+        out_path = os.path.join(out_dir, f"{os.path.splitext(os.path.basename(path))[0]}.evaluation.json")
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        if index is not None and result.get('evaluations'):
+            index.add(evaluation_records(result['script_hash'], result['evaluations'], script_name=result['script']))
+        return path, result
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for path, result in executor.map(run_one, paths):
+            print(f"{os.path.basename(path)}: {result['statusCode']} {result['message']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate every .fdx script in a directory in-process.')
+    parser.add_argument('directory')
+    parser.add_argument('--out', help='directory for <script>.evaluation.json (default: alongside the scripts)')
+    parser.add_argument('--jobs', type=int, default=1, help='scripts evaluated concurrently')
+    parser.add_argument('--bypass-cache', action='store_true', help='force fresh generations')
+    parser.add_argument('--index', metavar='DB', help='add structured results to this SQLite results index')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Results are the output; span export is for Lambda
+    tracing.set_exporters()
+    run_directory(args.directory, args.out, args.jobs, args.bypass_cache,
+                  ResultsIndex(args.index) if args.index else None)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Per-model quotas: requests/minute and tokens/minute (input + max output)
+DEFAULT_QUOTAS = {
+    'anthropic.claude-3-sonnet-20240229-v1:0': {'rpm': 20, 'tpm': 200000},
+    'mistral.mistral-7b-instruct-v0:2': {'rpm': 60, 'tpm': 300000},
+}
+FALLBACK_QUOTA = {'rpm': 20, 'tpm': 100000}
+# Overrides, e.g. '{"mistral.mistral-7b-instruct-v0:2": {"rpm": 120, "tpm": 600000}}'
+MODEL_QUOTAS = dict(DEFAULT_QUOTAS, **json.loads(os.getenv('MODEL_QUOTAS', '{}')))
+
+# Adaptive backoff after ThrottlingException
+THROTTLE_BACKOFF_BASE = float(os.getenv('THROTTLE_BACKOFF_BASE', '1.0'))
+THROTTLE_BACKOFF_MAX = float(os.getenv('THROTTLE_BACKOFF_MAX', '30.0'))
+MIN_RATE_SCALE = 0.1
+
+
+class TokenBucket:
+    """Bucket holding up to `per_minute` units, refilled continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60.0 * scale)
+        self.updated = now
+
+    def wait_time(self, amount, scale):
+        """Seconds until `amount` can be taken (oversized requests wait for a full bucket)."""
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / (self.capacity / 60.0 * scale)
+
+
+class ModelRateLimiter:
+    """Request and token buckets for one (model, region), with adaptive throttling.
+
+    Every ThrottlingException halves the effective refill rate and blocks
+    new requests for a jittered exponential backoff; each success restores
+    the rate additively (AIMD).
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self.consecutive_throttles = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Block until one request of `tokens` tokens may be sent; return seconds waited."""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.requests.refill(now, self.scale)
+                self.tokens.refill(now, self.scale)
+                wait = max(self.blocked_until - now,
+                           self.requests.wait_time(1, self.scale),
+                           self.tokens.wait_time(tokens, self.scale))
+                if wait <= 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= tokens
+                    return now - started
+            time.sleep(min(wait, 1.0))
+
+    def ready_in(self, tokens):
+        """Seconds until acquire(tokens) would go through, without taking anything."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now, self.scale)
+            self.tokens.refill(now, self.scale)
+            return max(0.0, self.blocked_until - now,
+                       self.requests.wait_time(1, self.scale),
+                       self.tokens.wait_time(tokens, self.scale))
+
+    def on_throttle(self):
+        """Slow down after Bedrock rejected a request; return the backoff applied."""
+        with self._lock:
+            self.consecutive_throttles += 1
+            self.scale = max(MIN_RATE_SCALE, self.scale / 2)
+            backoff = min(THROTTLE_BACKOFF_MAX, THROTTLE_BACKOFF_BASE * 2 ** (self.consecutive_throttles - 1))
+            backoff = random.uniform(backoff / 2, backoff)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + backoff)
+            return backoff
+
+    def on_success(self):
+        with self._lock:
+            self.consecutive_throttles = 0
+            self.scale = min(1.0, self.scale + 0.1)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_id, region):
+    """Return the shared limiter for a (model, region) pair."""
+    with _limiters_lock:
+        limiter = _limiters.get((model_id, region))
+        if limiter is None:
+            quota = MODEL_QUOTAS.get(model_id, FALLBACK_QUOTA)
+            limiter = ModelRateLimiter(quota['rpm'], quota['tpm'])
+            _limiters[(model_id, region)] = limiter
+        return limiter
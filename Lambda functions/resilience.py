@@ -0,0 +1,328 @@
+"""Retries, per-region circuit breakers and hedged requests for model calls.
+
+call_with_resilience(model_prefix, regions, attempt) runs
+attempt(region, send) until one succeeds or the policy gives up, and then raises CallFailed
+carrying an explicit failure record:
+
+- Errors are classified as throttled, transient or fatal. Each class has its
+  own retry budget and jittered exponential backoff. Fatal errors (bad
+  request, access denied) are not retried.
+- Each (model, region) has a circuit breaker. After repeated transient
+  failures the region is skipped until a probe request succeeds. Retries
+  move to the next healthy region.
+- With more than one healthy region, a hedge request goes to the next region
+  once the first attempt has run longer than the observed latency
+  percentile. Whichever answers first wins. attempt calls send() right
+  before it sends the request, so time spent queued or waiting on the rate
+  limiter neither starts the hedge clock nor counts as latency. Attempts
+  that have not been sent when another one wins are skipped.
+- The whole call is bounded by CALL_DEADLINE_SECONDS, not by the HTTP read
+  timeout.
+"""
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+
+logger = logging.getLogger()
+
+# Error codes by class; anything unrecognised is treated as transient
+THROTTLING_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException'}
+FATAL_CODES = {'ValidationException', 'AccessDeniedException', 'ResourceNotFoundException',
+               'UnrecognizedClientException', 'ExpiredTokenException'}
+
+# Per error class: retries allowed and backoff bounds (seconds)
+RETRY_POLICY = {
+    'throttled': {'max_retries': int(os.getenv('MAX_THROTTLE_RETRIES', '4')), 'base': 1.0, 'cap': 30.0},
+    'transient': {'max_retries': int(os.getenv('MAX_TRANSIENT_RETRIES', '2')), 'base': 0.5, 'cap': 8.0},
+    'fatal': {'max_retries': 0, 'base': 0.0, 'cap': 0.0},
+}
+
+# Upper bound on one model call, including retries, backoff and hedges
+CALL_DEADLINE_SECONDS = float(os.getenv('CALL_DEADLINE_SECONDS', '240'))
+
+# Circuit breaker: consecutive failures that open it, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+
+# Hedging: fire the next region once an attempt is slower than this percentile of past attempts
+HEDGING_ENABLED = os.getenv('BEDROCK_HEDGING', 'true').lower() == 'true'
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY_SECONDS', '30'))
+HEDGE_MIN_DELAY = 1.0
+LATENCY_WINDOW = 200
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('RESILIENCE_MAX_WORKERS', '32')))
+
+
+class CallFailed(Exception):
+    """Raised when a call gives up; `failure` is the explicit failure record."""
+
+    def __init__(self, failure):
+        super().__init__(failure['error'])
+        self.failure = failure
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class AttemptCancelled(Exception):
+    """Raised by send() when the call no longer needs this attempt."""
+
+
+def error_code(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') or type(error).__name__
+
+
+def classify(error):
+    """throttled | transient | fatal."""
+    code = error_code(error)
+    if code in THROTTLING_CODES:
+        return 'throttled'
+    if code in FATAL_CODES:
+        return 'fatal'
+    return 'transient'
+
+
+def backoff(kind, attempt):
+    """Full-jitter exponential backoff for the attempt-th retry of an error class."""
+    policy = RETRY_POLICY[kind]
+    return random.uniform(0, min(policy['cap'], policy['base'] * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """closed -> open after repeated failures -> half-open probe after a cool-down -> closed."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        """True if a request could be let through now (does not claim the half-open probe)."""
+        with self._lock:
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at >= self.reset_seconds
+            return not (self.state == 'half_open' and self._probing)
+
+    def allow(self):
+        """Claim permission for one request."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"Circuit opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """Give back a half-open probe that was claimed but never sent."""
+        with self._lock:
+            self._probing = False
+
+
+_breakers = {}
+_latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+_registry_lock = threading.Lock()
+
+
+def get_breaker(model_prefix, region):
+    with _registry_lock:
+        breaker = _breakers.get((model_prefix, region))
+        if breaker is None:
+            breaker = _breakers[(model_prefix, region)] = CircuitBreaker()
+        return breaker
+
+
+def record_latency(model_prefix, region, seconds):
+    with _registry_lock:
+        _latencies[(model_prefix, region)].append(seconds)
+
+
+def hedge_delay(model_prefix, region):
+    """Seconds to wait on an attempt before hedging: the latency percentile once enough calls are seen."""
+    with _registry_lock:
+        samples = sorted(_latencies.get((model_prefix, region), ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+    return max(HEDGE_MIN_DELAY, samples[index])
+
+
+class _AttemptState:
+    """When one attempt was sent, and whether the call still wants it."""
+
+    def __init__(self):
+        self.sent_at = None
+        self.cancelled = False
+        # Set once the attempt is sent or has finished, whichever comes first
+        self.ready = threading.Event()
+
+    def send(self):
+        if self.cancelled:
+            raise AttemptCancelled("Another attempt already answered")
+        self.sent_at = time.monotonic()
+        self.ready.set()
+
+
+def _attempt(model_prefix, region, attempt, state):
+    """One guarded attempt: breaker permission, timing and failure accounting."""
+    try:
+        if state.cancelled:
+            raise AttemptCancelled("Another attempt already answered")
+        breaker = get_breaker(model_prefix, region)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {model_prefix} in {region}")
+        try:
+            result = attempt(region, state.send)
+        except AttemptCancelled:
+            breaker.release()
+            raise
+        except Exception as e:
+            # Only outages count against a region; throttling is paced by the rate limiter
+            # and bad requests say nothing about the region's health
+            if classify(e) == 'transient':
+                breaker.record_failure()
+            raise
+        breaker.record_success()
+        if state.sent_at is not None:
+            record_latency(model_prefix, region, time.monotonic() - state.sent_at)
+        return region, result
+    finally:
+        state.ready.set()
+
+
+def _submit(model_prefix, region, attempt, states):
+    state = _AttemptState()
+    states.append(state)
+    return _executor.submit(tracing.propagate(_attempt), model_prefix, region, attempt, state)
+
+
+def _run_hedged(model_prefix, primary, backup, attempt, deadline_at, tried):
+    """Run the primary attempt, hedging to `backup` if it is slow; first success wins.
+
+    Every region an attempt is sent to is appended to `tried`.
+    """
+    tried.append(primary)
+    states = []
+    pending = {_submit(model_prefix, primary, attempt, states)}
+    # The hedge clock starts when the primary is sent, not when it is queued
+    hedge_at = None
+    error = None
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline_at:
+                break
+            if backup and hedge_at is None and states[0].sent_at is not None:
+                hedge_at = states[0].sent_at + hedge_delay(model_prefix, primary)
+            if backup and hedge_at is None:
+                # Queued or waiting on the rate limiter; wake when it is sent or finishes
+                states[0].ready.wait(deadline_at - now)
+                timeout = 0
+            elif hedge_at is not None:
+                timeout = max(0.0, min(hedge_at, deadline_at) - now)
+            else:
+                timeout = deadline_at - now
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                logger.info(f"Hedging {model_prefix}: {primary} -> {backup}")
+                tried.append(backup)
+                pending.add(_submit(model_prefix, backup, attempt, states))
+                hedge_at = None
+                backup = None
+    finally:
+        # Attempts not yet sent are skipped; ones in flight are abandoned and their results discarded
+        for state in states:
+            state.cancelled = True
+        for future in pending:
+            future.cancel()
+    if error is not None and not pending:
+        # A failed attempt is retried by call_with_resilience, in the next region
+        raise error
+    raise TimeoutError(f"No response from {model_prefix} within the call deadline")
+
+
+def failure(kind, error, model_prefix, regions_tried, attempts):
+    return {
+        'error': str(error),
+        'error_type': kind,
+        'error_code': error_code(error),
+        'model': model_prefix,
+        'regions_tried': regions_tried,
+        'attempts': attempts,
+    }
+
+
+def call_with_resilience(model_prefix, regions, attempt, hedge=HEDGING_ENABLED, deadline=CALL_DEADLINE_SECONDS):
+    """Call attempt(region, send) across `regions` (preferred first) under the retry policy.
+
+    attempt must call send() immediately before sending its request; send
+    raises AttemptCancelled if the attempt is no longer needed. Returns (region, result) from the first successful attempt; raises
+    CallFailed with a failure record otherwise.
+    """
+    deadline_at = time.monotonic() + deadline
+    regions = list(regions)
+    retries = collections.Counter()
+    tried = []
+    while True:
+        healthy = [region for region in regions if get_breaker(model_prefix, region).available()]
+        if not healthy:
+            raise CallFailed(failure('circuit_open', CircuitOpenError(f"No healthy region for {model_prefix}"),
+                                     model_prefix, tried, len(tried)))
+        primary = healthy[0]
+        backup = healthy[1] if hedge and len(healthy) > 1 else None
+        try:
+            return _run_hedged(model_prefix, primary, backup, attempt, deadline_at, tried)
+        except TimeoutError as e:
+            raise CallFailed(failure('deadline_exceeded', e, model_prefix, tried, len(tried)))
+        except CircuitOpenError:
+            continue
+        except Exception as e:
+            kind = classify(e)
+            retries[kind] += 1
+            if retries[kind] > RETRY_POLICY[kind]['max_retries']:
+                raise CallFailed(failure(kind, e, model_prefix, tried, len(tried)))
+            delay = backoff(kind, retries[kind])
+            if time.monotonic() + delay >= deadline_at:
+                raise CallFailed(failure('deadline_exceeded', e, model_prefix, tried, len(tried)))
+            logger.warning(f"{kind} error from {model_prefix} in {primary} ({error_code(e)}); "
+                           f"retry {retries[kind]} in {delay:.2f}s")
+            # The next attempt prefers a different region
+            regions.remove(primary)
+            regions.append(primary)
+            time.sleep(delay)
@@ -0,0 +1,223 @@
+"""Structured evaluation records and a queryable SQLite index over them.
+
+evaluation_records() parses each (dimension, model) response of an
+evaluated script into a typed record (rating, strengths, areas for
+improvement, suggestions). job_worker's extract stage and batch jobs store
+them under records/<script_hash>.json.
+
+ResultsIndex loads records into SQLite, keyed by (script, dimension, model)
+and indexed for the questions asked across scripts: which scripts score
+above N on a dimension, how ratings are distributed, and how often the
+models agree. Index a local run directly, or sync a bucket's records:
+
+    python results_index.py sync --bucket storyfyscripts
+    python results_index.py above plot_structure 8
+    python results_index.py distribution plot_structure
+    python results_index.py agreement
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from model_output import evaluation_record
+from storage import RECORDS_PREFIX, records_key
+
+logger = logging.getLogger()
+
+RESULTS_DB_PATH = os.getenv('RESULTS_DB_PATH', '/tmp/results.sqlite3')
+# Two models "agree" on a script when their ratings are at most this far apart
+AGREEMENT_TOLERANCE = float(os.getenv('AGREEMENT_TOLERANCE', '1.0'))
+
+RECORD_LIST_FIELDS = ('strengths', 'improvements', 'suggestions')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    script_hash TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rating REAL,
+    strengths TEXT NOT NULL,
+    improvements TEXT NOT NULL,
+    suggestions TEXT NOT NULL,
+    rationale TEXT,
+    sections TEXT NOT NULL,
+    script_name TEXT,
+    project_id TEXT,
+    evaluated_at TEXT NOT NULL,
+    PRIMARY KEY (script_hash, dimension, model)
+);
+CREATE INDEX IF NOT EXISTS evaluations_by_rating ON evaluations (dimension, rating);
+CREATE INDEX IF NOT EXISTS evaluations_by_model ON evaluations (dimension, model, rating);
+"""
+
+
+def evaluation_records(script_hash, evaluations, **meta):
+    """One record per (dimension, model) of an evaluator result's `evaluations`.
+
+    `meta` (script_name, project_id) is copied onto every record.
+    """
+    records = []
+    evaluated_at = datetime.now(timezone.utc).isoformat()
+    for evaluation in evaluations or []:
+        for model_prefix, outcome in (evaluation.get('models') or {}).items():
+            record = evaluation_record(outcome.get('text'))
+            # The evaluator's own rating also covers merged chunk results
+            if outcome.get('rating') is not None:
+                record['rating'] = outcome['rating']
+            record.update(script_hash=script_hash, dimension=evaluation['function_name'], model=model_prefix,
+                          status=outcome.get('status', 'failed'), evaluated_at=evaluated_at,
+                          script_name=meta.get('script_name'), project_id=meta.get('project_id'))
+            records.append(record)
+    return records
+
+
+def store_records(artifact_store, script_hash, evaluations, index=None, **meta):
+    """Extract a script's records, store them and optionally add them to an index. Returns the records."""
+    records = evaluation_records(script_hash, evaluations, **meta)
+    artifact_store.put_json(records_key(script_hash), records)
+    if index is not None:
+        index.add(records)
+    return records
+
+
+class ResultsIndex:
+    """SQLite index of evaluation records; use path=':memory:' for a throwaway index."""
+
+    def __init__(self, path=RESULTS_DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def add(self, records):
+        """Insert or replace records; a re-evaluated script overwrites its earlier rows."""
+        rows = [(record['script_hash'], record['dimension'], record['model'], record['status'], record['rating'],
+                 *(json.dumps(record[field], ensure_ascii=False) for field in RECORD_LIST_FIELDS),
+                 record.get('rationale'), json.dumps(record.get('sections') or {}, ensure_ascii=False),
+                 record.get('script_name'), record.get('project_id'), record['evaluated_at'])
+                for record in records]
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   rows)
+        return len(rows)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def records(self, script_hash):
+        """Every record of one script, with list fields decoded."""
+        rows = self._query('SELECT * FROM evaluations WHERE script_hash = ? ORDER BY dimension, model',
+                           (script_hash,))
+        for row in rows:
+            for field in RECORD_LIST_FIELDS + ('sections',):
+                row[field] = json.loads(row[field])
+        return rows
+
+    def above(self, dimension, threshold, model=None):
+        """Scripts rated above `threshold` on a dimension, best first.
+
+        Without `model`, a script's rating is the mean over its models.
+        """
+        where, params = 'dimension = ? AND rating IS NOT NULL', [dimension]
+        if model:
+            where += ' AND model = ?'
+            params.append(model)
+        return self._query(f"""
+            SELECT script_hash, MAX(script_name) AS script_name, AVG(rating) AS rating, COUNT(*) AS models
+            FROM evaluations WHERE {where}
+            GROUP BY script_hash HAVING AVG(rating) > ?
+            ORDER BY rating DESC, script_hash""", params + [threshold])
+
+    def distribution(self, dimension, model=None):
+        """Rating histogram (whole points) and summary statistics for a dimension."""
+        where, params = 'dimension = ? AND rating IS NOT NULL', [dimension]
+        if model:
+            where += ' AND model = ?'
+            params.append(model)
+        buckets = self._query(f"""
+            SELECT CAST(rating AS INTEGER) AS bucket, COUNT(*) AS count
+            FROM evaluations WHERE {where} GROUP BY bucket ORDER BY bucket""", params)
+        stats = self._query(f"""
+            SELECT COUNT(*) AS count, AVG(rating) AS mean, MIN(rating) AS min, MAX(rating) AS max,
+                   AVG(rating * rating) - AVG(rating) * AVG(rating) AS variance
+            FROM evaluations WHERE {where}""", params)[0]
+        stats['histogram'] = {row['bucket']: row['count'] for row in buckets}
+        return stats
+
+    def model_agreement(self, dimension=None, tolerance=AGREEMENT_TOLERANCE):
+        """How closely each pair of models rates the same scripts, per dimension.
+
+        Returns rows of {dimension, model_a, model_b, scripts, mean_abs_diff,
+        agreement}, where agreement is the share of scripts rated within
+        `tolerance` points of each other.
+        """
+        where, params = '', [tolerance]
+        if dimension:
+            where, params = 'AND a.dimension = ?', [tolerance, dimension]
+        return self._query(f"""
+            SELECT a.dimension AS dimension, a.model AS model_a, b.model AS model_b, COUNT(*) AS scripts,
+                   AVG(ABS(a.rating - b.rating)) AS mean_abs_diff,
+                   AVG(CASE WHEN ABS(a.rating - b.rating) <= ? THEN 1.0 ELSE 0.0 END) AS agreement
+            FROM evaluations a JOIN evaluations b
+              ON a.script_hash = b.script_hash AND a.dimension = b.dimension AND a.model < b.model
+            WHERE a.rating IS NOT NULL AND b.rating IS NOT NULL {where}
+            GROUP BY a.dimension, a.model, b.model
+            ORDER BY a.dimension, a.model, b.model""", params)
+
+    def sync(self, artifact_store, s3_client, bucket):
+        """Index every records/<script_hash>.json object in a bucket. Returns records indexed."""
+        indexed, request = 0, {'Bucket': bucket, 'Prefix': RECORDS_PREFIX}
+        while True:
+            page = s3_client.list_objects_v2(**request)
+            for item in page.get('Contents', []):
+                indexed += self.add(artifact_store.get_json(item['Key']) or [])
+            if not page.get('IsTruncated'):
+                return indexed
+            request['ContinuationToken'] = page['NextContinuationToken']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the evaluation results index.')
+    parser.add_argument('--db', default=RESULTS_DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync = commands.add_parser('sync', help='index every stored record in a bucket')
+    sync.add_argument('--bucket', default=os.getenv('S3_BUCKET_NAME', 'storyfyscripts'))
+    above = commands.add_parser('above', help='scripts rated above a threshold on a dimension')
+    above.add_argument('dimension')
+    above.add_argument('threshold', type=float)
+    above.add_argument('--model')
+    distribution = commands.add_parser('distribution', help='rating distribution for a dimension')
+    distribution.add_argument('dimension')
+    distribution.add_argument('--model')
+    agreement = commands.add_parser('agreement', help='pairwise model agreement per dimension')
+    agreement.add_argument('--dimension')
+    show = commands.add_parser('show', help="one script's records")
+    show.add_argument('script_hash')
+    args = parser.parse_args()
+
+    index = ResultsIndex(args.db)
+    if args.command == 'sync':
+        from aws_clients import get_client
+        from storage import ArtifactStore
+        s3_client = get_client('s3')
+        result = {'indexed': index.sync(ArtifactStore(s3_client, args.bucket), s3_client, args.bucket)}
+    elif args.command == 'above':
+        result = index.above(args.dimension, args.threshold, args.model)
+    elif args.command == 'distribution':
+        result = index.distribution(args.dimension, args.model)
+    elif args.command == 'agreement':
+        result = index.model_agreement(args.dimension)
+    else:
+        result = index.records(args.script_hash)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Scene fingerprints, draft-to-draft diffs and revision-stable chunking.
+
+Every scene is fingerprinted by its content. A project's manifest records
+the fingerprints of its latest evaluated draft, so a resubmission can be
+diffed against it. Chunks for incremental evaluation are cut at
+content-defined boundaries (scenes whose fingerprint matches a pattern), so
+an edit only changes the chunk containing it (and the context of the chunk
+after it); the other chunks keep their prompts, and call_bedrock reuses
+their stored findings.
+"""
+import difflib
+import hashlib
+import os
+
+from chunking import (PROMPT_OVERHEAD_TOKENS, RESPONSE_TOKENS, chunk_budget, context_scenes, estimate_tokens,
+                      fit_scenes, render_scenes)
+
+# Average scenes per content-defined chunk, and the hard cap on a chunk's size
+INCREMENTAL_CHUNK_SCENES = int(os.getenv('INCREMENTAL_CHUNK_SCENES', '8'))
+INCREMENTAL_MAX_CHUNK_TOKENS = int(os.getenv('INCREMENTAL_MAX_CHUNK_TOKENS', '12000'))
+
+
+def scene_fingerprint(scene):
+    """Hash of a scene's heading and paragraphs, ignoring surrounding whitespace."""
+    canonical = [scene.get('heading') or ''] + [f"{e['type']}\t{e['text'].strip()}" for e in scene['elements']]
+    return hashlib.sha256('\n'.join(canonical).encode('utf-8')).hexdigest()
+
+
+def fingerprint_scenes(scenes):
+    return [scene_fingerprint(scene) for scene in scenes]
+
+
+def chunk_fingerprint(fingerprints):
+    return hashlib.sha256(''.join(fingerprints).encode('ascii')).hexdigest()
+
+
+def diff_fingerprints(previous, current):
+    """Compare two drafts' scene fingerprints.
+
+    Returns counts of unchanged, changed (replaced), added and removed
+    scenes, plus the indexes of the current draft's new or changed scenes.
+    """
+    summary = {'unchanged': 0, 'changed': 0, 'added': 0, 'removed': 0, 'changed_scenes': []}
+    matcher = difflib.SequenceMatcher(None, previous, current, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            summary['unchanged'] += i2 - i1
+            continue
+        if tag == 'replace':
+            replaced = min(i2 - i1, j2 - j1)
+            summary['changed'] += replaced
+            summary['removed'] += (i2 - i1) - replaced
+            summary['added'] += (j2 - j1) - replaced
+        elif tag == 'delete':
+            summary['removed'] += i2 - i1
+        else:
+            summary['added'] += j2 - j1
+        summary['changed_scenes'].extend(range(j1, j2))
+    return summary
+
+
+def is_boundary(fingerprint):
+    """True for roughly one scene in INCREMENTAL_CHUNK_SCENES, decided by content alone."""
+    return int(fingerprint[:8], 16) % max(1, INCREMENTAL_CHUNK_SCENES) == 0
+
+
+def content_defined_chunks(scenes, model_prefix, overhead_tokens=PROMPT_OVERHEAD_TOKENS,
+                           response_tokens=RESPONSE_TOKENS):
+    """Split scenes into chunks that stay stable when other scenes are edited.
+
+    A chunk ends after a boundary scene, or earlier if the next scene would
+    exceed the token cap. Chunks have the same shape as
+    chunking.plan_chunks, plus the chunk's `fingerprint`.
+    """
+    budget = min(chunk_budget(model_prefix, overhead_tokens, response_tokens), INCREMENTAL_MAX_CHUNK_TOKENS)
+    groups, current, used = [], [], 0
+    for scene in fit_scenes(scenes, budget):
+        cost = estimate_tokens(render_scenes([scene]))
+        if current and used + cost > budget:
+            groups.append(current)
+            current, used = [], 0
+        fingerprint = scene_fingerprint(scene)
+        current.append((scene, fingerprint))
+        used += cost
+        if is_boundary(fingerprint):
+            groups.append(current)
+            current, used = [], 0
+    if current:
+        groups.append(current)
+
+    chunks = []
+    for index, group in enumerate(groups):
+        previous = context_scenes([scene for scene, _ in groups[index - 1]]) if index else []
+        chunks.append({'index': index, 'count': len(groups), 'scenes': [scene for scene, _ in group],
+                       'context_scenes': previous,
+                       'fingerprint': chunk_fingerprint([fingerprint for _, fingerprint in group])})
+    return chunks
+
+
+def build_manifest(project_id, script_hash, scenes):
+    """Manifest recorded for a project's latest evaluated draft."""
+    return {
+        'project_id': project_id,
+        'script_hash': script_hash,
+        'scenes': fingerprint_scenes(scenes),
+    }
+
+
+def revision_summary(previous, manifest, evaluations=None):
+    """How a draft differs from the previous one and how much of it was reused.
+
+    chunks counts every map prompt of the evaluation; chunks_reused those
+    whose output call_bedrock served from storage instead of calling a model.
+    """
+    outcomes = [outcome for evaluation in evaluations or () for outcome in evaluation['models'].values()]
+    reuse = {'chunks_reused': sum(outcome.get('chunks_reused', 0) for outcome in outcomes),
+             'chunks': sum(outcome.get('chunks', 0) for outcome in outcomes)}
+    if previous is None:
+        return dict(reuse, previous_script_hash=None, scenes=len(manifest['scenes']))
+    summary = diff_fingerprints(previous['scenes'], manifest['scenes'])
+    summary.update(reuse, previous_script_hash=previous['script_hash'], scenes=len(manifest['scenes']))
+    return summary
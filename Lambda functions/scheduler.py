@@ -0,0 +1,131 @@
+"""One Bedrock work queue shared by every script in a batch.
+
+Evaluator tasks from all scripts go into per-model priority queues. A
+fixed pool of workers repeatedly takes the most urgent task whose model's
+rate limiter can accept it now. A model that is out of quota therefore
+does not hold up work for the others, and no more requests are in flight
+than the global concurrency limit. Priority is shortest job first: a task
+is ranked by the estimated size of its whole script, then by its own size.
+Small scripts finish early and their results can be streamed out while
+large ones are still running.
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import Future
+
+from chunking import estimate_tokens
+from model_router import DEFAULT_RESPONSE_TOKENS, MODEL_CATALOG, fastest_region
+from rate_limiter import get_limiter
+
+logger = logging.getLogger()
+
+# Bedrock requests in flight across the whole batch
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv('SCHEDULER_MAX_CONCURRENCY', '16'))
+# Longest pause before re-checking the limiters when every queued model is out of quota
+MAX_IDLE_WAIT = 1.0
+
+
+def task_tokens(task):
+    """Estimated tokens a task costs (prompt plus its response budget)."""
+    return estimate_tokens(task.get('prompt') or '') + (task.get('max_tokens') or DEFAULT_RESPONSE_TOKENS)
+
+
+def task_limiter(task):
+    """Rate limiter for the task's model, or None if the router picks the model later."""
+    models = task.get('models') or []
+    if len(models) != 1 or models[0] not in MODEL_CATALOG:
+        return None
+    spec = MODEL_CATALOG[models[0]]
+    return get_limiter(spec['model_id'], fastest_region(models[0], task.get('max_tokens') or DEFAULT_RESPONSE_TOKENS))
+
+
+class BedrockScheduler:
+    """Runs `invoke(task)` for submitted tasks, shortest job first, within the model quotas.
+
+    Use as a context manager, or call shutdown() when done.
+    """
+
+    def __init__(self, invoke, max_concurrency=SCHEDULER_MAX_CONCURRENCY):
+        self.invoke = invoke
+        self._queues = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0}
+        self._workers = [threading.Thread(target=self._work, name=f"bedrock-scheduler-{n}", daemon=True)
+                         for n in range(max(1, max_concurrency))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, task, priority=0):
+        """Queue a task; lower `priority` runs first. Returns a Future for invoke's result."""
+        future = Future()
+        limiter = task_limiter(task)
+        cost = task_tokens(task)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Scheduler has been shut down")
+            heapq.heappush(self._queues.setdefault(limiter, []), (priority, cost, next(self._sequence), task, future))
+            self.stats['submitted'] += 1
+            self._condition.notify()
+        return future
+
+    def _next(self):
+        """Pop the most urgent task whose model can be called now; None once shut down and drained."""
+        with self._condition:
+            while True:
+                ready, wait = None, None
+                for limiter, queue in self._queues.items():
+                    if not queue:
+                        continue
+                    delay = limiter.ready_in(queue[0][1]) if limiter is not None else 0.0
+                    if delay <= 0:
+                        if ready is None or queue[0] < ready[0]:
+                            ready = queue
+                    else:
+                        wait = delay if wait is None else min(wait, delay)
+                if ready is not None:
+                    return heapq.heappop(ready)
+                if wait is None and self._closed:
+                    return None
+                self._condition.wait(min(wait, MAX_IDLE_WAIT) if wait is not None else None)
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            _, _, _, task, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self.invoke(task)
+            except Exception as e:
+                logger.error(f"Scheduled task {task.get('function_name')} failed: {e}")
+                self._count('failed')
+                future.set_exception(e)
+                continue
+            self._count('completed')
+            future.set_result(result)
+
+    def _count(self, outcome):
+        with self._condition:
+            self.stats[outcome] += 1
+
+    def shutdown(self, wait=True):
+        """Stop accepting tasks; workers exit once the queues are empty."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -1,224 +1,549 @@
-import json
-import boto3
-
-lambda_client = boto3.client('lambda')
-
-# Function to evaluate plot structure and pacing
-def prompt_plot_structure(data):
-    plot_structure = f"""You are an expert Script Evaluator for a major film production company. Your goal is to evaluate the following film script: "{data}." Focus your analysis on Plot Structure and Pacing, providing feedback that reflects the priorities of buyers, producers, and studios.
-
-**Guidelines for Evaluation:**
-
-1. **Genre and Tone**: Identify the genre and tone of the script. Assess whether they align with current market expectations (e.g., suspense and twists for thrillers, humor for comedies). Describe how effectively the pacing and style support the intended genre, noting any issues that may affect its commercial success.
-
-2. **Three-Act Structure Analysis**:
-   - **Act One (Setup)**: Evaluate if the opening scene captures interest, introduces the main characters and stakes clearly, and establishes an inciting incident to drive the story forward.
-   - **Act Two (Confrontation)**: Assess the protagonist's journey through challenges. Are the conflicts engaging enough to maintain viewer interest? Is character development consistent and believable?
-   - **Act Three (Resolution)**: Review the climax and resolution, focusing on emotional impact and thematic coherence. Is the climax satisfying and well-earned, and are plot threads resolved meaningfully?
-
-3. **Constructive Feedback**: Highlight strengths and weaknesses in plot structure and pacing. Provide practical suggestions for improvement to enhance the script’s marketability.
-
-**Rating**: Conclude with a rating on a scale of 1-10, justifying your score. If the rating is below 9, specify the changes that could elevate it.
-
----
-
-**Template for Response**:
-
-"I have carefully analyzed the plot structure and pacing. Based on my evaluation:
-- **Strengths**: [List key strengths here, e.g., "The pacing is well-aligned with the suspense genre."]
-- **Areas for Improvement**: [Describe any weaknesses or areas that need work.]
-- **Suggestions for Improvement**: [List specific, actionable feedback here.]
-
-**Rating**: I would rate this script **[8/10]**, with the following changes recommended to achieve a higher score: [Provide targeted suggestions for improvement here].
-"""
-
-    return plot_structure
-
-# Function to evaluate character development and motivations
-def prompt_character_development(data):
-    character_development=f"""You are a Senior Script Development Editor specializing in character analysis and narrative refinement. Your task is to evaluate the following film script:\n\n"{data}" 
-
-**Focus**: Character Development and Motivations. Pay close attention to dialogue nuances, scene descriptions, and subtle character details that contribute to a cohesive story. Your feedback should provide detailed insights suitable for fine-tuning in later drafts.
-
-**Guidelines for Evaluation**:
-
-1. **Character Arcs and Growth**: Begin by identifying the arcs of the main characters. Does each primary character undergo meaningful change, learning, or personal growth by the end of the story? Provide feedback on the clarity and depth of each arc, noting any inconsistencies or missed opportunities for development.
-
-2. **Motivations and Goals**: Evaluate each main character’s goals and desires—whether tangible (e.g., saving someone) or internal (e.g., overcoming fear). Are these goals clear, relatable, and compelling? Assess whether motivations are strong enough to engage the audience and drive character actions in a meaningful way.
-
-3. **Consistency in Behavior**: Assess whether each character's actions align with their established personality traits and goals, especially in moments of conflict or stress. Note any inconsistencies in behavior or dialogue that detract from character authenticity, providing specific scene references when possible.
-
-4. **Character Roles and Impact**: Analyze the protagonist's role and stakes within the story. Is the protagonist a driving force, actively shaping the narrative through their choices? Are the stakes high and personal enough to support the story’s tension?
-
-**Constructive Feedback**: Offer actionable feedback that addresses both strengths and weaknesses in character development, with specific suggestions for adjustments.
-
-**Rating**: Conclude with a rating on a scale of 1-10 for character development and motivations, justifying your score. If the rating is below 9, specify areas for improvement that could elevate the score.
-
----
-
-**Template for Response**:
-
-"I have analyzed the character development and motivations with a focus on the following aspects:
-- **Character Arcs and Growth**: [Provide insights here, e.g., "The protagonist’s arc shows clear personal growth, but secondary characters lack development."]
-- **Motivations and Goals**: [Provide observations here, such as "The protagonist’s goals are compelling but could be clarified in earlier scenes."]
-- **Consistency in Behavior**: [Point out any inconsistencies with specific scene references.]
-- **Character Roles and Impact**: [Evaluate the protagonist’s role and any high-stake moments.]
-
-**Rating**: Based on this evaluation, I would rate the character development and motivations **[8/10]**. To improve the score, I recommend [Provide specific improvements here]."
-"""
-
-    return character_development
-    
-# Function to evaluate dialogue and interactions
-def prompt_dialogue_interactions(data):
-    dialogue_interactions= f"""You are a Script Doctor with expertise in Dialogue Refinement. Your goal is to provide direct, critical feedback on the following script dialogue:\n\n"{data}"
-
-**Focus**: Dialogue and Character Interactions. Your analysis should identify weaknesses and areas for improvement, with clear insights into dialogue authenticity, genre consistency, and character voice.
-
-**Guidelines for Evaluation**:
-
-1. **Dialogue Authenticity**: Begin by assessing the flow of the dialogue. Does it sound realistic, as if actual people might say it? Identify any sections where the dialogue feels forced, overly dramatic, or unnatural.
-
-2. **Genre Consistency**: Determine if the dialogue aligns with the script’s genre and tone. Does the style of dialogue meet genre expectations (e.g., quick-witted for comedy, intense for thrillers)? Note any areas where the tone of the dialogue detracts from the story’s intended impact.
-
-3. **Character Voice and Distinction**: Review each character’s dialogue to ensure unique, recognizable voices that reflect individual personalities, backgrounds, and emotional states. Ask yourself: Can you tell who is speaking just from their dialogue? Highlight any instances where characters sound too similar or lack distinctive voices.
-
-4. **Constructive Feedback**: Identify strengths, such as effective exchanges or particularly memorable lines, and areas needing improvement. Offer specific, actionable suggestions like, “Consider adding subtext to reflect underlying tension” or “Tighten dialogue for a snappier flow.”
-
-**Rating**: Conclude with a rating on a scale of 1-10 for dialogue and interactions, justifying your score. If the rating is below 9, specify key areas that need refinement to enhance the dialogue’s impact.
-
----
-
-**Template for Response**:
-
-"I have analyzed the dialogue and interactions with attention to the following aspects:
-- **Dialogue Authenticity**: [Provide feedback here, e.g., “Most dialogue is realistic, but certain exchanges feel too expository.”]
-- **Genre Consistency**: [Provide observations here, e.g., “The dialogue aligns well with the thriller genre, though some lines lack intensity.”]
-- **Character Voice and Distinction**: [List any characters who need more distinctive voices and examples of strong character voice.]
-- **Actionable Suggestions**: [Provide specific suggestions, like “Add subtle tension in character exchanges during key scenes.”]
-
-**Rating**: Based on this evaluation, I would rate the dialogue and interactions **[8/10]**. To improve this score, I recommend [specific adjustments or refinements].
-"""
-
-    return dialogue_interactions
-    
-# Function to evaluate subplots and themes
-def prompt_subplots_themes(data):
-    subplots_themes=f"""You are a Story Consultant specializing in Themes and Subplots. Your task is to analyze the following script:\n\n"{data}"
-
-**Focus**: Subplots and Themes. Provide positive reinforcement and constructive, empathetic guidance. Begin by highlighting what works well, then offer suggestions for refinement, emphasizing how the subplots and themes contribute to the overall story.
-
-**Guidelines for Evaluation**:
-
-1. **Define Main Themes**: Identify the script’s central themes—what big ideas or messages are explored (e.g., love, revenge, freedom, identity)? Assess if these primary themes are clear and resonate with the protagonist’s journey and the main plot. Offer feedback on how effectively these themes are communicated and integrated into the story.
-
-2. **Supporting Themes**: Identify any secondary themes that complement or contrast the main themes. Do these add depth and richness to the story without overwhelming it? Provide feedback on how these supporting themes enhance the narrative or offer fresh perspectives on the central themes.
-
-3. **Subplots and Their Integration**: Examine the subplots to determine if they connect meaningfully with the main plot. Do they enhance the story, or do they feel tangential? Evaluate if subplots are well integrated into the narrative without distracting from the protagonist’s journey.
-
-4. **Character Growth and Complexity**: Assess whether the subplots provide opportunities for character development. Do they allow the protagonist or other characters to grow, change, or reveal new dimensions? Analyze how the subplots impact the characters’ journeys and add complexity to the story.
-
-5. **Timing and Resolution**: Evaluate the pacing of the subplots. Are they introduced, developed, and resolved at appropriate moments in the story? Consider if they enhance the main plot or provide well-timed moments of relief, tension, or added complexity.
-
-**Constructive Feedback**: Provide feedback on the strengths of the themes and subplots, as well as any areas that could be improved.
-
-**Rating**: Conclude with a rating on a scale of 1-10 for the script’s subplots and themes, justifying your score. If the rating is below 9, suggest specific improvements to strengthen the integration and impact of the subplots and themes.
-
----
-
-**Template for Response**:
-
-"I have analyzed the themes and subplots with a focus on the following aspects:
-- **Main Themes**: [Describe the central themes and how effectively they are portrayed, e.g., "The theme of identity is compelling and well-integrated with the protagonist’s journey."]
-- **Supporting Themes**: [Provide insights, such as “The secondary theme of friendship enhances the main theme without overshadowing it.”]
-- **Subplots and Integration**: [Evaluate the role and integration of subplots, with observations like “The subplot involving the protagonist’s friend adds depth but could be tied more closely to the main plot.”]
-- **Character Growth and Complexity**: [Mention any ways in which subplots add layers to character development.]
-- **Timing and Resolution**: [Assess the pacing of subplots, e.g., “The subplot is resolved too early, missing an opportunity for tension.”]
-
-**Rating**: Based on this analysis, I would rate the subplots and themes **[8/10]**. To strengthen the impact, I recommend [specific improvements or adjustments here].
-"""
-
-    return subplots_themes
-    
-    
-    
-# Function to evaluate originality and creativity
-def prompt_originality_creativity(data):
-    originality_creativity=f"""You are a Script Evaluator with expertise in Originality and Creativity. Your task is to analyze the following script:\n\n"{data}"
-
-**Focus**: Originality and Inventiveness. Provide blunt, no-nonsense feedback that identifies weaknesses and areas where the story could be more inventive. Be direct, addressing core issues and offering clear solutions to improve the script's uniqueness.
-
-**Guidelines for Evaluation**:
-
-1. **Unique Premise**: Assess whether the central idea presents a fresh or unusual concept. Is the story’s premise original, or does it feel like a rehash of familiar ideas? If the premise lacks uniqueness, suggest ways it can be made more distinctive or offer a new angle on a well-known trope.
-
-2. **Plot Twists and Surprises**: Evaluate originality in the story’s progression. Are there plot developments or twists that challenge the audience’s expectations? If the plot feels predictable—especially in Act 3—offer ideas to introduce more unexpected or inventive elements to keep the audience engaged.
-
-3. **Dialogue for Creativity**: Analyze the dialogue for freshness and inventiveness. Does it reflect each character’s voice in a distinctive and engaging way? If the dialogue feels generic or lacks creativity, provide specific examples and suggest ways to make it more unique and aligned with each character’s personality.
-
-**Constructive Feedback**: Provide clear, direct feedback on the originality and creativity of the script, highlighting areas needing improvement and suggestions for enhancing its uniqueness.
-
-**Rating**: Conclude with a rating on a scale of 1-10, justifying your score. If the rating is below 9, specify which elements—such as premise, plot twists, or dialogue—could benefit from more originality and provide concrete improvement ideas.
-
----
-
-**Template for Response**:
-
-"I have analyzed the script’s originality and creativity with attention to the following aspects:
-- **Unique Premise**: [Provide your assessment here, e.g., “The premise is engaging but could benefit from a more unique angle, such as exploring a fresh motivation for the protagonist.”]
-- **Plot Twists and Surprises**: [Provide observations here, e.g., “The story could introduce more surprises in Act 3 to avoid predictability.”]
-- **Dialogue for Creativity**: [Highlight any areas where the dialogue lacks originality, providing suggestions for improvement, like “Add character-specific quirks in dialogue to make it more memorable.”]
-
-**Rating**: Based on this analysis, I would rate the script **[7/10]**. To improve this score, I recommend [suggest specific adjustments, such as unique plot elements or more creative dialogue styles].
-"""
-
-    return originality_creativity
-    
-    
-def lambda_handler(event, context):
-    # Step 1: Get the data (Assuming it's passed in the event or fetched from a source)
-    if isinstance(event, str):  # Check if event is a JSON string
-        event = json.loads(event)  # Parse JSON string to dictionary
-    
-    data = json.dumps(event, ensure_ascii=False)
-    print('printing data', data)
-    
-    # Step 2: Generate prompts using the defined functions
-    prompts = [
-        ("plot_structure", prompt_plot_structure(data)),
-        #("character_development", prompt_character_development(data)),
-        #("dialogue_interactions", prompt_dialogue_interactions(data))
-        #("subplots_themes", prompt_subplots_themes(data)),
-        #("originality_creativity", prompt_originality_creativity(data))
-
-    ]
-    
-    # Step 3: Send each prompt to Bedrock and collect responses
-    responses = []
-    for func_name,prompt in prompts:
-        response = lambda_client.invoke(
-            FunctionName='arn:aws:lambda:eu-west-2:039612872581:function:call_bedrock',
-            InvocationType='RequestResponse',
-            #Payload=json.dumps({'prompt': prompt})  # Pass prompt as JSON object
-            Payload=json.dumps({
-        'prompt': prompt,
-        'function_name': func_name  # Pass the function name if necessary
-        })
-        )
-        
-        # Read and parse the response from the Bedrock Lambda function
-        response_payload = json.loads(response['Payload'].read())
-        responses.append({
-        'function_name': func_name,
-        'response': response_payload
-    })
-
-
-    # Step 4: Return all responses in the final output
-    return {
-        'statusCode': 200,
-        'body': json.dumps({
-            'message': 'Evaluations passed!',
-        
-        })
-    }
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from aws_clients import lazy_client, MAX_POOL_CONNECTIONS
+from chunking import SCRIPT_END, SCRIPT_START, estimate_tokens, plan_chunks, render_scenes, scene_outline
+from model_output import extract_text, extract_rating
+from model_router import response_tokens, select_models
+from scene_diff import content_defined_chunks
+import tracing
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Configuration constants
+CALL_BEDROCK_ARN = os.getenv('CALL_BEDROCK_ARN', 'arn:aws:lambda:eu-west-2:039612872581:function:call_bedrock')
+MAX_CONCURRENCY = int(os.getenv('EVALUATOR_MAX_CONCURRENCY', '5'))
+DEFAULT_DIMENSION_TIMEOUT = float(os.getenv('DIMENSION_TIMEOUT_SECONDS', '280'))
+# Optional per-dimension overrides, e.g. '{"plot_structure": 120}'
+DIMENSION_TIMEOUTS = json.loads(os.getenv('DIMENSION_TIMEOUTS', '{}'))
+# In Lambda every deadline is also capped by the invocation's remaining time, less this margin for the
+# response; when dimensions are chunked, this share of that time is kept back for the reduce step
+HANDLER_MARGIN_SECONDS = float(os.getenv('HANDLER_MARGIN_SECONDS', '10'))
+REDUCE_TIME_SHARE = float(os.getenv('REDUCE_TIME_SHARE', '0.3'))
+# Models every dimension is evaluated with; when unset, ROUTING_POLICY picks them per dimension
+EVALUATION_MODELS = [prefix for prefix in os.getenv('EVALUATION_MODELS', '').split(',') if prefix]
+
+# Keep enough pooled connections for every concurrent invoke
+lambda_client = lazy_client('lambda', read_timeout=900, max_pool_connections=max(MAX_POOL_CONNECTIONS, MAX_CONCURRENCY))
+
+def script_prompt(data, instructions, preamble=''):
+    """Lay out an evaluator prompt: the script, then any chunk preamble, then the dimension's instructions.
+
+    The script comes first and is identical for every dimension, so the
+    prompts for one script share a long common prefix that providers can
+    cache (see model_router.request_body).
+    """
+    return f"{SCRIPT_START}\n{data}\n{SCRIPT_END}\n\n{preamble}{instructions}"
+
+# Function to evaluate plot structure and pacing
+def prompt_plot_structure(data, preamble=''):
+    plot_structure = """You are an expert Script Evaluator for a major film production company. Your goal is to evaluate the film script above. Focus your analysis on Plot Structure and Pacing, providing feedback that reflects the priorities of buyers, producers, and studios.
+
+**Guidelines for Evaluation:**
+
+1. **Genre and Tone**: Identify the genre and tone of the script. Assess whether they align with current market expectations (e.g., suspense and twists for thrillers, humor for comedies). Describe how effectively the pacing and style support the intended genre, noting any issues that may affect its commercial success.
+
+2. **Three-Act Structure Analysis**:
+   - **Act One (Setup)**: Evaluate if the opening scene captures interest, introduces the main characters and stakes clearly, and establishes an inciting incident to drive the story forward.
+   - **Act Two (Confrontation)**: Assess the protagonist's journey through challenges. Are the conflicts engaging enough to maintain viewer interest? Is character development consistent and believable?
+   - **Act Three (Resolution)**: Review the climax and resolution, focusing on emotional impact and thematic coherence. Is the climax satisfying and well-earned, and are plot threads resolved meaningfully?
+
+3. **Constructive Feedback**: Highlight strengths and weaknesses in plot structure and pacing. Provide practical suggestions for improvement to enhance the script’s marketability.
+
+**Rating**: Conclude with a rating on a scale of 1-10, justifying your score. If the rating is below 9, specify the changes that could elevate it.
+
+---
+
+**Template for Response**:
+
+"I have carefully analyzed the plot structure and pacing. Based on my evaluation:
+- **Strengths**: [List key strengths here, e.g., "The pacing is well-aligned with the suspense genre."]
+- **Areas for Improvement**: [Describe any weaknesses or areas that need work.]
+- **Suggestions for Improvement**: [List specific, actionable feedback here.]
+
+**Rating**: I would rate this script **[8/10]**, with the following changes recommended to achieve a higher score: [Provide targeted suggestions for improvement here].
+"""
+
+    return script_prompt(data, plot_structure, preamble)
+
+# Function to evaluate character development and motivations
+def prompt_character_development(data, preamble=''):
+    character_development="""You are a Senior Script Development Editor specializing in character analysis and narrative refinement. Your task is to evaluate the film script above.
+
+**Focus**: Character Development and Motivations. Pay close attention to dialogue nuances, scene descriptions, and subtle character details that contribute to a cohesive story. Your feedback should provide detailed insights suitable for fine-tuning in later drafts.
+
+**Guidelines for Evaluation**:
+
+1. **Character Arcs and Growth**: Begin by identifying the arcs of the main characters. Does each primary character undergo meaningful change, learning, or personal growth by the end of the story? Provide feedback on the clarity and depth of each arc, noting any inconsistencies or missed opportunities for development.
+
+2. **Motivations and Goals**: Evaluate each main character’s goals and desires—whether tangible (e.g., saving someone) or internal (e.g., overcoming fear). Are these goals clear, relatable, and compelling? Assess whether motivations are strong enough to engage the audience and drive character actions in a meaningful way.
+
+3. **Consistency in Behavior**: Assess whether each character's actions align with their established personality traits and goals, especially in moments of conflict or stress. Note any inconsistencies in behavior or dialogue that detract from character authenticity, providing specific scene references when possible.
+
+4. **Character Roles and Impact**: Analyze the protagonist's role and stakes within the story. Is the protagonist a driving force, actively shaping the narrative through their choices? Are the stakes high and personal enough to support the story’s tension?
+
+**Constructive Feedback**: Offer actionable feedback that addresses both strengths and weaknesses in character development, with specific suggestions for adjustments.
+
+**Rating**: Conclude with a rating on a scale of 1-10 for character development and motivations, justifying your score. If the rating is below 9, specify areas for improvement that could elevate the score.
+
+---
+
+**Template for Response**:
+
+"I have analyzed the character development and motivations with a focus on the following aspects:
+- **Character Arcs and Growth**: [Provide insights here, e.g., "The protagonist’s arc shows clear personal growth, but secondary characters lack development."]
+- **Motivations and Goals**: [Provide observations here, such as "The protagonist’s goals are compelling but could be clarified in earlier scenes."]
+- **Consistency in Behavior**: [Point out any inconsistencies with specific scene references.]
+- **Character Roles and Impact**: [Evaluate the protagonist’s role and any high-stake moments.]
+
+**Rating**: Based on this evaluation, I would rate the character development and motivations **[8/10]**. To improve the score, I recommend [Provide specific improvements here]."
+"""
+
+    return script_prompt(data, character_development, preamble)
+    
+# Function to evaluate dialogue and interactions
+def prompt_dialogue_interactions(data, preamble=''):
+    dialogue_interactions= """You are a Script Doctor with expertise in Dialogue Refinement. Your goal is to provide direct, critical feedback on the dialogue of the script above.
+
+**Focus**: Dialogue and Character Interactions. Your analysis should identify weaknesses and areas for improvement, with clear insights into dialogue authenticity, genre consistency, and character voice.
+
+**Guidelines for Evaluation**:
+
+1. **Dialogue Authenticity**: Begin by assessing the flow of the dialogue. Does it sound realistic, as if actual people might say it? Identify any sections where the dialogue feels forced, overly dramatic, or unnatural.
+
+2. **Genre Consistency**: Determine if the dialogue aligns with the script’s genre and tone. Does the style of dialogue meet genre expectations (e.g., quick-witted for comedy, intense for thrillers)? Note any areas where the tone of the dialogue detracts from the story’s intended impact.
+
+3. **Character Voice and Distinction**: Review each character’s dialogue to ensure unique, recognizable voices that reflect individual personalities, backgrounds, and emotional states. Ask yourself: Can you tell who is speaking just from their dialogue? Highlight any instances where characters sound too similar or lack distinctive voices.
+
+4. **Constructive Feedback**: Identify strengths, such as effective exchanges or particularly memorable lines, and areas needing improvement. Offer specific, actionable suggestions like, “Consider adding subtext to reflect underlying tension” or “Tighten dialogue for a snappier flow.”
+
+**Rating**: Conclude with a rating on a scale of 1-10 for dialogue and interactions, justifying your score. If the rating is below 9, specify key areas that need refinement to enhance the dialogue’s impact.
+
+---
+
+**Template for Response**:
+
+"I have analyzed the dialogue and interactions with attention to the following aspects:
+- **Dialogue Authenticity**: [Provide feedback here, e.g., “Most dialogue is realistic, but certain exchanges feel too expository.”]
+- **Genre Consistency**: [Provide observations here, e.g., “The dialogue aligns well with the thriller genre, though some lines lack intensity.”]
+- **Character Voice and Distinction**: [List any characters who need more distinctive voices and examples of strong character voice.]
+- **Actionable Suggestions**: [Provide specific suggestions, like “Add subtle tension in character exchanges during key scenes.”]
+
+**Rating**: Based on this evaluation, I would rate the dialogue and interactions **[8/10]**. To improve this score, I recommend [specific adjustments or refinements].
+"""
+
+    return script_prompt(data, dialogue_interactions, preamble)
+    
+# Function to evaluate subplots and themes
+def prompt_subplots_themes(data, preamble=''):
+    subplots_themes="""You are a Story Consultant specializing in Themes and Subplots. Your task is to analyze the script above.
+
+**Focus**: Subplots and Themes. Provide positive reinforcement and constructive, empathetic guidance. Begin by highlighting what works well, then offer suggestions for refinement, emphasizing how the subplots and themes contribute to the overall story.
+
+**Guidelines for Evaluation**:
+
+1. **Define Main Themes**: Identify the script’s central themes—what big ideas or messages are explored (e.g., love, revenge, freedom, identity)? Assess if these primary themes are clear and resonate with the protagonist’s journey and the main plot. Offer feedback on how effectively these themes are communicated and integrated into the story.
+
+2. **Supporting Themes**: Identify any secondary themes that complement or contrast the main themes. Do these add depth and richness to the story without overwhelming it? Provide feedback on how these supporting themes enhance the narrative or offer fresh perspectives on the central themes.
+
+3. **Subplots and Their Integration**: Examine the subplots to determine if they connect meaningfully with the main plot. Do they enhance the story, or do they feel tangential? Evaluate if subplots are well integrated into the narrative without distracting from the protagonist’s journey.
+
+4. **Character Growth and Complexity**: Assess whether the subplots provide opportunities for character development. Do they allow the protagonist or other characters to grow, change, or reveal new dimensions? Analyze how the subplots impact the characters’ journeys and add complexity to the story.
+
+5. **Timing and Resolution**: Evaluate the pacing of the subplots. Are they introduced, developed, and resolved at appropriate moments in the story? Consider if they enhance the main plot or provide well-timed moments of relief, tension, or added complexity.
+
+**Constructive Feedback**: Provide feedback on the strengths of the themes and subplots, as well as any areas that could be improved.
+
+**Rating**: Conclude with a rating on a scale of 1-10 for the script’s subplots and themes, justifying your score. If the rating is below 9, suggest specific improvements to strengthen the integration and impact of the subplots and themes.
+
+---
+
+**Template for Response**:
+
+"I have analyzed the themes and subplots with a focus on the following aspects:
+- **Main Themes**: [Describe the central themes and how effectively they are portrayed, e.g., "The theme of identity is compelling and well-integrated with the protagonist’s journey."]
+- **Supporting Themes**: [Provide insights, such as “The secondary theme of friendship enhances the main theme without overshadowing it.”]
+- **Subplots and Integration**: [Evaluate the role and integration of subplots, with observations like “The subplot involving the protagonist’s friend adds depth but could be tied more closely to the main plot.”]
+- **Character Growth and Complexity**: [Mention any ways in which subplots add layers to character development.]
+- **Timing and Resolution**: [Assess the pacing of subplots, e.g., “The subplot is resolved too early, missing an opportunity for tension.”]
+
+**Rating**: Based on this analysis, I would rate the subplots and themes **[8/10]**. To strengthen the impact, I recommend [specific improvements or adjustments here].
+"""
+
+    return script_prompt(data, subplots_themes, preamble)
+    
+    
+    
+# Function to evaluate originality and creativity
+def prompt_originality_creativity(data, preamble=''):
+    originality_creativity="""You are a Script Evaluator with expertise in Originality and Creativity. Your task is to analyze the script above.
+
+**Focus**: Originality and Inventiveness. Provide blunt, no-nonsense feedback that identifies weaknesses and areas where the story could be more inventive. Be direct, addressing core issues and offering clear solutions to improve the script's uniqueness.
+
+**Guidelines for Evaluation**:
+
+1. **Unique Premise**: Assess whether the central idea presents a fresh or unusual concept. Is the story’s premise original, or does it feel like a rehash of familiar ideas? If the premise lacks uniqueness, suggest ways it can be made more distinctive or offer a new angle on a well-known trope.
+
+2. **Plot Twists and Surprises**: Evaluate originality in the story’s progression. Are there plot developments or twists that challenge the audience’s expectations? If the plot feels predictable—especially in Act 3—offer ideas to introduce more unexpected or inventive elements to keep the audience engaged.
+
+3. **Dialogue for Creativity**: Analyze the dialogue for freshness and inventiveness. Does it reflect each character’s voice in a distinctive and engaging way? If the dialogue feels generic or lacks creativity, provide specific examples and suggest ways to make it more unique and aligned with each character’s personality.
+
+**Constructive Feedback**: Provide clear, direct feedback on the originality and creativity of the script, highlighting areas needing improvement and suggestions for enhancing its uniqueness.
+
+**Rating**: Conclude with a rating on a scale of 1-10, justifying your score. If the rating is below 9, specify which elements—such as premise, plot twists, or dialogue—could benefit from more originality and provide concrete improvement ideas.
+
+---
+
+**Template for Response**:
+
+"I have analyzed the script’s originality and creativity with attention to the following aspects:
+- **Unique Premise**: [Provide your assessment here, e.g., “The premise is engaging but could benefit from a more unique angle, such as exploring a fresh motivation for the protagonist.”]
+- **Plot Twists and Surprises**: [Provide observations here, e.g., “The story could introduce more surprises in Act 3 to avoid predictability.”]
+- **Dialogue for Creativity**: [Highlight any areas where the dialogue lacks originality, providing suggestions for improvement, like “Add character-specific quirks in dialogue to make it more memorable.”]
+
+**Rating**: Based on this analysis, I would rate the script **[7/10]**. To improve this score, I recommend [suggest specific adjustments, such as unique plot elements or more creative dialogue styles].
+"""
+
+    return script_prompt(data, originality_creativity, preamble)
+    
+    
+# Evaluation dimensions, in the order they are reported
+DIMENSIONS = [
+    ("plot_structure", prompt_plot_structure),
+    ("character_development", prompt_character_development),
+    ("dialogue_interactions", prompt_dialogue_interactions),
+    ("subplots_themes", prompt_subplots_themes),
+    ("originality_creativity", prompt_originality_creativity),
+]
+
+# Placed between the excerpt and the dimension's instructions when the script is evaluated in chunks
+CHUNK_PREAMBLE = """The text above is part {part} of {parts} of a film script that is too long to read at once. For orientation, this is the full scene list:
+
+{outline}
+{context}
+Evaluate only the excerpt above. Report concrete findings with scene references and give a provisional rating for this part; the findings from all parts will be merged afterwards.
+
+"""
+
+# Chunks of a project draft carry no outline or part numbers, so an edit elsewhere in the
+# draft leaves their prompts, and therefore their stored outputs, unchanged
+REVISION_CHUNK_PREAMBLE = """The text above is one part of a film script that is too long to read at once.
+{context}
+Evaluate only the excerpt above. Report concrete findings with scene references and give a provisional rating for this part; the findings from all parts will be merged afterwards.
+
+"""
+
+def response_template(build_prompt):
+    """Return the response template section of a dimension prompt."""
+    return build_prompt('').split('**Template for Response**:', 1)[-1].strip()
+
+def prompt_chunk(build_prompt, chunk, outline=None):
+    """Build the map prompt for one chunk of the script.
+
+    Without an outline the prompt is the revision-stable form: nothing but
+    the chunk and its neighbour context.
+    """
+    context = ''
+    if chunk['context_scenes']:
+        context = f"\nThe previous part ended with:\n{render_scenes(chunk['context_scenes'])}\n"
+    if outline is None:
+        preamble = REVISION_CHUNK_PREAMBLE.format(context=context)
+    else:
+        preamble = CHUNK_PREAMBLE.format(part=chunk['index'] + 1, parts=chunk['count'],
+                                         outline=outline, context=context)
+    return build_prompt(render_scenes(chunk['scenes']), preamble)
+
+def chunk_overhead(builders, outline, parts):
+    """Prompt tokens besides the excerpt and its context in the largest chunk prompt of these dimensions."""
+    if outline is None:
+        preamble = REVISION_CHUNK_PREAMBLE.format(context='')
+    else:
+        preamble = CHUNK_PREAMBLE.format(part=parts, parts=parts, outline=outline, context='')
+    return max(estimate_tokens(build_prompt('', preamble)) for build_prompt in builders)
+
+def prompt_merge_findings(build_prompt, findings):
+    """Build the reduce prompt that merges per-chunk findings into one report."""
+    parts = '\n\n'.join(f"--- Part {number} ---\n{text}" for number, text in enumerate(findings, start=1))
+    return f"""You are the lead evaluator consolidating reviews of consecutive parts of one film script. Each part was reviewed separately against the same criteria:
+
+{parts}
+
+Merge these findings into a single evaluation of the whole script. Weigh act-level structure and how the parts connect, resolve contradictions between parts, and give one overall rating on a scale of 1-10.
+
+**Template for Response**:
+
+{response_template(build_prompt)}
+"""
+
+# Task fields forwarded to call_bedrock
+PAYLOAD_FIELDS = ('prompt', 'function_name', 'models', 'max_tokens', 'bypass_cache', 'script_hash', 'stream',
+                  tracing.CORRELATION_FIELD)
+
+def task_payload(task):
+    """The call_bedrock event for one task."""
+    return {field: task[field] for field in PAYLOAD_FIELDS if task.get(field) is not None}
+
+def invoke_call_bedrock(task):
+    """Invoke the call_bedrock Lambda for one task and return its payload."""
+    response = lambda_client.invoke(
+        FunctionName=CALL_BEDROCK_ARN,
+        InvocationType='RequestResponse',
+        Payload=json.dumps(task_payload(task))
+    )
+    return json.loads(response['Payload'].read())
+
+def evaluate_dimensions(tasks, max_concurrency=MAX_CONCURRENCY, timeouts=None, invoke=invoke_call_bedrock,
+                        deadline=None):
+    """Fan the tasks out concurrently and collect per-task results.
+
+    A task is {"function_name", "dimension", "prompt", "models", ...}. Each task
+    gets its dimension's deadline, measured from the start of the fan-out
+    and capped at `deadline` (a time.monotonic() value) when given.
+    A task that fails or misses its deadline is reported with an error
+    instead of failing the whole evaluation. `invoke(task)` returns the
+    call_bedrock payload; by default it goes through the call_bedrock Lambda.
+    """
+    timeouts = timeouts if timeouts is not None else DIMENSION_TIMEOUTS
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(tasks))))
+    started = time.monotonic()
+
+    futures = {}
+    deadlines = {}
+    for index, task in enumerate(tasks):
+        future = executor.submit(tracing.propagate(invoke), task)
+        futures[future] = index
+        deadlines[index] = started + float(timeouts.get(task['dimension'], DEFAULT_DIMENSION_TIMEOUT))
+        if deadline is not None:
+            deadlines[index] = min(deadlines[index], deadline)
+
+    results = {}
+    pending = set(futures)
+    try:
+        while pending:
+            next_deadline = min(deadlines[futures[f]] for f in pending)
+            done, pending = wait(pending, timeout=max(0, next_deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = futures[future]
+                elapsed = round(time.monotonic() - started, 3)
+                try:
+                    results[index] = {'status': 'succeeded', 'elapsed': elapsed, 'response': future.result()}
+                except Exception as e:
+                    logger.error(f"Evaluation {tasks[index]['function_name']} failed: {e}")
+                    results[index] = {'status': 'failed', 'elapsed': elapsed, 'error': str(e)}
+
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[futures[f]] <= now]:
+                index = futures[future]
+                future.cancel()
+                pending.discard(future)
+                logger.error(f"Evaluation {tasks[index]['function_name']} timed out")
+                results[index] = {'status': 'timed_out', 'elapsed': round(now - started, 3),
+                                  'error': 'Dimension timed out'}
+    finally:
+        # Do not block on invokes that outlived their deadline
+        executor.shutdown(wait=False)
+
+    return [dict(function_name=task['function_name'], **results[index]) for index, task in enumerate(tasks)]
+
+def dimension_models(dimension):
+    """Model prefixes a dimension is evaluated with."""
+    return EVALUATION_MODELS or select_models(dimension)
+
+def model_text(result, model_prefix):
+    """Return the generated text for one model from a task result, or None."""
+    if result['status'] != 'succeeded':
+        return None
+    for item in result['response'].get('results', []):
+        text = extract_text(item.get('responses', {}).get(model_prefix))
+        if text:
+            return text
+    return None
+
+def model_error(result, model_prefix):
+    """The model's failure record from a task result (see call_bedrock.call_model), or the task error."""
+    if result['status'] != 'succeeded':
+        return result.get('error')
+    for item in result['response'].get('results', []):
+        response = item.get('responses', {}).get(model_prefix)
+        if isinstance(response, dict) and response.get('error'):
+            return {key: response[key] for key in ('error', 'error_type', 'error_code', 'regions_tried', 'attempts')
+                    if key in response}
+    return None
+
+def model_reused(result, model_prefix):
+    """True if call_bedrock served the model's answer from a stored output instead of calling it."""
+    if result['status'] != 'succeeded':
+        return False
+    return any(isinstance(item.get('responses', {}).get(model_prefix), dict)
+               and item['responses'][model_prefix].get('reused') for item in result['response'].get('results', []))
+
+def task_options(event):
+    """Per-request options copied from the evaluator event onto every task."""
+    return {
+        'bypass_cache': bool(event.get('bypass_cache', False)),
+        'script_hash': event.get('script_hash'),
+        # Unset leaves call_bedrock's BEDROCK_STREAM default
+        'stream': event.get('stream'),
+        tracing.CORRELATION_FIELD: event.get(tracing.CORRELATION_FIELD) or tracing.current_correlation_id(),
+    }
+
+def plan_tasks(event):
+    """Build the map tasks for every (dimension, model) pair.
+
+    Scripts that fit a model's context are evaluated in one prompt; longer
+    ones are split on Scene Heading boundaries and evaluated per chunk.
+    Drafts of a project (event has a project_id) are always split into
+    content-defined chunks, so unchanged chunks reuse their stored findings
+    and only changed chunks and the merge step call Bedrock. Returns (tasks, plans) where plans maps (dimension, model) to the
+    indexes of its tasks.
+    """
+    scenes = event.get('scenes')
+    options = task_options(event)
+    data = render_scenes(scenes) if scenes else json.dumps(
+        {key: value for key, value in event.items() if key not in options and key != 'project_id'},
+        ensure_ascii=False, separators=(',', ':'))
+    # Drafts of a project are cut into revision-stable chunks whose findings are reused
+    incremental = bool(scenes and event.get('project_id'))
+    outline = None if incremental else scene_outline(scenes) if scenes else ''
+
+    models = {dimension: dimension_models(dimension) for dimension, _ in DIMENSIONS}
+    # Room for each dimension's response template, not a fixed limit
+    limits = {dimension: response_tokens(response_template(build_prompt)) for dimension, build_prompt in DIMENSIONS}
+    tasks, plans = [], {}
+    for model_prefix in dict.fromkeys(prefix for prefixes in models.values() for prefix in prefixes):
+        dimensions = [(dimension, build_prompt) for dimension, build_prompt in DIMENSIONS
+                      if model_prefix in models[dimension]]
+        # Chunks leave room for the measured instructions, preamble and outline, and the longest response
+        overhead = chunk_overhead([build_prompt for _, build_prompt in dimensions], outline, len(scenes or ()))
+        response_limit = max(limits[dimension] for dimension, _ in dimensions)
+        if not scenes:
+            chunks = []
+        elif incremental:
+            chunks = content_defined_chunks(scenes, model_prefix, overhead, response_limit)
+        else:
+            chunks = plan_chunks(scenes, model_prefix, overhead, response_limit)
+        for dimension, build_prompt in dimensions:
+            max_tokens = limits[dimension]
+            indexes = []
+            if len(chunks) <= 1:
+                prompts = [(dimension, build_prompt(data), {})]
+            elif incremental:
+                # Stored chunk outputs are keyed by the chunk's content, not the whole script
+                prompts = [(f"{dimension}_chunk", prompt_chunk(build_prompt, chunk),
+                            {'script_hash': chunk['fingerprint']}) for chunk in chunks]
+            else:
+                prompts = [(f"{dimension}_chunk{chunk['index'] + 1}", prompt_chunk(build_prompt, chunk, outline), {})
+                           for chunk in chunks]
+            for func_name, prompt, overrides in prompts:
+                indexes.append(len(tasks))
+                tasks.append(dict(options, function_name=func_name, dimension=dimension, prompt=prompt,
+                                  models=[model_prefix], max_tokens=max_tokens, **overrides))
+            plans[(dimension, model_prefix)] = indexes
+    return tasks, plans
+
+def evaluate_script(event, invoke=invoke_call_bedrock, timeouts=None, deadline=None):
+    """Map each dimension over the script (or its chunks), then reduce chunked results.
+
+    With a `deadline` (time.monotonic()), both steps finish by it: the map
+    step leaves REDUCE_TIME_SHARE of the time for the reduce step when any
+    dimension is chunked.
+    """
+    with tracing.span('prompt_build', stage='map') as build_span:
+        tasks, plans = plan_tasks(event)
+        build_span.set(prompts=len(tasks), prompt_tokens=sum(estimate_tokens(t['prompt']) for t in tasks))
+    map_deadline = deadline
+    if deadline is not None and any(len(indexes) > 1 for indexes in plans.values()):
+        map_deadline = time.monotonic() + (deadline - time.monotonic()) * (1 - REDUCE_TIME_SHARE)
+    results = evaluate_dimensions(tasks, timeouts=timeouts, invoke=invoke, deadline=map_deadline)
+    builders = dict(DIMENSIONS)
+
+    # Reduce step for every (dimension, model) that was evaluated in chunks
+    outcomes, reduce_tasks = {}, []
+    reduce_started = time.perf_counter()
+    for (dimension, model_prefix), indexes in plans.items():
+        texts = [model_text(results[i], model_prefix) for i in indexes]
+        if len(indexes) == 1:
+            outcomes[(dimension, model_prefix)] = {'text': texts[0], 'chunks': 1,
+                                                'chunks_reused': int(model_reused(results[indexes[0]], model_prefix)),
+                                                'error': model_error(results[indexes[0]], model_prefix)}
+            continue
+        findings = [text for text in texts if text]
+        outcomes[(dimension, model_prefix)] = {
+            'chunks': len(indexes),
+            'chunks_reused': sum(1 for i in indexes if model_reused(results[i], model_prefix)),
+            'chunk_ratings': [extract_rating(text) for text in texts],
+            'failed_chunks': len(indexes) - len(findings),
+        }
+        if findings:
+            # Own output key, distinct from a single-prompt evaluation of the same script
+            reduce_tasks.append(((dimension, model_prefix), dict(
+                task_options(event), function_name=f"{dimension}_merged", dimension=dimension,
+                prompt=prompt_merge_findings(builders[dimension], findings), models=[model_prefix],
+                max_tokens=response_tokens(response_template(builders[dimension])))))
+        else:
+            outcomes[(dimension, model_prefix)].update(text=None, error='All chunks failed')
+
+    if reduce_tasks:
+        tracing.record('prompt_build', (time.perf_counter() - reduce_started) * 1000, stage='reduce',
+                       prompts=len(reduce_tasks),
+                       prompt_tokens=sum(estimate_tokens(task['prompt']) for _, task in reduce_tasks))
+        reduced = evaluate_dimensions([task for _, task in reduce_tasks], timeouts=timeouts, invoke=invoke,
+                                      deadline=deadline)
+        for (key, _), result in zip(reduce_tasks, reduced):
+            outcomes[key].update(text=model_text(result, key[1]), error=model_error(result, key[1]))
+
+    evaluations = []
+    for dimension, _ in DIMENSIONS:
+        models = {}
+        for model_prefix in dimension_models(dimension):
+            outcome = outcomes[(dimension, model_prefix)]
+            outcome['status'] = 'succeeded' if outcome.get('text') else 'failed'
+            outcome['rating'] = extract_rating(outcome.get('text'))
+            if outcome['status'] == 'succeeded':
+                outcome.pop('error', None)
+            else:
+                outcome['error'] = outcome.get('error') or 'No response from model'
+            models[model_prefix] = outcome
+        succeeded = any(m['status'] == 'succeeded' for m in models.values())
+        evaluations.append({'function_name': dimension,
+                            'status': 'succeeded' if succeeded else 'failed',
+                            'models': models})
+    return evaluations
+
+def evaluation_status(responses):
+    """Return (statusCode, message) summarising per-dimension outcomes."""
+    succeeded = sum(1 for r in responses if r['status'] == 'succeeded')
+    if succeeded == len(responses):
+        return 200, 'Evaluations passed!'
+    if succeeded:
+        return 200, 'Evaluations partially completed'
+    return 502, 'All evaluations failed'
+
+def lambda_handler(event, context):
+    # Step 1: Get the data (Assuming it's passed in the event or fetched from a source)
+    if isinstance(event, str):  # Check if event is a JSON string
+        event = json.loads(event)  # Parse JSON string to dictionary
+
+    # Step 2 & 3: Build prompts (chunked when needed) and evaluate them concurrently,
+    # finishing (map and reduce) before the invocation times out
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - HANDLER_MARGIN_SECONDS
+    with tracing.bind(event.get(tracing.CORRELATION_FIELD)):
+        responses = evaluate_script(event, deadline=deadline)
+    status_code, message = evaluation_status(responses)
+
+    # Step 4: Return all responses in the final output
+    return {
+        'statusCode': status_code,
+        'body': json.dumps({
+            'message': message,
+            'evaluations': responses
+        })
+    }
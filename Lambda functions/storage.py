@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+from urllib.parse import unquote_plus
+
+import tracing
+
+logger = logging.getLogger()
+
+# Key layout: every object is addressed by content, so concurrent runs never collide
+SCRIPT_PREFIX = 'scripts/'
+PARSED_PREFIX = 'parsed/'
+OUTPUT_PREFIX = 'outputs/'
+PROJECT_PREFIX = 'projects/'
+RECORDS_PREFIX = 'records/'
+# Direct uploads land here, keyed by job id, until upload_ingest moves them under SCRIPT_PREFIX
+UPLOAD_PREFIX = 'uploads/'
+# Batch archives, and each batch script's result under batches/<job_id>/results/
+BATCH_PREFIX = 'batches/'
+
+
+def content_hash(data):
+    """sha256 of raw bytes (or text, encoded as UTF-8)."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def params_hash(params):
+    """Short, stable hash of a parameter dict."""
+    return content_hash(json.dumps(params, sort_keys=True))[:16]
+
+
+def script_key(script_hash):
+    return f"{SCRIPT_PREFIX}{script_hash}.fdx"
+
+
+def parsed_key(script_hash):
+    return f"{PARSED_PREFIX}{script_hash}.json"
+
+
+def output_key(script_hash, dimension, model_prefix, params, prompt):
+    """Stored model output. The prompt's hash is part of the key, so a changed
+    template or chunk context (outline, part numbering) never reuses an old output."""
+    return (f"{OUTPUT_PREFIX}{script_hash}/{dimension}/{model_prefix}/"
+            f"{params_hash(dict(params, prompt_hash=content_hash(prompt)))}.json")
+
+
+def records_key(script_hash):
+    """Structured evaluation records of a script (see results_index)."""
+    return f"{RECORDS_PREFIX}{script_hash}.json"
+
+
+def upload_key(job_id):
+    return f"{UPLOAD_PREFIX}{job_id}.fdx"
+
+
+def batch_result_key(batch_id, script_hash):
+    return f"{BATCH_PREFIX}{batch_id}/results/{script_hash}.json"
+
+
+def manifest_key(project_id):
+    """Scene manifest of the latest evaluated draft of a project."""
+    return f"{PROJECT_PREFIX}{project_id}/manifest.json"
+
+
+def s3_event_objects(event):
+    """(bucket, key, size) of every object in an S3 notification event.
+
+    Keys arrive URL-encoded (spaces as '+'), so they are decoded here.
+    """
+    return [(record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key']),
+             record['s3']['object'].get('size'))
+            for record in event['Records']]
+
+
+class HashingReader:
+    """Wraps a binary stream and hashes the bytes as a consumer reads them.
+
+    Lets one pass over an S3 body feed the parser and compute the content
+    hash, without holding the object in memory.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self._hash.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        """sha256 of everything read so far; equals content_hash() once the stream is exhausted."""
+        while self.read(64 * 1024):
+            pass
+        return self._hash.hexdigest()
+
+
+def is_missing(error):
+    """True for the S3 errors that mean "no such object"."""
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound')
+
+
+class ArtifactStore:
+    """Content-addressed objects in one bucket."""
+
+    def __init__(self, s3_client, bucket):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def exists(self, key):
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception as e:
+            if is_missing(e):
+                return False
+            raise
+
+    def put(self, key, body, content_type):
+        with tracing.span('s3_put', key=key, bytes=len(body)):
+            self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+        logger.info(f"File uploaded to S3: {self.bucket}/{key}")
+
+    def put_if_absent(self, key, body, content_type):
+        """Write the object unless it already exists; return True if it was written."""
+        if self.exists(key):
+            logger.info(f"Reusing existing object: {self.bucket}/{key}")
+            return False
+        self.put(key, body, content_type)
+        return True
+
+    def copy_if_absent(self, source_key, key):
+        """Server-side copy within the bucket unless `key` already exists; return True if copied."""
+        if self.exists(key):
+            logger.info(f"Reusing existing object: {self.bucket}/{key}")
+            return False
+        self.s3_client.copy_object(Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': source_key})
+        logger.info(f"Copied {self.bucket}/{source_key} to {key}")
+        return True
+
+    def delete(self, key):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+
+    def get_json(self, key):
+        """Return the decoded JSON object, or None if it does not exist."""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
+        return json.loads(response['Body'].read())
+
+    def put_json(self, key, value):
+        self.put(key, json.dumps(value), 'application/json')
@@ -0,0 +1,162 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger()
+
+# Partial output is persisted at least this often while a generation streams
+FLUSH_INTERVAL_SECONDS = 1.0
+FLUSH_BYTES = 64 * 1024
+
+
+class StreamError(Exception):
+    """An error event from a response stream, shaped like a botocore ClientError.
+
+    The event name (throttlingException, modelStreamErrorException, ...)
+    becomes response['Error']['Code'] with a capitalised first letter, the
+    form resilience.classify matches against.
+    """
+
+    def __init__(self, name, detail):
+        code = name[:1].upper() + name[1:]
+        message = detail.get('message', str(detail)) if isinstance(detail, dict) else str(detail)
+        super().__init__(f"{code}: {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+def iter_stream_events(response):
+    """Yield decoded JSON chunks from an invoke_model_with_response_stream response."""
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if chunk:
+            yield json.loads(chunk['bytes'])
+            continue
+        # Errors arrive as modelStreamErrorException, throttlingException, ...
+        for name, detail in event.items():
+            raise StreamError(name, detail)
+
+
+def chunk_text(chunk):
+    """Return the text carried by one stream chunk for any supported provider."""
+    # Anthropic messages API
+    if chunk.get('type') == 'content_block_delta':
+        return chunk.get('delta', {}).get('text', '')
+    # Mistral
+    if isinstance(chunk.get('outputs'), list):
+        return ''.join(output.get('text', '') for output in chunk['outputs'])
+    # Llama / Anthropic text completions
+    return chunk.get('generation') or chunk.get('completion') or ''
+
+
+class IncrementalS3Writer:
+    """Persist streamed text as numbered part objects while it arrives.
+
+    Parts are written to "{key}.parts/00001.txt", "00002.txt", ... at most
+    FLUSH_INTERVAL_SECONDS apart, so readers can follow progress by
+    listing the prefix. close() writes nothing itself; the caller stores
+    the final result at `key` and then calls discard_parts().
+    """
+
+    def __init__(self, s3_client, bucket, key, flush_interval=FLUSH_INTERVAL_SECONDS, flush_bytes=FLUSH_BYTES):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.parts = []
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        part_key = f"{self.key}.parts/{len(self.parts) + 1:05d}.txt"
+        try:
+            self.s3_client.put_object(Bucket=self.bucket, Key=part_key, Body=''.join(self._buffer).encode('utf-8'),
+                                      ContentType='text/plain; charset=utf-8')
+            self.parts.append(part_key)
+        except Exception as e:
+            # Progress is best effort; the final object is still written by the caller
+            logger.error(f"Error saving partial response to S3: {e}")
+            return
+        self._buffer = []
+        self._buffered = 0
+
+    def discard_parts(self):
+        """Delete the part objects once the complete result has been stored."""
+        for start in range(0, len(self.parts), 1000):
+            batch = self.parts[start:start + 1000]
+            try:
+                self.s3_client.delete_objects(Bucket=self.bucket,
+                                              Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+            except Exception as e:
+                logger.error(f"Error deleting partial responses from S3: {e}")
+        self.parts = []
+
+
+def stream_progress(s3_client, bucket, prefix, max_chars=None):
+    """Latest part of every stream under `prefix` that still has part objects.
+
+    Returns [{"key", "parts", "text"}], where key is the final output key
+    and text the newest part (its last `max_chars` characters, if given).
+    """
+    streams, request = {}, {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        page = s3_client.list_objects_v2(**request)
+        for item in page.get('Contents', []):
+            key, separator, _ = item['Key'].partition('.parts/')
+            if separator:
+                count, latest = streams.get(key, (0, ''))
+                streams[key] = (count + 1, max(latest, item['Key']))
+        if not page.get('IsTruncated'):
+            break
+        request['ContinuationToken'] = page['NextContinuationToken']
+
+    progress = []
+    for key, (count, latest) in sorted(streams.items()):
+        try:
+            text = s3_client.get_object(Bucket=bucket, Key=latest)['Body'].read().decode('utf-8')
+        except Exception:
+            # Discarded after the listing: that generation has finished
+            continue
+        progress.append({'key': key, 'parts': count, 'text': text[-max_chars:] if max_chars else text})
+    return progress
+
+
+def consume_stream(response, writer=None, on_text=None):
+    """Read a Bedrock response stream to completion.
+
+    Each text delta is passed to `on_text` and `writer` as it arrives.
+    Returns a response body in the Mistral "outputs" shape, with token
+    usage taken from the stream's invocation metrics when present.
+    """
+    pieces = []
+    usage = {}
+    stop_reason = None
+    for chunk in iter_stream_events(response):
+        text = chunk_text(chunk)
+        if text:
+            pieces.append(text)
+            if on_text:
+                on_text(text)
+            if writer:
+                writer.write(text)
+        for output in chunk.get('outputs') or []:
+            stop_reason = output.get('stop_reason') or stop_reason
+        if chunk.get('type') == 'message_delta':
+            stop_reason = chunk.get('delta', {}).get('stop_reason') or stop_reason
+        metrics = chunk.get('amazon-bedrock-invocationMetrics')
+        if metrics:
+            usage = {'input_tokens': metrics.get('inputTokenCount'),
+                     'output_tokens': metrics.get('outputTokenCount')}
+    if writer:
+        writer.flush()
+    return {'outputs': [{'text': ''.join(pieces), 'stop_reason': stop_reason}], 'usage': usage}
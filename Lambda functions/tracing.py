@@ -0,0 +1,237 @@
+"""Timed spans tagged with a per-script correlation id.
+
+The correlation id is created by Master_function, stored on the job and
+forwarded in every payload (job_worker -> script_evaluator -> call_bedrock),
+so the spans each function emits can be joined per script. Spans are sent
+to the configured exporters: CloudWatch Embedded Metric Format on stdout
+in Lambda, and/or an in-memory collector for tests and benchmarks.
+Outside Lambda nothing is exported unless TRACE_EXPORTERS asks for it, so
+local CLIs and benchmarks keep stdout for their own output.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger()
+
+# Field carrying the correlation id in job records and function payloads
+CORRELATION_FIELD = 'correlation_id'
+
+IN_LAMBDA = bool(os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+# Exporters enabled at import: emf | log | none (EMF by default in Lambda only)
+TRACE_EXPORTERS = os.getenv('TRACE_EXPORTERS', 'emf' if IN_LAMBDA else 'none').split(',')
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'Scriptify')
+FUNCTION_NAME = os.getenv('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+# Span attributes published as metrics, with their CloudWatch units
+METRIC_UNITS = {
+    'input_tokens': 'Count',
+    'output_tokens': 'Count',
+    'bytes': 'Bytes',
+    'scenes': 'Count',
+    'paragraphs': 'Count',
+    'prompts': 'Count',
+    'prompt_tokens': 'Count',
+}
+
+_correlation_id = contextvars.ContextVar(CORRELATION_FIELD, default=None)
+
+
+def new_correlation_id():
+    return uuid.uuid4().hex
+
+
+def current_correlation_id():
+    return _correlation_id.get()
+
+
+@contextlib.contextmanager
+def bind(correlation_id):
+    """Tag every span opened inside the block with correlation_id."""
+    token = _correlation_id.set(correlation_id)
+    try:
+        yield correlation_id
+    finally:
+        _correlation_id.reset(token)
+
+
+def propagate(fn, correlation_id=None):
+    """Wrap fn so it runs with the caller's correlation id (or the given one) in another thread."""
+    correlation_id = correlation_id or current_correlation_id()
+
+    def run(*args, **kwargs):
+        with bind(correlation_id):
+            return fn(*args, **kwargs)
+    return run
+
+
+class Span:
+    """One timed operation; attributes can be added while it is open."""
+
+    def __init__(self, name, correlation_id, attributes):
+        self.name = name
+        self.correlation_id = correlation_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def as_dict(self):
+        return {'name': self.name, CORRELATION_FIELD: self.correlation_id, 'function': FUNCTION_NAME,
+                'start': self.start, 'duration_ms': self.duration_ms, 'error': self.error, **self.attributes}
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the block and export it as a span named `name`."""
+    current = Span(name, current_correlation_id(), {})
+    current.set(**attributes)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        export(current)
+
+
+def record(name, duration_ms, **attributes):
+    """Export a span whose duration was measured by the caller."""
+    current = Span(name, current_correlation_id(), {})
+    current.set(**attributes)
+    current.start -= duration_ms / 1000
+    current.duration_ms = round(duration_ms, 3)
+    export(current)
+
+
+class TimedIterator:
+    """Iterator wrapper accumulating the time spent producing items."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.elapsed = 0.0
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.elapsed += time.perf_counter() - started
+        self.count += 1
+        return item
+
+
+def emf_record(span_data):
+    """CloudWatch Embedded Metric Format document for one span."""
+    metrics = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+    metrics += [{'Name': name, 'Unit': unit} for name, unit in METRIC_UNITS.items()
+                if isinstance(span_data.get(name), (int, float))]
+    return {
+        '_aws': {
+            'Timestamp': int(span_data['start'] * 1000),
+            'CloudWatchMetrics': [{'Namespace': METRICS_NAMESPACE,
+                                   'Dimensions': [['Function', 'Span']],
+                                   'Metrics': metrics}],
+        },
+        'Function': span_data['function'],
+        'Span': span_data['name'],
+        'Duration': span_data['duration_ms'],
+        **{key: value for key, value in span_data.items() if key not in ('name', 'function', 'duration_ms')},
+    }
+
+
+class EMFExporter:
+    """Writes each span as one EMF JSON line to stdout (CloudWatch extracts the metrics).
+
+    Outside Lambda the lines go to stderr, away from a CLI's own output.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or (sys.stdout if IN_LAMBDA else sys.stderr)
+        self._lock = threading.Lock()
+
+    def export(self, span_data):
+        line = json.dumps(emf_record(span_data), default=str)
+        # Lambda's log formatter would prefix the line and break EMF parsing, so bypass logging
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class LogExporter:
+    """Writes each span as a structured log line."""
+
+    def export(self, span_data):
+        logger.info(json.dumps(span_data, default=str))
+
+
+class MemoryCollector:
+    """Keeps spans in memory, for tests and local benchmarks."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span_data):
+        with self._lock:
+            self.spans.append(span_data)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+    def find(self, name=None, correlation_id=None):
+        with self._lock:
+            return [s for s in self.spans
+                    if (name is None or s['name'] == name)
+                    and (correlation_id is None or s[CORRELATION_FIELD] == correlation_id)]
+
+    def summary(self, correlation_id=None):
+        """Per span name: count, total milliseconds and summed token counts."""
+        totals = {}
+        for s in self.find(correlation_id=correlation_id):
+            entry = totals.setdefault(s['name'], {'count': 0, 'duration_ms': 0.0,
+                                                  'input_tokens': 0, 'output_tokens': 0})
+            entry['count'] += 1
+            entry['duration_ms'] += s['duration_ms']
+            entry['input_tokens'] += s.get('input_tokens') or 0
+            entry['output_tokens'] += s.get('output_tokens') or 0
+        return totals
+
+
+EXPORTER_TYPES = {
+    'emf': EMFExporter,
+    'log': LogExporter,
+}
+
+exporters = [EXPORTER_TYPES[name.strip()]() for name in TRACE_EXPORTERS if name.strip() in EXPORTER_TYPES]
+
+
+def set_exporters(*new_exporters):
+    """Replace the active exporters, e.g. set_exporters(MemoryCollector())."""
+    exporters[:] = new_exporters
+
+
+def export(current):
+    span_data = current.as_dict()
+    for exporter in list(exporters):
+        try:
+            exporter.export(span_data)
+        except Exception as e:
+            # Instrumentation must never fail the request
+            logger.error(f"Error exporting span {current.name}: {e}")
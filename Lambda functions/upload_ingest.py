@@ -0,0 +1,100 @@
+"""S3-triggered ingestion of scripts uploaded straight to the bucket.
+
+POST .../uploads (Master_function) creates a job in `awaiting_upload` and
+returns a presigned PUT URL for uploads/<job_id>.fdx. This handler runs on
+that object's ObjectCreated event (notification filtered to the uploads/
+prefix). It attaches the upload to its job and queues the job's parse
+stage. job_worker reads the object once, feeding the parser and computing
+the content hash in the same pass, so parsing gets the job queue's retries
+and dead-letter handling. Script bytes never pass through API Gateway or a
+Lambda payload.
+
+S3 may deliver an event more than once. Only the delivery whose conditional
+write moves the job out of `awaiting_upload` (JobStore.claim) queues it. If
+that delivery stopped before queueing, a later delivery queues the stage
+once the claim is older than UPLOAD_CLAIM_LEASE_SECONDS.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+from aws_clients import lazy_client
+from jobs import build_job_queue, build_job_store, now
+from storage import UPLOAD_PREFIX, s3_event_objects
+import tracing
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Configuration constants
+BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'storyfyscripts')
+# A claimed job whose parse stage was never queued is queued by a delivery arriving this long after the claim
+UPLOAD_CLAIM_LEASE_SECONDS = float(os.getenv('UPLOAD_CLAIM_LEASE_SECONDS', '60'))
+
+s3_client = lazy_client('s3')
+job_store = build_job_store(s3_client=s3_client)
+job_queue = build_job_queue(sqs_client=lazy_client('sqs'))
+
+def claim_expired(job):
+    """True if the job was claimed for ingestion more than UPLOAD_CLAIM_LEASE_SECONDS ago."""
+    claimed_at = job.get('claimed_at')
+    if not claimed_at:
+        return False
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(claimed_at)
+    return age.total_seconds() > UPLOAD_CLAIM_LEASE_SECONDS
+
+def queue_parse(job_id):
+    job_queue.send({'job_id': job_id, 'stage': 'parse'})
+    job_store.update(job_id, parse_queued=True)
+
+def ingest_upload(bucket, key, size=None):
+    """Attach one uploaded object to its job and queue the job's parse stage. Returns the outcome."""
+    if bucket != BUCKET_NAME or not key.startswith(UPLOAD_PREFIX):
+        logger.info(f"Ignoring {bucket}/{key}: not a direct upload")
+        return 'ignored'
+    job_id = os.path.splitext(key[len(UPLOAD_PREFIX):])[0]
+    job = job_store.get(job_id)
+    if job is None:
+        logger.error(f"Upload {key} has no job")
+        return 'unknown_job'
+
+    with tracing.bind(job.get(tracing.CORRELATION_FIELD)):
+        # S3 delivers events at least once; only the delivery that claims the job queues it
+        claimed = job_store.claim(job_id, 'awaiting_upload', 'queued', upload_key=key, upload_bytes=size,
+                                  claimed_at=now())
+        if claimed is None:
+            job = job_store.get(job_id)
+            if job['stages']['parse']['status'] == 'pending' and not job.get('parse_queued') and claim_expired(job):
+                # The claiming delivery stopped between its claim and the queue send
+                logger.warning(f"Upload for job {job_id} was claimed but never queued; queueing its parse stage")
+                queue_parse(job_id)
+                return 'requeued'
+            logger.info(f"Upload for job {job_id} already claimed")
+            return 'duplicate'
+        queue_parse(job_id)
+    return 'queued'
+
+def lambda_handler(event, context):
+    # S3 ObjectCreated trigger: one record per uploaded object
+    if 'Records' not in event:
+        logger.error("No records found in the event.")
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Invalid event format: No records found.')
+        }
+
+    try:
+        objects = s3_event_objects(event)
+    except KeyError as e:
+        logger.error(f'Error reading event details: {str(e)}')
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error reading event details: {str(e)}')
+        }
+
+    outcomes = {key: ingest_upload(bucket, key, size) for bucket, key, size in objects}
+    return {
+        'statusCode': 200,
+        'body': json.dumps(outcomes)
+    }
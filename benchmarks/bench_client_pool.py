@@ -0,0 +1,69 @@
+"""Measure per-call client setup cost: fresh boto3 clients vs the shared pool.
+
+Usage: python benchmarks/bench_client_pool.py [--calls 50] [--live-bucket NAME]
+
+Without --live-bucket only client construction is timed (credential
+resolution, endpoint and service-model setup), which runs offline. With
+--live-bucket each call also issues head_bucket, so the fresh-client
+column includes a new TLS handshake per call while the pooled column
+reuses open connections.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Lambda functions'))
+
+import boto3  # noqa: E402
+import botocore.config  # noqa: E402
+
+from aws_clients import get_client, clear_clients  # noqa: E402
+
+SERVICES = [('bedrock-runtime', 'eu-west-2'), ('s3', 'eu-west-2'), ('lambda', 'eu-west-2')]
+
+
+def fresh(service, region, bucket):
+    client = boto3.client(service, region_name=region, config=botocore.config.Config(read_timeout=300))
+    if bucket:
+        client.head_bucket(Bucket=bucket)
+
+
+def pooled(service, region, bucket):
+    client = get_client(service, region, read_timeout=300)
+    if bucket:
+        client.head_bucket(Bucket=bucket)
+
+
+def run(fn, service, region, calls, bucket):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        fn(service, region, bucket)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--live-bucket', help='S3 bucket to head_bucket on every call')
+    args = parser.parse_args()
+
+    # Construction needs some credentials to resolve; dummy ones are enough offline
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+    services = [('s3', 'eu-west-2')] if args.live_bucket else SERVICES
+    print(f"{'service':<18}{'fresh p50 ms':>14}{'pooled p50 ms':>15}{'saved/call ms':>15}")
+    for service, region in services:
+        clear_clients()
+        fresh_p50, _ = run(fresh, service, region, args.calls, args.live_bucket)
+        pooled_p50, _ = run(pooled, service, region, args.calls, args.live_bucket)
+        print(f"{service:<18}{fresh_p50:>14.2f}{pooled_p50:>15.3f}{fresh_p50 - pooled_p50:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
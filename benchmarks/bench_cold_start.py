@@ -0,0 +1,117 @@
+"""Cold-start cost of each Lambda handler: import time, client init time and modules loaded.
+
+Usage: python benchmarks/bench_cold_start.py [--runs 5] [--budget-ms 100] [--json] [handler ...]
+
+Every run starts a fresh interpreter, as a cold Lambda sandbox does, and
+measures:
+
+- import: `import <handler>` (module-level code included)
+- clients: creating every lazy_client the module holds (directly or via
+  its job store, cache or artifact store), which is the boto3 import plus
+  client construction; nothing is sent over the network
+- modules: sys.modules after import, and whether boto3 was already loaded
+
+Master_function also reports its rejected-upload path (a 400 before any AWS
+call). That path should not load boto3 at all.
+
+With --budget-ms the script exits non-zero if any handler's median import
+time exceeds the budget, so it can guard against import-time regressions
+in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT, 'Lambda functions')
+sys.path.insert(0, ROOT)
+
+from package_functions import HANDLERS  # noqa: E402
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {handler} as handler
+imported = time.perf_counter()
+result = {{'import_ms': (imported - started) * 1000, 'modules': len(sys.modules),
+           'boto3_at_import': 'boto3' in sys.modules}}
+if {handler!r} == 'Master_function':
+    started = time.perf_counter()
+    response = handler.lambda_handler({{}}, None)
+    result.update(reject_ms=(time.perf_counter() - started) * 1000, reject_status=response['statusCode'],
+                  boto3_after_reject='boto3' in sys.modules)
+from aws_clients import LazyClient
+def lazy_clients(value, depth=2):
+    # Clients held directly or by module-level stores, caches and queues
+    if isinstance(value, LazyClient):
+        yield value
+    elif depth and isinstance(value, (list, tuple)):
+        for item in value:
+            yield from lazy_clients(item, depth - 1)
+    elif depth and hasattr(value, '__dict__') and not isinstance(value, type) and type(value).__module__ != 'builtins':
+        for item in vars(value).values():
+            yield from lazy_clients(item, depth - 1)
+started = time.perf_counter()
+for value in list(vars(handler).values()):
+    if not isinstance(value, type(sys)):
+        for client in lazy_clients(value):
+            client.resolve()
+result['clients_ms'] = (time.perf_counter() - started) * 1000
+print(json.dumps(result))
+"""
+
+
+def probe(handler):
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'eu-west-2'),
+               TRACE_EXPORTERS='none', AWS_LOCAL_ROOT='', AWS_EAGER_CLIENTS='false')
+    output = subprocess.run([sys.executable, '-c', PROBE.format(handler=handler)], cwd=LAMBDA_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarise(handler, samples):
+    summary = {'handler': handler, 'runs': len(samples)}
+    for field in ('import_ms', 'clients_ms', 'reject_ms'):
+        if field in samples[0]:
+            summary[field] = statistics.median(sample[field] for sample in samples)
+    for field in ('modules', 'boto3_at_import', 'reject_status', 'boto3_after_reject'):
+        if field in samples[0]:
+            summary[field] = samples[0][field]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('handlers', nargs='*', default=HANDLERS)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, help='fail if a median import exceeds this')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    # One throwaway run so .pyc files exist, as they do in a deployed package
+    probe(args.handlers[0])
+    report = [summarise(handler, [probe(handler) for _ in range(args.runs)]) for handler in args.handlers]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'handler':<22}{'import ms':>10}{'clients ms':>12}{'modules':>9}  boto3 at import")
+        for row in report:
+            print(f"{row['handler']:<22}{row['import_ms']:>10.1f}{row['clients_ms']:>12.1f}{row['modules']:>9}"
+                  f"  {'yes' if row['boto3_at_import'] else 'no'}")
+            if 'reject_ms' in row:
+                print(f"{'  400 path':<22}{row['reject_ms']:>10.1f}{'':>12}{'':>9}"
+                      f"  {'yes' if row['boto3_after_reject'] else 'no'} after the rejected upload")
+
+    over = [row['handler'] for row in report if args.budget_ms is not None and row['import_ms'] > args.budget_ms]
+    if over:
+        print(f"Import budget of {args.budget_ms:.0f} ms exceeded by: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Compare the streaming FDX parser against the original ET.fromstring path.
+
+Usage: python benchmarks/bench_fdx_parser.py [--inflate 100] [--repeat 3]
+
+Reports wall time and peak Python heap (tracemalloc) on sample_script.fdx
+and on a synthetic draft whose <Content> body is repeated N times.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Lambda functions'))
+
+from fdx_parser import parse_fdx  # noqa: E402
+import tracing  # noqa: E402
+
+SAMPLE = os.path.join(ROOT, 'sample_script.fdx')
+
+
+def legacy_parse(path):
+    """The pre-streaming pipeline: read everything, fromstring, recurse."""
+    def collect_script_content(element, level=0):
+        content = []
+        text = (element.text or '').strip()
+        if text:
+            content.append(f"{'  ' * level}{text}")
+        for child in element:
+            content.extend(collect_script_content(child, level + 1))
+        return content
+
+    with open(path, 'rb') as f:
+        file_content = f.read()
+    root = ET.fromstring(file_content.decode('utf-8'))
+    return collect_script_content(root)
+
+
+def streaming_parse(path):
+    with open(path, 'rb') as f:
+        return parse_fdx(f)
+
+
+def inflate(path, factor):
+    """Write a copy of `path` with the script body repeated `factor` times."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    start = text.index('<Content>') + len('<Content>')
+    end = text.index('</Content>')
+    body = text[start:end]
+    out = tempfile.NamedTemporaryFile('w', suffix='.fdx', delete=False, encoding='utf-8')
+    with out:
+        out.write(text[:start])
+        for _ in range(factor):
+            out.write(body)
+        out.write(text[end:])
+    return out.name
+
+
+def measure(fn, path, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(path)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inflate', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    # parse_fdx records xml_parse spans; keep them out of the report
+    tracing.set_exporters()
+
+    inflated = inflate(SAMPLE, args.inflate)
+    try:
+        cases = [('sample_script.fdx', SAMPLE), (f'sample x{args.inflate}', inflated)]
+        print(f"{'input':<20}{'size':>10}  {'parser':<10}{'time (s)':>10}{'peak MiB':>10}")
+        for label, path in cases:
+            size_mib = os.path.getsize(path) / 2 ** 20
+            for name, fn in (('legacy', legacy_parse), ('streaming', streaming_parse)):
+                seconds, peak = measure(fn, path, args.repeat)
+                print(f"{label:<20}{size_mib:>8.1f}MB  {name:<10}{seconds:>10.3f}{peak / 2 ** 20:>10.1f}")
+    finally:
+        os.unlink(inflated)
+
+
+if __name__ == '__main__':
+    main()
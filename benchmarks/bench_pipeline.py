@@ -0,0 +1,184 @@
+"""End-to-end latency benchmark over the local Bedrock/S3/Lambda/SQS stand-ins.
+
+Usage: python benchmarks/bench_pipeline.py [--runs 5] [--concurrency 1,4,8]
+                                           [--sizes 1,5,20] [--latency 0.05]
+                                           [--throttle-rate 0.0] [--quota-scale 100]
+                                           [--json]
+
+Drives sample_script.fdx through every handler exactly as deployed:
+Master_function (upload, 202) -> job_worker parse stage -> job_worker
+evaluate stage -> script_evaluator Lambda -> call_bedrock Lambda -> fake
+Bedrock. Each run uses unique script content so caches and stored
+artifacts never short-circuit the work. Reports p50/p95 per stage,
+throughput under N concurrent scripts and how latency scales with script
+size. Nothing here touches AWS.
+
+The client-side rate limiter is scaled by --quota-scale (default 100x the
+deployed quotas) so the numbers show pipeline overhead; pass
+--quota-scale 1 to see the throughput the production quotas allow.
+"""
+import argparse
+import base64
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT, 'Lambda functions')
+SAMPLE = os.path.join(ROOT, 'sample_script.fdx')
+
+timings = {}
+timings_lock = threading.Lock()
+
+
+def record(stage, seconds):
+    with timings_lock:
+        timings.setdefault(stage, []).append(seconds)
+
+
+def timed(stage, fn):
+    """Wrap fn so every call is recorded under `stage`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(stage, time.perf_counter() - started)
+    return wrapper
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def setup(args, storage_root):
+    os.environ.update({
+        'AWS_DEFAULT_REGION': 'eu-west-2',
+        'JOB_STORE_BACKEND': 's3',
+        'JOB_QUEUE_BACKEND': 'sqs',
+        'BEDROCK_CACHE_BACKENDS': 'memory',
+    })
+    sys.path.insert(0, LAMBDA_DIR)
+    # Stages are timed here; span export would mix with the report on stdout
+    import tracing
+    tracing.set_exporters()
+    import rate_limiter
+    rate_limiter.MODEL_QUOTAS.update({
+        model_id: {'rpm': quota['rpm'] * args.quota_scale, 'tpm': quota['tpm'] * args.quota_scale}
+        for model_id, quota in rate_limiter.MODEL_QUOTAS.items()
+    })
+    import local_backends
+    bedrock = local_backends.FakeBedrockClient(latency=args.latency, output_token_delay=args.token_delay,
+                                               throttle_rate=args.throttle_rate, seed=1)
+    local_backends.install(storage_root, bedrock=bedrock)
+
+    import Master_function
+    import job_worker
+    import call_bedrock
+    import script_evaluator
+
+    job_worker.run_parse = timed('parse', job_worker.run_parse)
+    job_worker.STAGE_HANDLERS['parse'] = job_worker.run_parse
+    job_worker.STAGE_HANDLERS['evaluate'] = timed('evaluate', job_worker.STAGE_HANDLERS['evaluate'])
+    call_bedrock.call_model = timed('bedrock_call', call_bedrock.call_model)
+    script_evaluator.evaluate_dimensions = timed('evaluator_fan_out', script_evaluator.evaluate_dimensions)
+    return bedrock, Master_function, job_worker
+
+
+def make_script(factor):
+    """Sample script with its body repeated `factor` times and a unique marker."""
+    with open(SAMPLE, encoding='utf-8') as f:
+        text = f.read()
+    start = text.index('<Content>') + len('<Content>')
+    end = text.index('</Content>')
+    # A unique paragraph changes every prompt, so the response cache never hits
+    marker = f'<Paragraph Type="Action"><Text>Take {uuid.uuid4().hex}.</Text></Paragraph>'
+    return (text[:start] + marker + text[start:end] * factor + text[end:]).encode('utf-8')
+
+
+def run_script(master, worker, content):
+    """Submit one script and process its stages until the job finishes."""
+    started = time.perf_counter()
+    response = timed('upload', master.lambda_handler)({'body': base64.b64encode(content).decode()}, None)
+    job_id = json.loads(response['body'])['job_id']
+    while True:
+        worker.drain_queue()
+        job = worker.job_store.get(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    record('end_to_end', elapsed)
+    return job['status'], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='sequential runs for per-stage percentiles')
+    parser.add_argument('--concurrency', default='1,4,8', help='concurrent scripts for the throughput test')
+    parser.add_argument('--sizes', default='1,5,20', help='script size multipliers for the scaling test')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Bedrock base latency (s)')
+    parser.add_argument('--token-delay', type=float, default=0.0005, help='fake Bedrock delay per output token (s)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of Bedrock calls throttled')
+    parser.add_argument('--quota-scale', type=float, default=100, help='multiplier on the rate limiter quotas')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as storage_root:
+        bedrock, master, worker = setup(args, storage_root)
+
+        for _ in range(args.runs):
+            run_script(master, worker, make_script(1))
+        report['stages'] = {
+            stage: {'count': len(samples), 'p50_ms': percentile(samples, 50) * 1000,
+                    'p95_ms': percentile(samples, 95) * 1000}
+            for stage, samples in sorted(timings.items())
+        }
+
+        report['throughput'] = []
+        for concurrency in [int(n) for n in args.concurrency.split(',')]:
+            scripts = [make_script(1) for _ in range(concurrency * 2)]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(lambda content: run_script(master, worker, content), scripts))
+            elapsed = time.perf_counter() - started
+            report['throughput'].append({'concurrency': concurrency, 'scripts': len(scripts),
+                                         'scripts_per_s': len(scripts) / elapsed})
+
+        report['scaling'] = []
+        for factor in [int(n) for n in args.sizes.split(',')]:
+            content = make_script(factor)
+            calls_before = bedrock.calls
+            status, elapsed = run_script(master, worker, content)
+            report['scaling'].append({'size_x': factor, 'kib': len(content) // 1024, 'status': status,
+                                      'seconds': elapsed, 'bedrock_calls': bedrock.calls - calls_before})
+        report['bedrock'] = {'calls': bedrock.calls, 'throttled': bedrock.throttled}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'stage':<20}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, row in report['stages'].items():
+        print(f"{stage:<20}{row['count']:>6}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}")
+    print(f"\n{'concurrency':<14}{'scripts':>8}{'scripts/s':>11}")
+    for row in report['throughput']:
+        print(f"{row['concurrency']:<14}{row['scripts']:>8}{row['scripts_per_s']:>11.2f}")
+    print(f"\n{'size':<8}{'KiB':>8}{'seconds':>10}{'calls':>8}  status")
+    for row in report['scaling']:
+        print(f"{str(row['size_x']) + 'x':<8}{row['kib']:>8}{row['seconds']:>10.2f}{row['bedrock_calls']:>8}  {row['status']}")
+    print(f"\nBedrock calls: {report['bedrock']['calls']}, throttled: {report['bedrock']['throttled']}")
+
+
+if __name__ == '__main__':
+    main()
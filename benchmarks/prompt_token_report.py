@@ -0,0 +1,103 @@
+"""Input-token report for the evaluator prompts built from sample_script.fdx.
+
+Usage: python benchmarks/prompt_token_report.py [--script sample_script.fdx] [--json]
+
+Compares three encodings of the same script:
+
+- legacy: the original str() of collect_script_content's indented text
+  list, script notes and all
+- json: the scene model as JSON ({"scenes": [{"heading", "elements"}]})
+- compact: chunking.render_scenes, plain screenplay text
+
+For each encoding it shows the script's size and the total input tokens
+of the five dimension prompts. It also shows how much of those prompts is
+a prefix shared by all five dimensions. With the script placed after the
+instructions, as before, almost nothing is shared. With the script first,
+the whole script is shared and can be served from a prompt cache.
+Counts use chunking.estimate_tokens, the same estimate the router uses.
+"""
+import argparse
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT, 'Lambda functions')
+SAMPLE = os.path.join(ROOT, 'sample_script.fdx')
+
+
+def legacy_encoding(path):
+    """The original prompt data: str() of the indented text of every element."""
+    def collect_script_content(element, level=0):
+        content = []
+        text = (element.text or '').strip()
+        if text:
+            content.append(f"{'  ' * level}{text}")
+        for child in element:
+            content.extend(collect_script_content(child, level + 1))
+        return content
+
+    return str(collect_script_content(ET.parse(path).getroot()))
+
+
+def shared_prefix_tokens(prompts, estimate_tokens):
+    return estimate_tokens(os.path.commonprefix(prompts)) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default=SAMPLE)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+    sys.path.insert(0, LAMBDA_DIR)
+    import tracing
+    tracing.set_exporters()
+    from chunking import SCRIPT_END, estimate_tokens, render_scenes
+    from fdx_parser import parse_fdx
+    from script_evaluator import DIMENSIONS
+
+    scenes = parse_fdx(args.script)
+    encodings = {
+        'legacy': legacy_encoding(args.script),
+        'json': json.dumps({'scenes': scenes}, ensure_ascii=False),
+        'compact': render_scenes(scenes),
+    }
+    # Each dimension's instructions, without the script section
+    instructions = [build_prompt('').split(SCRIPT_END, 1)[1].lstrip() for _, build_prompt in DIMENSIONS]
+
+    report = []
+    for name, data in encodings.items():
+        script_first = [build_prompt(data) for _, build_prompt in DIMENSIONS]
+        script_last = [f"{text}\n\n{data}" for text in instructions]
+        report.append({
+            'encoding': name,
+            'script_chars': len(data),
+            'script_tokens': estimate_tokens(data),
+            'prompt_tokens': sum(estimate_tokens(prompt) for prompt in script_first),
+            'shared_prefix_script_last': shared_prefix_tokens(script_last, estimate_tokens),
+            'shared_prefix_script_first': shared_prefix_tokens(script_first, estimate_tokens),
+        })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    baseline = report[0]['prompt_tokens']
+    print(f"{len(DIMENSIONS)} dimension prompts for {os.path.basename(args.script)} ({len(scenes)} scenes)\n")
+    print(f"{'encoding':<10}{'chars':>9}{'script tok':>12}{'prompt tok':>12}{'saved':>8}"
+          f"{'prefix (old)':>14}{'prefix (new)':>14}")
+    for row in report:
+        saved = 1 - row['prompt_tokens'] / baseline
+        print(f"{row['encoding']:<10}{row['script_chars']:>9}{row['script_tokens']:>12}{row['prompt_tokens']:>12}"
+              f"{saved:>8.0%}{row['shared_prefix_script_last']:>14}{row['shared_prefix_script_first']:>14}")
+    compact = report[-1]
+    uncached = compact['prompt_tokens'] - (len(DIMENSIONS) - 1) * compact['shared_prefix_script_first']
+    print(f"\nWith a prompt cache, the compact prompts send ~{uncached} uncached tokens "
+          f"({1 - uncached / baseline:.0%} fewer than legacy).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Build one deployment package per Lambda handler, holding only the modules it imports.
+
+Usage: python package_functions.py [--out build] [--list] [function ...]
+
+All handlers share the flat "Lambda functions/" directory. Zipping the
+whole directory for each function would make every cold start ship (and
+let it import) modules it never uses. This script follows each handler's
+imports through the directory, including imports made inside functions,
+because those still run on some path. It writes <out>/<handler>.zip with
+that closure only. boto3/botocore come from the Lambda runtime and are not
+bundled, except for handlers listed in BUNDLED_REQUIREMENTS, which get a
+pinned copy installed into their zip with pip. local_backends, the offline
+stand-in for AWS, is left out. Deploy each zip with Handler:
+<handler>.lambda_handler.
+
+--list prints each closure without building anything.
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(ROOT, 'Lambda functions')
+
+# Modules with a lambda_handler, one Lambda function each
+HANDLERS = ['Master_function', 'job_worker', 'job_status', 'script_evaluator', 'call_bedrock',
+            'annotate_script_llm', 'batch_ingest', 'upload_ingest']
+
+# Only imported for local runs (AWS_LOCAL_ROOT)
+DEV_ONLY = {'local_backends'}
+
+# pip requirements installed into a handler's zip. upload_ingest claims jobs with an If-Match
+# PutObject (jobs.S3JobStore.claim), which needs a newer botocore than the runtime may provide.
+BUNDLED_REQUIREMENTS = {
+    'upload_ingest': ['boto3>=1.36,<2'],
+}
+
+
+def local_modules():
+    return {name[:-3] for name in os.listdir(LAMBDA_DIR) if name.endswith('.py')}
+
+
+def imported_names(module):
+    """Top-level module names imported anywhere in a module."""
+    with open(os.path.join(LAMBDA_DIR, f"{module}.py"), encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=f"{module}.py")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            yield node.module.split('.')[0]
+
+
+def import_closure(handler, available=None):
+    """Local modules a handler can import, itself included, in discovery order."""
+    available = available if available is not None else local_modules()
+    closure, pending = [], [handler]
+    while pending:
+        module = pending.pop()
+        if module in closure:
+            continue
+        closure.append(module)
+        pending.extend(name for name in imported_names(module)
+                       if name in available and name not in DEV_ONLY and name not in closure)
+    return closure
+
+
+def add_requirements(archive, requirements):
+    """pip install requirements into a scratch directory and add everything it wrote to the archive."""
+    with tempfile.TemporaryDirectory() as target:
+        subprocess.run([sys.executable, '-m', 'pip', 'install', '--quiet', '--no-compile', '--target', target,
+                        *requirements], check=True)
+        for directory, _, files in os.walk(target):
+            for name in files:
+                path = os.path.join(directory, name)
+                archive.write(path, os.path.relpath(path, target))
+
+
+def build(handler, out_dir, available):
+    modules = sorted(import_closure(handler, available))
+    path = os.path.join(out_dir, f"{handler}.zip")
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for module in modules:
+            archive.write(os.path.join(LAMBDA_DIR, f"{module}.py"), f"{module}.py")
+        if handler in BUNDLED_REQUIREMENTS:
+            add_requirements(archive, BUNDLED_REQUIREMENTS[handler])
+    return modules, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('functions', nargs='*', default=HANDLERS)
+    parser.add_argument('--out', default=os.path.join(ROOT, 'build'))
+    parser.add_argument('--list', action='store_true', help='print each import closure without building')
+    args = parser.parse_args()
+
+    available = local_modules()
+    unknown = [name for name in args.functions if name not in available]
+    if unknown:
+        parser.error(f"unknown handler module(s): {', '.join(unknown)}")
+    if not args.list:
+        os.makedirs(args.out, exist_ok=True)
+
+    for handler in args.functions:
+        if args.list:
+            modules = sorted(import_closure(handler, available))
+            bundled = f" + {', '.join(BUNDLED_REQUIREMENTS[handler])}" if handler in BUNDLED_REQUIREMENTS else ''
+            print(f"{handler} ({len(modules)}/{len(available)} modules): {', '.join(modules)}{bundled}")
+            continue
+        modules, size = build(handler, args.out, available)
+        print(f"{handler + '.zip':<26}{len(modules):>3} modules {size / 1024:>7.1f} KiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
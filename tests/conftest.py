@@ -0,0 +1,43 @@
+"""Shared test setup: the handlers live as flat modules in "Lambda functions/".
+
+Environment defaults are set before any of those modules is imported, so
+module-level configuration (cache tiers, job backends) is local and quiet.
+"""
+import os
+import sys
+
+import pytest
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Lambda functions')
+sys.path.insert(0, LAMBDA_DIR)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+os.environ.setdefault('BEDROCK_CACHE_BACKENDS', '')
+os.environ.setdefault('JOB_STORE_BACKEND', 's3')
+os.environ.setdefault('JOB_QUEUE_BACKEND', 'sqs')
+
+import aws_clients  # noqa: E402
+import local_backends  # noqa: E402
+import tracing  # noqa: E402
+
+SAMPLE_SCRIPT = os.path.join(os.path.dirname(LAMBDA_DIR), 'sample_script.fdx')
+
+# Spans go to CloudWatch-style stdout by default; tests do not need them
+tracing.set_exporters()
+
+
+@pytest.fixture
+def local_aws(tmp_path):
+    """Route every AWS client to local_backends for one test; returns the stand-in clients by service."""
+    bedrock = local_backends.FakeBedrockClient(latency=0, input_token_delay=0, output_token_delay=0,
+                                               output_tokens=60)
+    clients = local_backends.install(str(tmp_path), bedrock=bedrock)
+    yield clients
+    aws_clients.clear_backends()
+
+
+@pytest.fixture
+def sample_scenes():
+    from fdx_parser import parse_fdx
+    with open(SAMPLE_SCRIPT, 'rb') as f:
+        return parse_fdx(f)
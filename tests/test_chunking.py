@@ -0,0 +1,72 @@
+import pytest
+
+from chunking import chunk_budget, estimate_tokens, render_scenes, scene_outline
+from model_router import MODEL_CATALOG, route
+from script_evaluator import plan_tasks
+
+
+def long_script(scenes, copies=10):
+    """The sample repeated `copies` times, with headings numbered so every scene is distinct."""
+    return [dict(scene, heading=f"{scene['heading'] or 'OPENING'} ({copy})")
+            for copy in range(copies) for scene in scenes]
+
+
+def huge_scene(tag, paragraphs=250):
+    """One scene larger than any model's context (~250,000 tokens); paragraphs are numbered "<tag>-<n>"."""
+    return {'heading': f"INT. {tag} - NIGHT",
+            'elements': [{'type': 'Action', 'text': f"{tag}-{index} " + 'word ' * 800} for index in range(paragraphs)]}
+
+
+def assert_tasks_fit(tasks):
+    for task in tasks:
+        model = task['models'][0]
+        assert estimate_tokens(task['prompt']) + task['max_tokens'] <= MODEL_CATALOG[model]['context_tokens'], \
+            (task['function_name'], model)
+        # The router accepts the prompt as planned
+        assert route(task['function_name'], task['prompt'], task['models'], task['max_tokens'])
+
+
+def test_short_script_is_one_prompt_per_dimension_and_model(sample_scenes):
+    tasks, plans = plan_tasks({'scenes': sample_scenes})
+    assert all(len(indexes) == 1 for indexes in plans.values())
+    assert_tasks_fit(tasks)
+
+
+@pytest.mark.parametrize('project_id', [None, 'project-1'])
+def test_long_script_chunks_fit_each_models_context(sample_scenes, project_id):
+    scenes = long_script(sample_scenes)
+    tasks, plans = plan_tasks({'scenes': scenes, 'project_id': project_id})
+    # The smaller context has to be split; every chunk still fits with its response budget
+    assert any(len(indexes) > 1 for (_, model), indexes in plans.items() if model == 'mistral')
+    assert_tasks_fit(tasks)
+
+
+@pytest.mark.parametrize('project_id', [None, 'project-1'])
+def test_scenes_larger_than_the_context_are_split(sample_scenes, project_id):
+    scenes = sample_scenes[:5] + [huge_scene('ARCHIVE')] + sample_scenes[5:] + [huge_scene('VAULT')]
+    tasks, plans = plan_tasks({'scenes': scenes, 'project_id': project_id})
+    assert all(len(indexes) > 1 for indexes in plans.values())
+    assert_tasks_fit(tasks)
+    # Every paragraph of the split scenes is evaluated
+    for indexes in plans.values():
+        text = ''.join(tasks[index]['prompt'] for index in indexes)
+        assert all(f"{tag}-{index} " in text for tag in ('ARCHIVE', 'VAULT') for index in range(250))
+
+
+def test_chunk_budget_leaves_room_for_overhead_and_response():
+    base = chunk_budget('mistral', 0, 0)
+    assert base < MODEL_CATALOG['mistral']['context_tokens']
+    assert chunk_budget('mistral', 3000, 0) == base - 3000
+    assert chunk_budget('mistral', 3000, 1500) == base - 4500
+    assert chunk_budget('claude', 3000, 1500) > chunk_budget('mistral', 3000, 1500)
+
+
+def test_outline_is_thinned_to_its_token_cap(sample_scenes):
+    scenes = long_script(sample_scenes, copies=40)
+    outline = scene_outline(scenes, max_tokens=500)
+    assert estimate_tokens(outline) <= 500
+    assert outline.startswith('1. ')
+    assert f"of {len(scenes)} scenes listed" in outline
+    # A short script lists every scene
+    assert scene_outline(sample_scenes).count('\n') == len(sample_scenes) - 1
+    assert estimate_tokens(render_scenes(sample_scenes)) < chunk_budget('mistral')
@@ -0,0 +1,102 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from jobs import S3JobStore, SQLiteJobStore, new_job
+from local_backends import LocalS3Client
+
+
+@pytest.fixture(params=['sqlite', 's3'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteJobStore(':memory:')
+    return S3JobStore(LocalS3Client(str(tmp_path)), bucket='jobs-bucket')
+
+
+def test_first_claim_wins(store):
+    job = store.create(new_job(status='awaiting_upload'))
+    claimed = store.claim(job['job_id'], 'awaiting_upload', 'queued', upload_key='uploads/a.fdx')
+    assert claimed['status'] == 'queued'
+    assert claimed['upload_key'] == 'uploads/a.fdx'
+    assert store.get(job['job_id']) == claimed
+
+    assert store.claim(job['job_id'], 'awaiting_upload', 'queued', upload_key='uploads/b.fdx') is None
+    assert store.get(job['job_id'])['upload_key'] == 'uploads/a.fdx'
+
+
+def test_missing_job_is_not_claimed(store):
+    assert store.claim('no-such-job', 'awaiting_upload', 'queued') is None
+
+
+def test_concurrent_claims_have_one_winner(store):
+    job = store.create(new_job(status='awaiting_upload'))
+    start, winners = threading.Barrier(8), []
+
+    def claim(worker):
+        start.wait()
+        if store.claim(job['job_id'], 'awaiting_upload', 'queued', worker=worker):
+            winners.append(worker)
+
+    threads = [threading.Thread(target=claim, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(winners) == 1
+    assert store.get(job['job_id'])['worker'] == winners[0]
+
+
+class InterleavingS3Client:
+    """LocalS3Client whose first read is followed by another writer's update of the same object."""
+
+    def __init__(self, client, write):
+        self.client, self.write = client, write
+
+    def get_object(self, **kwargs):
+        response = self.client.get_object(**kwargs)
+        write, self.write = self.write, None
+        if write:
+            write()
+        return response
+
+    def put_object(self, **kwargs):
+        return self.client.put_object(**kwargs)
+
+
+def test_s3_claim_loses_to_a_write_after_its_read(tmp_path):
+    client = LocalS3Client(str(tmp_path))
+    other = S3JobStore(client, bucket='jobs-bucket')
+    job = other.create(new_job(status='awaiting_upload'))
+    store = S3JobStore(InterleavingS3Client(client, lambda: other.update(job['job_id'], note='edited')),
+                       bucket='jobs-bucket')
+
+    assert store.claim(job['job_id'], 'awaiting_upload', 'queued') is None
+    current = other.get(job['job_id'])
+    assert current['status'] == 'awaiting_upload'
+    assert current['note'] == 'edited'
+
+
+def test_sqlite_claim_loses_to_a_claim_after_its_read(monkeypatch):
+    store = SQLiteJobStore(':memory:')
+    job = store.create(new_job(status='awaiting_upload'))
+    stale = store.load(job['job_id'])
+    store.claim(job['job_id'], 'awaiting_upload', 'queued', worker='other')
+    monkeypatch.setattr(store, 'load', lambda job_id: dict(stale))
+
+    assert store.claim(job['job_id'], 'awaiting_upload', 'queued', worker='late') is None
+    monkeypatch.undo()
+    assert store.get(job['job_id'])['worker'] == 'other'
+
+
+def test_s3_claim_refuses_a_client_without_if_match(tmp_path):
+    # What an S3 client from a botocore release before conditional writes looks like
+    put_object = SimpleNamespace(input_shape=SimpleNamespace(members={'Bucket': None, 'Key': None, 'Body': None}))
+    client = LocalS3Client(str(tmp_path))
+    client.meta = SimpleNamespace(service_model=SimpleNamespace(operation_model=lambda name: put_object))
+    store = S3JobStore(client, bucket='jobs-bucket')
+    job = store.create(new_job(status='awaiting_upload'))
+
+    with pytest.raises(RuntimeError, match='IfMatch'):
+        store.claim(job['job_id'], 'awaiting_upload', 'queued')
+    assert store.get(job['job_id'])['status'] == 'awaiting_upload'
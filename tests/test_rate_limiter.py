@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import MIN_RATE_SCALE, ModelRateLimiter
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'THROTTLE_BACKOFF_BASE', 0.2)
+    monkeypatch.setattr(rate_limiter, 'THROTTLE_BACKOFF_MAX', 1.0)
+    return ModelRateLimiter(rpm=600, tpm=1000000)
+
+
+def test_throttle_halves_the_rate_and_blocks_for_a_jittered_backoff(limiter):
+    backoff = limiter.on_throttle()
+    assert limiter.scale == 0.5
+    assert 0.1 <= backoff <= 0.2
+    assert 0 < limiter.ready_in(1) <= backoff
+
+
+def test_consecutive_throttles_back_off_exponentially_up_to_the_cap(limiter):
+    backoffs = [limiter.on_throttle() for _ in range(5)]
+    # Each backoff is drawn from [half, all] of 0.2 * 2^(n-1), capped at 1.0
+    for n, backoff in enumerate(backoffs, start=1):
+        bound = min(1.0, 0.2 * 2 ** (n - 1))
+        assert bound / 2 <= backoff <= bound
+    assert limiter.scale == MIN_RATE_SCALE
+
+
+def test_success_restores_the_rate_additively(limiter):
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.scale == 0.25
+    limiter.on_success()
+    assert limiter.scale == pytest.approx(0.35)
+    assert limiter.consecutive_throttles == 0
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.scale == 1.0
+    # The backoff sequence starts over after a success
+    assert limiter.on_throttle() <= 0.2
+
+
+def test_acquire_waits_for_the_request_bucket_at_the_reduced_rate(limiter):
+    # 600 requests a minute refill one request every 0.1 s; half the rate takes 0.2 s
+    limiter.requests.tokens = 0
+    limiter.scale = 0.5
+    assert limiter.ready_in(1) == pytest.approx(0.2, abs=0.02)
+    started = time.monotonic()
+    waited = limiter.acquire(1)
+    assert 0.15 <= waited <= time.monotonic() - started + 0.01
+
+
+def test_token_bucket_limits_large_requests(limiter):
+    limiter.tokens.tokens = 1000
+    assert limiter.ready_in(500) == 0
+    # 1,000,000 tokens a minute refill 4,000 tokens in 0.24 s
+    assert limiter.ready_in(5000) == pytest.approx(0.24, abs=0.02)
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+import resilience
+from local_backends import client_error
+from resilience import AttemptCancelled, CallFailed, call_with_resilience, classify
+from streaming import StreamError
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Breakers and latency samples are module-wide; every test starts without them and without backoff."""
+    resilience._breakers.clear()
+    resilience._latencies.clear()
+    monkeypatch.setattr(resilience, 'backoff', lambda kind, attempt: 0.0)
+
+
+def throttled():
+    return client_error('ThrottlingException', 'Rate exceeded', 'InvokeModel', 429)
+
+
+def unavailable():
+    return client_error('ServiceUnavailableException', 'Try again', 'InvokeModel', 503)
+
+
+def invalid():
+    return client_error('ValidationException', 'Bad request', 'InvokeModel')
+
+
+def test_classify_by_error_code():
+    assert classify(throttled()) == 'throttled'
+    assert classify(invalid()) == 'fatal'
+    assert classify(unavailable()) == 'transient'
+    assert classify(TimeoutError()) == 'transient'
+    # Error events inside a response stream are classified like the ClientError they stand for
+    assert classify(StreamError('throttlingException', {'message': 'slow down'})) == 'throttled'
+    assert classify(StreamError('validationException', {'message': 'bad'})) == 'fatal'
+
+
+def test_fatal_error_is_not_retried():
+    calls = []
+
+    def attempt(region, send):
+        send()
+        calls.append(region)
+        raise invalid()
+
+    with pytest.raises(CallFailed) as failed:
+        call_with_resilience('m', ['a', 'b'], attempt, hedge=False)
+    assert calls == ['a']
+    assert failed.value.failure['error_type'] == 'fatal'
+    assert failed.value.failure['error_code'] == 'ValidationException'
+
+
+def test_transient_error_retries_in_the_next_region():
+    calls = []
+
+    def attempt(region, send):
+        send()
+        calls.append(region)
+        if region == 'a':
+            raise unavailable()
+        return 'answer'
+
+    assert call_with_resilience('m', ['a', 'b'], attempt, hedge=False) == ('b', 'answer')
+    assert calls == ['a', 'b']
+
+
+@pytest.mark.parametrize('kind, make_error', [('throttled', throttled), ('transient', unavailable)])
+def test_each_error_class_has_its_own_retry_budget(monkeypatch, kind, make_error):
+    monkeypatch.setitem(resilience.RETRY_POLICY, kind, dict(resilience.RETRY_POLICY[kind], max_retries=2))
+    # Keep the breakers closed, so only the retry budget ends the call
+    for region in ('a', 'b'):
+        resilience._breakers[('m', region)] = resilience.CircuitBreaker(failure_threshold=100)
+    calls = []
+
+    def attempt(region, send):
+        send()
+        calls.append(region)
+        raise make_error()
+
+    with pytest.raises(CallFailed) as failed:
+        call_with_resilience('m', ['a', 'b'], attempt, hedge=False)
+    assert len(calls) == 3
+    assert failed.value.failure['error_type'] == kind
+    assert failed.value.failure['attempts'] == 3
+
+
+def test_repeated_outages_open_the_regions_breaker(monkeypatch):
+    monkeypatch.setitem(resilience.RETRY_POLICY, 'transient',
+                        dict(resilience.RETRY_POLICY['transient'], max_retries=10))
+    resilience._breakers[('m', 'a')] = resilience.CircuitBreaker(failure_threshold=2)
+    calls = []
+
+    def attempt(region, send):
+        send()
+        calls.append(region)
+        raise unavailable()
+
+    with pytest.raises(CallFailed) as failed:
+        call_with_resilience('m', ['a'], attempt, hedge=False)
+    assert failed.value.failure['error_type'] == 'circuit_open'
+    assert calls == ['a', 'a']
+
+
+def test_deadline_bounds_the_whole_call():
+    def attempt(region, send):
+        send()
+        time.sleep(1.0)
+        return 'late'
+
+    started = time.monotonic()
+    with pytest.raises(CallFailed) as failed:
+        call_with_resilience('m', ['a'], attempt, hedge=False, deadline=0.2)
+    assert failed.value.failure['error_type'] == 'deadline_exceeded'
+    assert time.monotonic() - started < 0.8
+
+
+def test_slow_primary_is_hedged_to_the_next_region(monkeypatch):
+    monkeypatch.setattr(resilience, 'hedge_delay', lambda model_prefix, region: 0.1)
+
+    def attempt(region, send):
+        send()
+        time.sleep(1.0 if region == 'a' else 0.01)
+        return region
+
+    started = time.monotonic()
+    assert call_with_resilience('m', ['a', 'b'], attempt, hedge=True, deadline=5) == ('b', 'b')
+    assert time.monotonic() - started < 0.8
+
+
+def test_hedge_clock_starts_when_the_request_is_sent(monkeypatch):
+    monkeypatch.setattr(resilience, 'hedge_delay', lambda model_prefix, region: 0.2)
+    sent = []
+
+    def attempt(region, send):
+        # Waiting on the rate limiter is longer than the hedge delay, but the model itself is fast
+        time.sleep(0.4)
+        send()
+        sent.append(region)
+        time.sleep(0.05)
+        return region
+
+    assert call_with_resilience('m', ['a', 'b'], attempt, hedge=True, deadline=5) == ('a', 'a')
+    assert sent == ['a']
+
+
+def test_hedge_not_yet_sent_when_the_primary_answers_is_skipped(monkeypatch):
+    monkeypatch.setattr(resilience, 'hedge_delay', lambda model_prefix, region: 0.05)
+    sent, cancelled = [], threading.Event()
+
+    def attempt(region, send):
+        if region == 'b':
+            # The hedge is still waiting on its rate limiter when the primary answers
+            time.sleep(0.4)
+        try:
+            send()
+        except AttemptCancelled:
+            cancelled.set()
+            raise
+        sent.append(region)
+        time.sleep(0.2 if region == 'a' else 0)
+        return region
+
+    assert call_with_resilience('m', ['a', 'b'], attempt, hedge=True, deadline=5) == ('a', 'a')
+    assert cancelled.wait(2)
+    assert sent == ['a']
+    # A cancelled hedge says nothing about its region
+    assert resilience.get_breaker('m', 'b').state == 'closed'
@@ -0,0 +1,103 @@
+import copy
+
+import pytest
+
+import pipeline
+import rate_limiter
+from scene_diff import diff_fingerprints, fingerprint_scenes, is_boundary, scene_fingerprint
+from script_evaluator import plan_tasks
+
+
+@pytest.fixture
+def evaluate(local_aws, monkeypatch):
+    """Evaluate a draft of one project in process, without rate limits; returns outcomes by (dimension, model)."""
+    monkeypatch.setattr(rate_limiter, 'MODEL_QUOTAS', {})
+    monkeypatch.setattr(rate_limiter, 'FALLBACK_QUOTA', {'rpm': 100000, 'tpm': 10 ** 9})
+    rate_limiter._limiters.clear()
+
+    def run(scenes, script_hash):
+        result = pipeline.evaluate_scenes({'scenes': scenes, 'script_hash': script_hash, 'project_id': 'project-1'})
+        assert result['statusCode'] == 200, result['message']
+        return {(evaluation['function_name'], model): outcome
+                for evaluation in result['evaluations'] for model, outcome in evaluation['models'].items()}
+
+    yield run
+    rate_limiter._limiters.clear()
+
+
+@pytest.fixture
+def draft(sample_scenes):
+    """A ~90 scene draft with distinct scenes, long enough to be cut into several chunks."""
+    return [{'heading': f"{scene['heading'] or 'OPENING'} ({number})",
+             'elements': [dict(element) for element in scene['elements']]}
+            for number in range(3) for scene in sample_scenes]
+
+
+def new_scene():
+    """A scene not in the draft that does not end a chunk, so inserting it changes only its own chunk."""
+    for number in range(100):
+        scene = {'heading': f"INT. STAIRWELL - NIGHT ({number})",
+                 'elements': [{'type': 'Action', 'text': 'Henry climbs, counting the steps under his breath.'}]}
+        if not is_boundary(scene_fingerprint(scene)):
+            return scene
+
+
+def edit_dialogue(draft):
+    """Copy of the draft with one line of dialogue changed, in a scene that keeps its boundary status."""
+    edited = copy.deepcopy(draft)
+    for index, scene in enumerate(edited):
+        dialogue = [element for element in scene['elements'] if element['type'] == 'Dialogue']
+        if index < len(draft) // 2 or not dialogue:
+            continue
+        original = dialogue[0]['text']
+        dialogue[0]['text'] = original + ' I mean it.'
+        if is_boundary(scene_fingerprint(scene)) == is_boundary(scene_fingerprint(draft[index])):
+            return edited, index
+        dialogue[0]['text'] = original
+    raise AssertionError('no editable scene')
+
+
+def unchanged_prompts(previous, current):
+    """Per (dimension, model): how many of the current draft's chunk prompts also appear in the previous one."""
+    counts = {}
+    old_tasks, old_plans = plan_tasks({'scenes': previous, 'project_id': 'project-1'})
+    tasks, plans = plan_tasks({'scenes': current, 'project_id': 'project-1'})
+    for key, indexes in plans.items():
+        old_prompts = {old_tasks[index]['prompt'] for index in old_plans[key]}
+        counts[key] = sum(tasks[index]['prompt'] in old_prompts for index in indexes)
+    return counts
+
+
+def test_diff_counts_inserted_and_edited_scenes(draft):
+    inserted = draft[:40] + [new_scene()] + draft[40:]
+    summary = diff_fingerprints(fingerprint_scenes(draft), fingerprint_scenes(inserted))
+    assert summary == {'unchanged': len(draft), 'changed': 0, 'added': 1, 'removed': 0, 'changed_scenes': [40]}
+
+    edited, index = edit_dialogue(draft)
+    summary = diff_fingerprints(fingerprint_scenes(draft), fingerprint_scenes(edited))
+    assert summary == {'unchanged': len(draft) - 1, 'changed': 1, 'added': 0, 'removed': 0,
+                       'changed_scenes': [index]}
+
+
+def test_first_draft_calls_every_chunk_and_a_resubmission_reuses_them(evaluate, draft):
+    first = evaluate(draft, 'draft-1')
+    assert all(outcome['chunks'] > 1 and outcome['chunks_reused'] == 0 for outcome in first.values())
+
+    again = evaluate(draft, 'draft-1b')
+    assert all(outcome['chunks_reused'] == outcome['chunks'] for outcome in again.values())
+
+
+@pytest.mark.parametrize('change', ['insert', 'edit'])
+def test_only_the_changed_chunk_and_its_neighbour_are_evaluated_again(evaluate, draft, change):
+    evaluate(draft, 'draft-1')
+    if change == 'insert':
+        revised = draft[:40] + [new_scene()] + draft[40:]
+    else:
+        revised, _ = edit_dialogue(draft)
+    expected = unchanged_prompts(draft, revised)
+
+    outcomes = evaluate(revised, 'draft-2')
+    for key, outcome in outcomes.items():
+        # The changed chunk, plus the next chunk whose context repeats the end of it
+        assert outcome['chunks_reused'] >= outcome['chunks'] - 2, key
+        assert outcome['chunks_reused'] == expected[key], key